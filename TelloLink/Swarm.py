@@ -0,0 +1,158 @@
+import asyncio
+from typing import Dict, Iterable, List, Optional
+
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_channel import get_loop
+from TelloLink.modules.tello_udp import TelloUDP, CONTROL_PORT, VIDEO_PORT
+from TelloLink.modules.tello_state import STATE_PORT
+
+
+#Enjambre de N drones en modo estación (cada uno con su IP en la misma red).
+#Todos comparten el bucle asyncio de TelloLink y un único socket de estado: no se crean hilos por dron
+#(ni telemetría por sondeo, ni monitor de geofence, ni vídeo)
+class TelloSwarm(object):
+
+    def __init__(self, ips: Iterable[str], port=CONTROL_PORT, state_port=STATE_PORT):
+        self.port = int(port)
+        self.state_port = int(state_port)
+        self.loop = get_loop()
+        self.drones: Dict[str, TelloDron] = {}
+        for ip in ips:
+            self.drones[ip] = TelloDron(id=ip)
+        self.last_failed: Dict[str, str] = {}   # Drones que no confirmaron el último barrier (ip -> respuesta)
+        print(f"[swarm] Enjambre con {len(self.drones)} drones")
+
+    def __getitem__(self, ip: str) -> TelloDron:
+        return self.drones[ip]
+
+    def __iter__(self):
+        return iter(self.drones.values())
+
+    def __len__(self):
+        return len(self.drones)
+
+    @property
+    def ips(self) -> List[str]:
+        return list(self.drones.keys())
+
+    #Ejecuta una corrutina en el bucle compartido y espera el resultado desde el hilo llamador
+    def _run(self, coro, timeout: Optional[float] = None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    #CONEXIÓN
+    def connect(self, timeout: float = 5.0) -> Dict[str, bool]:
+        for ip, dron in self.drones.items():
+            if dron._tello is None:
+                dron._tello = TelloUDP(host=ip, port=self.port, state_port=self.state_port, vs_udp=VIDEO_PORT)
+        resps = self.send_all("command", timeout=timeout)
+
+        result = {}
+        for ip, resp in resps.items():
+            dron = self.drones[ip]
+            ok = str(resp).lower() == "ok"
+            result[ip] = ok
+            if ok:
+                dron.state = "connected"
+                dron.startTelemetry()
+            else:
+                print(f"[swarm] {ip} no respondió a 'command': {resp}")
+                try:
+                    dron._tello.end()
+                except Exception:
+                    pass
+                dron._tello = None
+                dron.state = "disconnected"
+        return result
+
+    def disconnect(self) -> None:
+        for dron in self.drones.values():
+            try:
+                dron.stopTelemetry()
+            except Exception:
+                pass
+            if dron._tello is not None:
+                try:
+                    dron._tello.end()
+                except Exception:
+                    pass
+            dron._tello = None
+            dron.state = "disconnected"
+
+    def connected(self) -> List[TelloDron]:
+        return [d for d in self.drones.values() if d._tello is not None and d.state != "disconnected"]
+
+    #COMANDOS
+    async def _request(self, ip: str, cmd: str, timeout: Optional[float]) -> str:
+        dron = self.drones[ip]
+        if dron._tello is None:
+            return "error: no conectado"
+        try:
+            return await dron._tello.channel.request(cmd, timeout)
+        except asyncio.TimeoutError:
+            return f"Aborting command '{cmd}'. Timeout"
+        except Exception as e:
+            return f"error: {e}"
+
+    #Envía comandos dirigidos {ip: cmd} en paralelo y espera a todas las respuestas
+    async def command_async(self, cmds: Dict[str, str], timeout: Optional[float] = None) -> Dict[str, str]:
+        ips = list(cmds.keys())
+        resps = await asyncio.gather(*(self._request(ip, cmds[ip], timeout) for ip in ips))
+        return dict(zip(ips, resps))
+
+    def command(self, cmds: Dict[str, str], timeout: Optional[float] = None) -> Dict[str, str]:
+        return self._run(self.command_async(cmds, timeout))
+
+    #Mismo comando a todos los drones (o a los de 'ips')
+    def send_all(self, cmd: str, ips: Optional[Iterable[str]] = None,
+                 timeout: Optional[float] = None) -> Dict[str, str]:
+        targets = list(ips) if ips is not None else self.ips
+        return self.command({ip: cmd for ip in targets}, timeout)
+
+    def send(self, ip: str, cmd: str, timeout: Optional[float] = None) -> str:
+        return self.command({ip: cmd}, timeout)[ip]
+
+    #Barrera "todos confirmaron": True solo si todos responden 'ok'. Los drones que no lo hagan
+    #quedan en self.last_failed para decidir qué hacer (reintentar, aterrizar...)
+    def barrier(self, cmd: str, ips: Optional[Iterable[str]] = None,
+                timeout: Optional[float] = None) -> bool:
+        resps = self.send_all(cmd, ips=ips, timeout=timeout)
+        self.last_failed = {ip: r for ip, r in resps.items() if str(r).lower() != "ok"}
+        if self.last_failed:
+            print(f"[swarm] '{cmd}' sin confirmar en: {self.last_failed}")
+        return not self.last_failed
+
+    def rc_all(self, vx: int, vy: int, vz: int, yaw: int) -> None:
+        for dron in self.connected():
+            dron._tello.send_rc_control(vx, vy, vz, yaw)
+
+    #Atajos de vuelo sincronizados
+    def takeoff_all(self) -> bool:
+        ok = self.barrier("takeoff", ips=[d.id for d in self.connected()])
+        for dron in self.connected():
+            if dron.id not in self.last_failed:
+                dron.state = "flying"
+                if dron.pose is not None:
+                    dron.pose.reset(z_cm=float(dron.height_cm or 0))
+        return ok
+
+    def land_all(self) -> bool:
+        ok = self.barrier("land", ips=[d.id for d in self.connected()])
+        for dron in self.connected():
+            if dron.id not in self.last_failed:
+                dron.state = "connected"
+                if dron.pose is not None:
+                    dron.pose.set_z(0.0)
+        return ok
+
+    #ESTADO POR DRON
+    def states(self) -> Dict[str, dict]:
+        out = {}
+        for ip, dron in self.drones.items():
+            out[ip] = {
+                "state": dron.state,
+                "battery_pct": dron.battery_pct,
+                "height_cm": dron.height_cm,
+                "pose": dron.pose.capture() if dron.pose is not None else None,
+                "telemetry_ts": dron.telemetry_ts,
+            }
+        return out
@@ -1,8 +1,15 @@
+import threading
+
+
 class TelloDron(object):
 
     def __init__(self, id=None):
         print(f"TelloDron inicializado (ID: {id if id else 'sin ID'})")
 
+        # Bus de eventos (telemetría, estado y pose). Se crea antes que nada: 'state' ya publica
+        from TelloLink.modules.tello_events import EventBus
+        self.events = EventBus()
+
         # Identificación y estado
         self.id = id
         self.state = "disconnected"  # Posibles: disconnected, connected, takingOff, flying, landing
@@ -14,13 +21,21 @@ class TelloDron(object):
         self.wifi = None
         self.flight_time_s = 0
         self.telemetry_ts = None
+        self.telemetry = None  # Último paquete de estado completo (TelloState)
+        self.history = None    # TelemetryHistory (lo crea startTelemetry)
+        self._telemetry_lock = threading.Lock()
 
-        # Backend djitellopy
+        # Backend UDP (TelloUDP, compatible con la API de djitellopy)
         self._tello = None
+        self.frames = None  # FrameRing del vídeo (lo crea stream_on)
+        self.video_pipeline = None  # VideoPipeline (start_video_pipeline)
+        self._video_recorder = None  # VideoRecorder (start_recording)
+        self._snap_pool = None  # Pool de hilos de snapshot_async (se crea con la primera foto)
 
         # Pose virtual
         from TelloLink.modules.tello_pose import PoseVirtual
         self.pose = PoseVirtual()
+        self.pose.bus = self.events
 
         # Flags internos usados por goto, mission y geofence
         self._goto_abort = False
@@ -31,18 +46,35 @@ class TelloDron(object):
         self._landing_in_progress = False
         self._takeoff_in_progress = False
 
+    # Cada cambio de estado se publica como StateEvent
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, value):
+        prev = getattr(self, "_state", None)
+        self._state = value
+        if value != prev:
+            from TelloLink.modules.tello_events import StateEvent
+            self.events.publish(StateEvent(state=value, prev=prev))
 
     # --- Métodos "colgados" desde los módulos ---
-    from TelloLink.modules.tello_camera import stream_on, stream_off, get_frame, snapshot
-    from TelloLink.modules.tello_connect import connect, _connect, disconnect, _send, _require_connected
+    from TelloLink.modules.tello_camera import stream_on, stream_off, get_frame, wait_frame, snapshot, snapshot_async, snapshot_burst
+    from TelloLink.modules.tello_connect import connect, _connect, disconnect, _send, _send_future, send_async, _require_connected
     from TelloLink.modules.tello_takeOff import takeOff, _takeOff, _ascend_to_target
     from TelloLink.modules.tello_land import Land, _land
-    from TelloLink.modules.tello_telemetry import startTelemetry, stopTelemetry
-    from TelloLink.modules.tello_move import _move, up, down, set_speed, forward, back, left, right, rc
+    from TelloLink.modules.tello_telemetry import startTelemetry, stopTelemetry, telemetry_fresh
+    from TelloLink.modules.tello_history import pose_at
+    from TelloLink.modules.tello_move import _move, up, down, set_speed, forward, back, left, right, go, curve, rc
     from TelloLink.modules.tello_heading import rotate, cw, ccw
-    from TelloLink.modules.tello_video import start_video, stop_video, show_video_blocking
+    from TelloLink.modules.tello_video import start_video, stop_video, show_video_blocking, start_video_pipeline, stop_video_pipeline, start_recording, stop_recording
     from TelloLink.modules.tello_pose import PoseVirtual
     from TelloLink.modules.tello_goto import goto_rel, abort_goto
     from TelloLink.modules.tello_mission import run_mission, abort_mission
-    from TelloLink.modules.tello_geofence import set_geofence, disable_geofence, recenter_geofence, add_exclusion_poly, add_exclusion_circle, clear_exclusions, aplicar_geofence_rc
+    from TelloLink.modules.tello_planner import plan_path
+    from TelloLink.modules.tello_ekf import enable_ekf, disable_ekf
+    from TelloLink.modules.tello_missionpad import enable_mission_pads, disable_mission_pads, add_pad, set_pad_map, pad_fix, pad_age_s
+    from TelloLink.modules.tello_recorder import start_flight_recording, stop_flight_recording
+    from TelloLink.modules.tello_geofence import set_geofence, disable_geofence, recenter_geofence, add_exclusion_poly, add_exclusion_circle, clear_exclusions, aplicar_geofence_rc, check_points, check_path
 
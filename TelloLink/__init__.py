@@ -1,3 +1,4 @@
 from .Tello import TelloDron
+from .Swarm import TelloSwarm
 from .modules.tello_joystick import JoystickController
-__all__ = ["TelloDron", "JoystickController"]
\ No newline at end of file
+__all__ = ["TelloDron", "TelloSwarm", "JoystickController"]
\ No newline at end of file
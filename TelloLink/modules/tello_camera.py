@@ -1,5 +1,7 @@
 import time
 import os
+import json
+import threading
 from datetime import datetime
 
 def stream_on(self):
@@ -17,8 +19,9 @@ def stream_on(self):
 
 
     try:
-        self._frame_reader = self._tello.get_frame_read() #Se crea un objeto frame_reader que, en segundo plane captura contínuamente frames de la cámara del Tello
-    except Exception as e:                                #self._frame_reader.frame contendrá el último fotograma disponible.
+        self._frame_reader = self._tello.get_frame_read() #Se crea un objeto frame_reader que, en segundo plano, decodifica contínuamente frames de la cámara del Tello
+        self.frames = self._frame_reader.ring              #y los deja en un anillo (FrameRing) con número de secuencia y marca de tiempo
+    except Exception as e:
         try: self._tello.streamoff()    #Si falla, se intenta apagar el stream para que quede "limpio"
         except Exception: pass
         raise RuntimeError(f"No se pudo obtener frame reader: {e}") #Si no se consigue, se lanza error para avisar al usuario
@@ -30,6 +33,7 @@ def stream_off(self):
     try:
         if getattr(self, "_frame_reader", None) is not None: #Si existe un frame_reader activo, se elimina
             self._frame_reader = None
+        self.frames = None
         self._tello.streamoff() #Se manda al Tello la orden de parar el streaming de vídeo
         time.sleep(0.1)
     except Exception: #Si algo falla (no había  stream activo) se ignora
@@ -38,41 +42,163 @@ def stream_off(self):
 
 
 def get_frame(self):
-    fr = getattr(self, "_frame_reader", None) #Busca si existe un objeto frame_reader
-    if fr is None: #Si no existe, devuelve None
+    ring = getattr(self, "frames", None) #Busca si existe el anillo de frames del lector
+    if ring is None: #Si no existe, devuelve None
         return None
-    frame = fr.frame #Obtiene el último frame (imagen) disponible del dron
+    f = ring.latest() #Obtiene el último frame disponible del dron (vista de solo lectura, sin copiar)
 
-    if frame is None: #Si el frame no está listo, devuelve None
+    if f is None: #Si aún no ha llegado ninguno, devuelve None
         return None
-    return frame #Si está listo, se devuelve el frame como objeto
+    return f.image #Si está listo, se devuelve la imagen
 
 
-def snapshot(self, path: str | None = None):  #Función para capturar imagen
-    frame = get_frame(self)  #Se intenta obtener la última imagen del Tello
-    if frame is None:        #Si no hay imagen, espera y lo intenta de nuevo
-        time.sleep(0.2)
-        frame = get_frame(self)
-        if frame is None:
-            raise RuntimeError("No hay frame disponible (¿stream_on activo?)")
+#Espera a un frame posterior a 'after_seq' y lo devuelve como Frame (seq, ts, image), o None si vence el timeout.
+#Para recorrer el vídeo sin repetir frames:  seq = 0;  f = dron.wait_frame(seq);  seq = f.seq ...
+def wait_frame(self, after_seq: int = 0, timeout: float = 1.0):
+    ring = getattr(self, "frames", None)
+    if ring is None:
+        return None
+    return ring.wait_next(after_seq, timeout)
+
 
-    if path is None:  #Si no le pasamos la ruta para guardar la foto
-        out_dir = os.path.join(".", "snapshots")
-        os.makedirs(out_dir, exist_ok=True)
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        path = os.path.join(out_dir, f"tello_{ts}.jpg")
+#Fotos sin bloquear: el frame se copia en el hilo que la pide (una copia de memoria, del orden de 1 ms) y la
+#conversión de color, la codificación JPEG/PNG y la escritura en disco se hacen en un pequeño pool de hilos.
+#Así una misión puede hacer fotos en cada waypoint sin pararse a esperar al disco.
+#Con poses=True cada foto se anota en '<carpeta>/poses.jsonl' con la pose, altura y yaw del dron en el
+#instante de captura del frame (interpolados del historial de telemetría, ver pose_at)
+_SNAP_WORKERS = 2
+_JPEG_QUALITY = 90        #Calidad JPEG/WebP por defecto (0-100); PNG es sin pérdida y la ignora
+_SNAP_WAIT_S = 1.0        #Espera máxima al primer frame si aún no ha llegado ninguno
+_POSES_FILE = "poses.jsonl"
+_poses_lock = threading.Lock()   #Los hilos del pool añaden líneas al mismo sidecar
 
+
+def _snapshot_pool(self):
+    pool = getattr(self, "_snap_pool", None)
+    if pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        pool = ThreadPoolExecutor(max_workers=_SNAP_WORKERS, thread_name_prefix="snapshot")
+        self._snap_pool = pool
+    return pool
+
+
+def _need_cv2():
     try:
         import cv2
     except Exception as e:
         raise RuntimeError("Falta OpenCV (pip install opencv-python)") from e
+    return cv2
 
-    #Conversión de color para que no salga azul
-    if getattr(self, "FRAME_FORMAT", "RGB") == "RGB":
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
 
-    ok = cv2.imwrite(path, frame)
-    if not ok:
+def _default_snapshot_path():
+    out_dir = os.path.join(".", "snapshots")
+    os.makedirs(out_dir, exist_ok=True)
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]  #Con milisegundos, para que no choquen dos fotos seguidas
+    return os.path.join(out_dir, f"tello_{ts}.jpg")
+
+
+def _append_pose(path, seq, pose):
+    line = json.dumps({"file": os.path.basename(path), "seq": seq, **pose})
+    with _poses_lock:
+        with open(os.path.join(os.path.dirname(path), _POSES_FILE), "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+#Trabajo del pool: convierte, codifica y escribe una imagen ya copiada (y su pose, si la hay). Devuelve la ruta
+def _write_image(frame, path, rgb, quality, seq=None, pose=None):
+    cv2 = _need_cv2()
+    if rgb: #Conversión de color para que no salga azul
+        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jpg", ".jpeg"):
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    elif ext == ".webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+    else:
+        params = []
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    if not cv2.imwrite(path, frame, params):
         raise RuntimeError(f"No se pudo escribir el snapshot en: {path}")
+    if pose is not None:
+        _append_pose(path, seq, pose)
+    return path
+
 
-    return path
\ No newline at end of file
+#Copia del frame más reciente, o None si no ha llegado ninguno
+def _grab(self):
+    ring = getattr(self, "frames", None)
+    if ring is None:
+        raise RuntimeError("No hay frame disponible (¿stream_on activo?)")
+    f = ring.latest()
+    return None if f is None else f._replace(image=f.image.copy())
+
+
+def _tag(self, f, poses):
+    if not poses:
+        return None
+    from TelloLink.modules.tello_history import pose_at
+    return pose_at(self, f.ts)
+
+
+#Foto en segundo plano: devuelve un concurrent.futures.Future con la ruta del fichero.
+#Si aún no hay ningún frame, es el pool quien espera al primero (hasta 'timeout' s), no quien llama
+def snapshot_async(self, path: str | None = None, quality: int = _JPEG_QUALITY, timeout: float = _SNAP_WAIT_S,
+                   poses: bool = True):
+    _need_cv2()
+    f = _grab(self)
+    if path is None:
+        path = _default_snapshot_path()
+    rgb = getattr(self, "FRAME_FORMAT", "RGB") == "RGB"
+    if f is not None:
+        return _snapshot_pool(self).submit(_write_image, f.image, path, rgb, quality, f.seq, _tag(self, f, poses))
+
+    ring = self.frames
+
+    def _wait_and_write():
+        f = ring.wait_next(0, timeout)
+        if f is None:
+            raise RuntimeError("No hay frame disponible (¿stream_on activo?)")
+        return _write_image(f.image.copy(), path, rgb, quality, f.seq, _tag(self, f, poses))
+    return _snapshot_pool(self).submit(_wait_and_write)
+
+
+#Ráfaga de n frames consecutivos (el actual y los n-1 siguientes, sin repetir ninguno). Los frames se recogen
+#en un hilo propio y cada uno se escribe en el pool como '<path>_00.jpg', '<path>_01.jpg'... Devuelve un Future
+#con la lista de rutas
+def snapshot_burst(self, n: int = 5, path: str | None = None, quality: int = _JPEG_QUALITY,
+                   timeout: float = _SNAP_WAIT_S, poses: bool = True):
+    from concurrent.futures import Future
+    _need_cv2()
+    ring = getattr(self, "frames", None)
+    if ring is None:
+        raise RuntimeError("No hay frame disponible (¿stream_on activo?)")
+    base, ext = os.path.splitext(path or _default_snapshot_path())
+    ext = ext or ".jpg"
+    rgb = getattr(self, "FRAME_FORMAT", "RGB") == "RGB"
+    pool = _snapshot_pool(self)
+    result = Future()
+
+    def _capture():
+        try:
+            escrituras = []
+            seq = ring.last_seq - 1 if ring.last_seq > 0 else 0
+            for i in range(max(1, int(n))):
+                f = ring.wait_next(seq, timeout)
+                if f is None:
+                    raise RuntimeError(f"La ráfaga se quedó sin frames tras {i} de {n}")
+                seq = f.seq
+                escrituras.append(pool.submit(_write_image, f.image.copy(), f"{base}_{i:02d}{ext}", rgb, quality,
+                                              f.seq, _tag(self, f, poses)))
+            result.set_result([w.result() for w in escrituras])
+        except Exception as e:
+            result.set_exception(e)
+
+    threading.Thread(target=_capture, daemon=True, name="snapshot-burst").start()
+    return result
+
+
+def snapshot(self, path: str | None = None, quality: int = _JPEG_QUALITY, timeout: float = _SNAP_WAIT_S,
+             poses: bool = True):  #Función para capturar imagen (bloqueante)
+    return snapshot_async(self, path, quality, timeout, poses).result()
@@ -0,0 +1,201 @@
+from __future__ import annotations
+import asyncio
+import collections
+import concurrent.futures
+import threading
+import time
+from typing import Deque, Optional, Tuple
+
+_MIN_GAP_S = 0.05          #Separación mínima entre datagramas de comando (el Tello descarta ráfagas)
+_LATE_GRACE_S = 2.0        #Tiempo máximo que guardamos un comando caducado para absorber su respuesta tardía
+_READ_TIMEOUT_S = 3.0
+_DEFAULT_TIMEOUT_S = 7.0
+
+# Timeouts por verbo (s). Los que no aparecen usan el timeout por defecto del canal
+_TIMEOUTS = {
+    "command": 5.0, "takeoff": 20.0, "land": 20.0, "emergency": 3.0,
+    "streamon": 5.0, "streamoff": 5.0, "speed": 3.0,
+}
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+#Bucle asyncio compartido por todos los canales del proceso (un único hilo para N drones)
+def get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            th = threading.Thread(target=loop.run_forever, name="TelloLink-loop", daemon=True)
+            th.start()
+            _loop = loop
+            _loop._tellolink_thread = th
+        return _loop
+
+
+def _in_loop_thread(loop: asyncio.AbstractEventLoop) -> bool:
+    return getattr(loop, "_tellolink_thread", None) is threading.current_thread()
+
+
+def _is_read(cmd: str) -> bool:
+    return cmd.strip().endswith("?")
+
+
+#Tipo de comando que puede haber generado una respuesta: "ok" solo responde a comandos de control,
+#un valor (p.ej. "87") solo a lecturas y "error..." a cualquiera de los dos
+def _response_kind(text: str) -> Optional[str]:
+    t = text.strip().lower()
+    if t == "ok":
+        return "control"
+    if t.startswith("error") or t.startswith("unknown") or "out of range" in t:
+        return None
+    return "read"
+
+
+class _InFlight:
+    __slots__ = ("cmd", "kind", "future", "sent_ts", "expired")
+
+    def __init__(self, cmd: str, future: asyncio.Future):
+        self.cmd = cmd
+        self.kind = "read" if _is_read(cmd) else "control"
+        self.future = future
+        self.sent_ts = time.monotonic()
+        self.expired = False
+
+
+class _Protocol(asyncio.DatagramProtocol):
+
+    def __init__(self, channel: "CommandChannel"):
+        self.channel = channel
+
+    def datagram_received(self, data, addr):
+        self.channel._on_datagram(data, addr)
+
+    def error_received(self, exc):
+        pass  # p.ej. ICMP "port unreachable": lo tratarán los timeouts
+
+
+#Canal de comandos asíncrono sobre un único socket UDP. Varios comandos pueden estar en vuelo
+#a la vez (tabla de pendientes), cada uno con su timeout, y los paquetes rc salen sin esperar a nadie
+class CommandChannel:
+
+    def __init__(self, address: Tuple[str, int], local_port: int = 0,
+                 default_timeout: float = _DEFAULT_TIMEOUT_S,
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.address = (address[0], int(address[1]))
+        self.default_timeout = float(default_timeout)
+        self.loop = loop or get_loop()
+        self._inflight: Deque[_InFlight] = collections.deque()
+        self._transport = None
+        self._send_lock: Optional[asyncio.Lock] = None
+        self._last_send_ts = 0.0
+        self.late_responses = 0      #Respuestas que llegaron después de su timeout
+        self.unmatched_responses = 0 #Respuestas sin ningún comando pendiente
+        asyncio.run_coroutine_threadsafe(self._open(int(local_port)), self.loop).result(timeout=5.0)
+
+    async def _open(self, local_port: int) -> None:
+        self._send_lock = asyncio.Lock()
+        self._transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: _Protocol(self), local_addr=("0.0.0.0", local_port))
+
+    def timeout_for(self, cmd: str) -> float:
+        if _is_read(cmd):
+            return _READ_TIMEOUT_S
+        verb = cmd.split(" ", 1)[0].lower()
+        return _TIMEOUTS.get(verb, self.default_timeout)
+
+    #API ASÍNCRONA (se ejecuta en el bucle)
+    async def request(self, cmd: str, timeout: Optional[float] = None) -> str:
+        if self._transport is None:
+            raise RuntimeError("Canal de comandos cerrado.")
+        timeout = self.timeout_for(cmd) if timeout is None else float(timeout)
+        entry = _InFlight(cmd, self.loop.create_future())
+
+        async with self._send_lock:
+            wait = _MIN_GAP_S - (time.monotonic() - self._last_send_ts)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            entry.sent_ts = time.monotonic()
+            # Un comando nuevo del mismo tipo sustituye a los caducados: si su respuesta se perdió,
+            # no queremos que su "fantasma" se coma la respuesta del nuevo
+            for old in [e for e in self._inflight if e.expired and e.kind == entry.kind]:
+                self._inflight.remove(old)
+            self._inflight.append(entry)
+            self._transport.sendto(cmd.encode("utf-8"), self.address)
+            self._last_send_ts = entry.sent_ts
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(entry.future), timeout)
+        except asyncio.TimeoutError:
+            # Lo dejamos en la tabla un rato: si la respuesta llega tarde, no se la asignamos a otro
+            entry.expired = True
+            self.loop.call_later(_LATE_GRACE_S, self._forget, entry)
+            raise
+
+    def _forget(self, entry: _InFlight) -> None:
+        try:
+            self._inflight.remove(entry)
+        except ValueError:
+            pass
+
+    def _on_datagram(self, data: bytes, addr) -> None:
+        if addr[0] != self.address[0]:
+            return
+        try:
+            text = data.decode("utf-8").rstrip("\r\n")
+        except UnicodeDecodeError:
+            text = "response decode error"
+
+        kind = _response_kind(text)
+        match = None
+        for entry in self._inflight:
+            if kind is None or entry.kind == kind:
+                match = entry
+                break
+        if match is None:
+            self.unmatched_responses += 1
+            return
+        self._inflight.remove(match)
+        if match.expired or match.future.done():
+            self.late_responses += 1
+            return
+        match.future.set_result(text)
+
+    def _send_raw(self, cmd: str) -> None:
+        if self._transport is not None:
+            self._transport.sendto(cmd.encode("utf-8"), self.address)
+
+    #API PARA HILOS
+    def submit(self, cmd: str, timeout: Optional[float] = None) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(self.request(cmd, timeout), self.loop)
+
+    def call(self, cmd: str, timeout: Optional[float] = None) -> str:
+        if _in_loop_thread(self.loop):
+            raise RuntimeError("call() bloquearía el bucle de TelloLink; usa 'await request()'.")
+        timeout = self.timeout_for(cmd) if timeout is None else float(timeout)
+        try:
+            return self.submit(cmd, timeout).result(timeout + 1.0)
+        except (asyncio.TimeoutError, concurrent.futures.TimeoutError):
+            return f"Aborting command '{cmd}'. Did not receive a response after {timeout} seconds"
+
+    def send_nowait(self, cmd: str) -> None:
+        # Sin respuesta y sin pasar por el lock de envío: no se bloquea detrás de otros comandos
+        self.loop.call_soon_threadsafe(self._send_raw, cmd)
+
+    def pending(self) -> int:
+        return sum(1 for e in self._inflight if not e.expired)
+
+    def close(self) -> None:
+        def _close():
+            for entry in list(self._inflight):
+                if not entry.future.done():
+                    entry.future.set_exception(ConnectionError("Canal de comandos cerrado."))
+            self._inflight.clear()
+            if self._transport is not None:
+                self._transport.close()
+                self._transport = None
+        if _in_loop_thread(self.loop):
+            _close()
+        else:
+            self.loop.call_soon_threadsafe(_close)
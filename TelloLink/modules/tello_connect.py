@@ -1,12 +1,15 @@
 import threading
 import time
-from djitellopy import Tello
+from TelloLink.modules.tello_udp import TelloUDP, TELLO_IP, CONTROL_PORT, VIDEO_PORT
+from TelloLink.modules.tello_state import STATE_PORT
 
 
-def _connect(self, freq=5, callback=None, params=None):
+def _connect(self, freq=5, callback=None, params=None,
+             host=TELLO_IP, port=CONTROL_PORT, state_port=STATE_PORT, video_port=VIDEO_PORT):
     try:
-        # Crea el objeto Tello y conecta
-        self._tello = Tello()
+        # Crea el backend UDP (dueño del puerto de estado) y conecta.
+        # host/port permiten apuntar a un simulador local (ver tello_sim)
+        self._tello = TelloUDP(host=host, port=port, state_port=state_port, vs_udp=video_port)
 
         #  Aumentar timeout para comandos lentos
         self._tello.RESPONSE_TIMEOUT = 15
@@ -25,7 +28,7 @@ def _connect(self, freq=5, callback=None, params=None):
         # POSE: asegurar objeto y sincronizar Z (altura) con barómetro
         try:
             if not hasattr(self, "pose") or self.pose is None:
-                self.pose = self.PoseVirtual()
+                self.pose = self.PoseVirtual(bus=getattr(self, "events", None))
             self.pose.set_from_telemetry(height_cm=getattr(self, "height_cm", None))
         except Exception:
             pass
@@ -34,21 +37,27 @@ def _connect(self, freq=5, callback=None, params=None):
 
     except Exception as Err:
         print("Error conectando a Tello:", Err)
+        try:
+            if self._tello is not None:
+                self._tello.end()  # Liberamos los puertos UDP
+        except Exception:
+            pass
         self._tello = None
         self.state = "disconnected"
         return False
 
 
-def connect(self, freq=5, blocking=True, callback=None, params=None):
+def connect(self, freq=5, blocking=True, callback=None, params=None,
+            host=TELLO_IP, port=CONTROL_PORT, state_port=STATE_PORT, video_port=VIDEO_PORT):
     if self.state != "disconnected":
         return False
 
+    kwargs = dict(freq=freq, callback=callback, params=params,
+                  host=host, port=port, state_port=state_port, video_port=video_port)
     if blocking:
-        return _connect(self, freq=freq, callback=callback, params=params)
+        return _connect(self, **kwargs)
     else:
-        t = threading.Thread(
-            target=_connect, args=(self,), kwargs=dict(freq=freq, callback=callback, params=params), daemon=True
-        )
+        t = threading.Thread(target=_connect, args=(self,), kwargs=kwargs, daemon=True)
         t.start()
         return True
 
@@ -82,8 +91,22 @@ def _require_connected(self):
         raise RuntimeError("No hay backend '_tello' inicializado. ¿Llamaste connect()?")
 
 
-def _send(self, cmd: str) -> str:
+def _send(self, cmd: str, timeout=None) -> str:
     _require_connected(self)
+    rec = getattr(self, "_recorder", None)
+    if rec is None:
+        return _send_backend(self, cmd, timeout)
+    rec.command(cmd)
+    resp = _send_backend(self, cmd, timeout)
+    rec.response(cmd, resp)
+    return resp
+
+
+def _send_backend(self, cmd: str, timeout=None) -> str:
+
+    # Backend propio: el comando va por el canal asíncrono y aquí solo esperamos su futuro
+    if hasattr(self._tello, "channel"):
+        return str(self._tello.channel.call(cmd, timeout))
 
     # djitellopy expone distintos nombres según la versión, con esto nos aseguramos de que funcione con versiones más antiguas
     if hasattr(self._tello, "send_read_command"):
@@ -100,4 +123,19 @@ def _send(self, cmd: str) -> str:
             return "ok" if res else "error"
         return str(res)
 
-    raise RuntimeError("El backend Tello no soporta envío textual en la versión actual.")
\ No newline at end of file
+    raise RuntimeError("El backend Tello no soporta envío textual en la versión actual.")
+
+
+#Envío sin bloquear: devuelve un concurrent.futures.Future con la respuesta del dron.
+#Varios comandos (lecturas, control) pueden estar en vuelo a la vez sobre el mismo socket
+def _send_future(self, cmd: str, timeout=None):
+    _require_connected(self)
+    if not hasattr(self._tello, "channel"):
+        raise RuntimeError("El backend actual no soporta comandos asíncronos.")
+    return self._tello.channel.submit(cmd, timeout)
+
+
+#Variante para asyncio: 'resp = await dron.send_async("battery?")' desde cualquier bucle
+async def send_async(self, cmd: str, timeout=None) -> str:
+    import asyncio
+    return str(await asyncio.wrap_future(_send_future(self, cmd, timeout)))
@@ -0,0 +1,234 @@
+from __future__ import annotations
+import math
+import threading
+import time
+from typing import List, Optional, Tuple
+from TelloLink.modules.tello_recorder import _record_config
+
+#Estimador de la pose por filtro de Kalman extendido. Fusiona, con sus marcas de tiempo:
+#  - las velocidades medidas por el Tello (vx/vy/vz del paquete de estado),
+#  - la altura medida,
+#  - los desplazamientos mandados y confirmados (forward, go, curve...),
+#  - el yaw de la IMU, que se toma como entrada del modelo.
+#Linealizando alrededor del yaw medido, la velocidad en ejes del dron se pasa a ejes del mapa con la
+#misma rotación que usa PoseVirtual. Con ruido de velocidad isótropo los ejes X, Y, Z quedan desacoplados,
+#así que el filtro son tres Kalman de estado (posición, velocidad) de 2x2, sin NumPy.
+#El resultado se escribe en la PoseVirtual, que sigue siendo la pose que lee el resto de módulos
+#Lo usan varios hilos a la vez (telemetría, goto/misión, mission pads, rc/geofence): cada operación
+#pública toma el lock del filtro, así nadie lee una covarianza a medio actualizar
+
+_INIT_VAR_P = 1.0          #Varianza inicial de la posición (cm²)
+_INIT_VAR_V = 1.0          #Varianza inicial de la velocidad ((cm/s)²)
+_ACCEL_NOISE = 100.0       #Ruido de aceleración del modelo de velocidad constante (cm/s²)
+_VEL_SIGMA = 5.0           #Ruido de las velocidades medidas (cm/s)
+_HEIGHT_SIGMA = 3.0        #Ruido de la altura medida (cm)
+_MOVE_SIGMA_CM = 2.0       #Error fijo de un desplazamiento mandado
+_MOVE_SIGMA_FRAC = 0.05    #Error proporcional a la distancia mandada (5%)
+_MAX_DT_S = 1.0            #Si pasa más tiempo entre paquetes, la predicción se limita a esto
+_FRESH_S = 0.5             #Telemetría más reciente que esto se considera "en curso"
+
+
+def _move_var(dist_cm: float) -> float:
+    s = _MOVE_SIGMA_CM + _MOVE_SIGMA_FRAC * abs(dist_cm)
+    return s * s
+
+
+#Kalman de un eje con estado (posición, velocidad) y covarianza P (2x2 simétrica)
+class _Axis:
+    __slots__ = ("p", "v", "P")
+
+    def __init__(self, p: float):
+        self.p = float(p)
+        self.v = 0.0
+        self.P = [[_INIT_VAR_P, 0.0], [0.0, _INIT_VAR_V]]
+
+    def predict(self, dt: float) -> None:
+        P = self.P
+        self.p += self.v * dt
+        q = _ACCEL_NOISE * _ACCEL_NOISE
+        p00 = P[0][0] + dt * (2.0 * P[0][1] + dt * P[1][1]) + q * dt ** 4 / 4.0
+        p01 = P[0][1] + dt * P[1][1] + q * dt ** 3 / 2.0
+        p11 = P[1][1] + q * dt * dt
+        self.P = [[p00, p01], [p01, p11]]
+
+    #Corrección con una medida de la posición (idx=0) o de la velocidad (idx=1) de varianza r
+    def update(self, idx: int, z: float, r: float) -> Tuple[float, float]:
+        P = self.P
+        s = P[idx][idx] + r
+        k0, k1 = P[0][idx] / s, P[1][idx] / s
+        y = z - (self.p if idx == 0 else self.v)
+        self.p += k0 * y
+        self.v += k1 * y
+        p00 = P[0][0] - k0 * P[idx][0]
+        p01 = P[0][1] - k0 * P[idx][1]
+        p11 = P[1][1] - k1 * P[idx][1]
+        self.P = [[p00, p01], [p01, p11]]
+        return y, s
+
+    #Desplazamiento conocido sin medida que lo confirme (entrada de control)
+    def shift(self, d: float, var: float) -> None:
+        self.p += d
+        self.P[0][0] += var
+
+
+class PoseEKF:
+
+    #clock: reloj en segundos (time.monotonic); la reproducción de vuelos grabados pasa el suyo
+    def __init__(self, pose, clock=time.monotonic):
+        self.pose = pose
+        self.clock = clock
+        self._lock = threading.RLock()   #Reentrante: advance/observe_* llaman a predict_to, que también es pública
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.axes = [_Axis(self.pose.x_cm), _Axis(self.pose.y_cm), _Axis(self.pose.z_cm)]
+            self.ts: Optional[float] = None        #Instante (monotonic) hasta el que está predicho el filtro
+            self.last_telemetry: Optional[float] = None
+            self._mark = None
+            self._written = (self.pose.x_cm, self.pose.y_cm, self.pose.z_cm)
+
+    #Vuelca la estimación en la PoseVirtual
+    def _write(self) -> None:
+        self.pose.x_cm, self.pose.y_cm, self.pose.z_cm = (a.p for a in self.axes)
+        self._written = (self.pose.x_cm, self.pose.y_cm, self.pose.z_cm)
+
+    #Si alguien ha escrito en la pose por fuera del filtro, ese cambio se toma como un movimiento mandado
+    def _absorb_external(self) -> None:
+        now = (self.pose.x_cm, self.pose.y_cm, self.pose.z_cm)
+        if now == self._written:
+            return
+        for axis, new, old in zip(self.axes, now, self._written):
+            d = new - old
+            if d:
+                axis.shift(d, _move_var(d))
+        self._written = now
+
+    def predict_to(self, ts: float) -> None:
+        with self._lock:
+            if self.ts is not None:
+                dt = min(_MAX_DT_S, ts - self.ts)
+                if dt > 0:
+                    for axis in self.axes:
+                        axis.predict(dt)
+            if self.ts is None or ts > self.ts:
+                self.ts = ts
+
+    #Avanza la predicción hasta ahora y la vuelca en la pose (entre paquetes de telemetría)
+    def advance(self) -> None:
+        rec = getattr(self.pose, "recorder", None)
+        if rec is not None:
+            rec.pose_event("ekf_advance")
+        with self._lock:
+            self._absorb_external()
+            self.predict_to(self.clock())
+            self._write()
+
+    def telemetry_fresh(self) -> bool:
+        with self._lock:
+            return self.last_telemetry is not None and (self.clock() - self.last_telemetry) <= _FRESH_S
+
+    #Paquete de estado (TelloState): velocidades en ejes del dron pasadas al mapa con el yaw de la IMU, y altura
+    #Si 'use_velocity' es False (valor atípico descartado por la telemetría) solo se usa la altura
+    def update_state(self, st, use_velocity: bool = True) -> None:
+        with self._lock:
+            self._absorb_external()
+            self.predict_to(st.ts)
+            if use_velocity:
+                yaw = math.radians(self.pose.yaw_deg)
+                vf, vr = float(st.vx_cm_s), float(st.vy_cm_s)
+                vx = vf * math.cos(yaw) - vr * math.sin(yaw)
+                vy = vf * math.sin(yaw) + vr * math.cos(yaw)
+                r_v = _VEL_SIGMA * _VEL_SIGMA
+                self.axes[0].update(1, vx, r_v)
+                self.axes[1].update(1, vy, r_v)
+                self.axes[2].update(1, float(st.vz_cm_s), r_v)
+            self.axes[2].update(0, float(st.height_cm), _HEIGHT_SIGMA * _HEIGHT_SIGMA)
+            self.last_telemetry = st.ts
+            self._write()
+
+    #Se llama justo antes de mandar un desplazamiento: guarda la posición de partida para la medida relativa
+    def mark_command(self) -> None:
+        with self._lock:
+            self._absorb_external()
+            self._mark = tuple((a.p, a.P[0][0]) for a in self.axes)
+
+    def cancel_command(self) -> None:
+        with self._lock:
+            self._mark = None
+
+    #Desplazamiento mandado y confirmado (en ejes del mapa). Con marca previa es una medida de la posición
+    #final (partida + desplazamiento); sin ella, una entrada de control que suma incertidumbre
+    def observe_displacement(self, dx: float, dy: float, dz: float) -> None:
+        with self._lock:
+            self._absorb_external()
+            dist = math.sqrt(dx * dx + dy * dy + dz * dz)
+            if self._mark is None:
+                for axis, d in zip(self.axes, (dx, dy, dz)):
+                    axis.shift(d, _move_var(dist))
+            else:
+                self.predict_to(self.clock())
+                for axis, (p0, var0), d in zip(self.axes, self._mark, (dx, dy, dz)):
+                    axis.update(0, p0 + d, var0 + _move_var(dist))
+                self._mark = None
+            self._write()
+
+    #Medida absoluta de x/y (mission pad) con varianza r. La partida de un movimiento en curso se desplaza
+    #lo mismo que la estimación, para que la medida relativa del 'ok' no deshaga la corrección
+    def observe_position(self, x: float, y: float, r: float) -> None:
+        with self._lock:
+            self._absorb_external()
+            self.predict_to(self.clock())
+            for i, z in ((0, x), (1, y)):
+                axis = self.axes[i]
+                antes = axis.p
+                axis.update(0, float(z), r)
+                if self._mark is not None:
+                    mark = list(self._mark)
+                    p0, var0 = mark[i]
+                    mark[i] = (p0 + axis.p - antes, var0)
+                    self._mark = tuple(mark)
+            self._write()
+
+    #Desplazamiento estimado a partir de consignas rc: si llega telemetría, ya lo cubren las velocidades medidas
+    def command_delta(self, dx: float, dy: float, dz: float) -> None:
+        with self._lock:
+            self._absorb_external()
+            if not self.telemetry_fresh():
+                dist = math.sqrt(dx * dx + dy * dy + dz * dz)
+                for axis, d in zip(self.axes, (dx, dy, dz)):
+                    axis.shift(d, _move_var(dist))
+            self._write()
+
+    #Covarianza 3x3 de la posición (x, y, z) en cm²
+    def covariance(self) -> List[List[float]]:
+        with self._lock:
+            v = [a.P[0][0] for a in self.axes]
+            return [[v[0], 0.0, 0.0], [0.0, v[1], 0.0], [0.0, 0.0, v[2]]]
+
+    @property
+    def sigma_xy_cm(self) -> float:
+        with self._lock:
+            return math.sqrt(max(self.axes[0].P[0][0], self.axes[1].P[0][0]))
+
+    @property
+    def sigma_z_cm(self) -> float:
+        with self._lock:
+            return math.sqrt(self.axes[2].P[0][0])
+
+
+#Activa el filtro sobre la pose del dron (a partir de aquí la telemetría corrige x, y, z)
+def enable_ekf(self) -> PoseEKF:
+    if getattr(self, "pose", None) is None:
+        from TelloLink.modules.tello_pose import PoseVirtual
+        self.pose = PoseVirtual(bus=getattr(self, "events", None))
+    if self.pose.ekf is None:
+        self.pose.ekf = PoseEKF(self.pose)
+        _record_config(self)
+    return self.pose.ekf
+
+
+def disable_ekf(self) -> None:
+    if getattr(self, "pose", None) is not None:
+        self.pose.ekf = None
+        _record_config(self)
@@ -0,0 +1,199 @@
+from __future__ import annotations
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Type
+
+#Bus de eventos del dron (publicar/suscribir). La telemetría, la máquina de estados (TelloDron.state) y la
+#pose publican eventos tipados en cuanto ocurren, y quien los necesite se suscribe con un callback o con
+#un iterador asíncrono, en lugar de consultar atributos cada X ms.
+#Suscribirse a una clase recibe también sus subclases: subscribe(Event, ...) recibe todos los eventos.
+#publish no llama a nadie: deja el evento en una cola y un hilo repartidor propio de cada dron (uno por bus)
+#ejecuta los callbacks en orden. Así quien publica (el bucle asyncio de telemetría, que lleva los canales de
+#comandos de todos los drones) nunca espera a un suscriptor, y los callbacks pueden usar la API bloqueante
+#normal (p.ej. dron.Land() al recibir un BatteryEvent). Si tocan una interfaz gráfica, deben pasar el trabajo
+#a su hilo (en Tk, root.after(0, ...))
+#subscribe_sync es la excepción: el callback se ejecuta dentro de publish, en el hilo que publica, y nunca se
+#descarta. Es para comprobaciones cortas que no pueden saltarse muestras (el monitor del geofence); no debe bloquear
+
+_MAX_PENDING = 1000   #Elementos en cola como mucho; si el repartidor se atasca, se descartan los eventos más viejos
+
+
+@dataclass(frozen=True)
+class Event:
+    ts: float = field(default_factory=time.monotonic, kw_only=True)
+
+
+@dataclass(frozen=True)
+class TelemetryEvent(Event):
+    state: Any                  # TelloState completo del paquete
+
+
+@dataclass(frozen=True)
+class HeightEvent(Event):
+    height_cm: int
+    prev_cm: Optional[int]
+
+
+@dataclass(frozen=True)
+class BatteryEvent(Event):
+    battery_pct: int
+    prev_pct: Optional[int]
+
+
+@dataclass(frozen=True)
+class StateEvent(Event):
+    state: str
+    prev: Optional[str]
+
+
+@dataclass(frozen=True)
+class PoseEvent(Event):
+    x_cm: float
+    y_cm: float
+    z_cm: float
+    yaw_deg: float
+    source: str = "telemetry"   # "telemetry" o el movimiento que la ha cambiado ("move", "rc", "yaw", "reset")
+
+
+class EventBus:
+
+    def __init__(self):
+        self._subs: Dict[type, List[Callable[[Event], None]]] = {}
+        self._sync_subs: Dict[type, List[Callable[[Event], None]]] = {}
+        self._lock = threading.Lock()
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+
+    #Registra un callback para un tipo de evento. Devuelve una función que anula la suscripción
+    def subscribe(self, event_type: Type[Event], callback: Callable[[Event], None]) -> Callable[[], None]:
+        return self._add(self._subs, event_type, callback)
+
+    #Como subscribe, pero el callback se llama dentro de publish, en el hilo que publica (sin cola ni descartes)
+    def subscribe_sync(self, event_type: Type[Event], callback: Callable[[Event], None]) -> Callable[[], None]:
+        return self._add(self._sync_subs, event_type, callback)
+
+    def _add(self, table, event_type, callback) -> Callable[[], None]:
+        with self._lock:
+            # Copia al escribir: publish recorre la lista sin lock
+            table[event_type] = table.get(event_type, []) + [callback]
+
+        def unsubscribe():
+            with self._lock:
+                lst = [cb for cb in table.get(event_type, []) if cb is not callback]
+                if lst:
+                    table[event_type] = lst
+                else:
+                    table.pop(event_type, None)
+        return unsubscribe
+
+    def has_subscribers(self, event_type: Type[Event]) -> bool:
+        subs, sync = self._subs, self._sync_subs
+        return any(cls in subs or cls in sync for cls in event_type.__mro__)
+
+    #Los suscriptores síncronos se llaman aquí mismo; para el resto, el evento se reparte desde el hilo del bus
+    def publish(self, event: Event) -> None:
+        if self._sync_subs:
+            self._call(self._sync_subs, event)
+        subs = self._subs
+        if any(cls in subs for cls in type(event).__mro__):
+            self._enqueue((self._deliver, (event,)))
+
+    #Ejecuta fn(*args) en el hilo del bus, en orden con los eventos (trabajo que no debe hacerse en quien publica)
+    def post(self, fn: Callable, *args) -> None:
+        self._enqueue((fn, args))
+
+    def _enqueue(self, item) -> None:
+        with self._cond:
+            if len(self._queue) >= _MAX_PENDING:
+                # Solo se descartan eventos; el trabajo de post (p.ej. escrituras de la caja negra) no se pierde
+                viejo = next((it for it in self._queue if it[0] == self._deliver), None)
+                if viejo is not None:
+                    self._queue.remove(viejo)
+                    self.dropped += 1
+                    if self.dropped == 1:
+                        print("[events] Cola de eventos llena: se descartan los más viejos (¿un suscriptor bloqueado?)")
+            self._queue.append(item)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True, name="events")
+                self._thread.start()
+            self._cond.notify()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue)
+                fn, args = self._queue.popleft()
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"[events] Error en el hilo de eventos: {e}")
+
+    def _deliver(self, event: Event) -> None:
+        self._call(self._subs, event)
+
+    @staticmethod
+    def _call(subs, event: Event) -> None:
+        for cls in type(event).__mro__:
+            for cb in subs.get(cls, ()):
+                try:
+                    cb(event)
+                except Exception as e:
+                    print(f"[events] Error en suscriptor de {type(event).__name__}: {e}")
+
+    #El hilo actual es el repartidor (un callback que espera eventos se bloquearía a sí mismo)
+    def in_dispatcher(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    #Bloquea hasta el próximo evento del tipo dado que cumpla 'predicate' (o hasta 'timeout'); None si no llega
+    def wait_for(self, event_type: Type[Event], predicate: Optional[Callable[[Event], bool]] = None,
+                 timeout: Optional[float] = None) -> Optional[Event]:
+        if self.in_dispatcher():
+            # Desde un callback no puede llegar otro evento hasta que este termine: equivale a esperar sin más
+            time.sleep(timeout or 0.0)
+            return None
+        got: List[Event] = []
+        done = threading.Event()
+
+        def cb(ev):
+            if not done.is_set() and (predicate is None or predicate(ev)):
+                got.append(ev)
+                done.set()
+
+        unsubscribe = self.subscribe(event_type, cb)
+        try:
+            done.wait(timeout)
+        finally:
+            unsubscribe()
+        return got[0] if got else None
+
+    #Iterador asíncrono:  async for ev in dron.events.stream(PoseEvent): ...
+    #Si el consumidor va lento se descartan los eventos más viejos (cola de 'maxsize')
+    async def stream(self, event_type: Type[Event], maxsize: int = 64):
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+        def put(ev):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(ev)
+
+        unsubscribe = self.subscribe(event_type, lambda ev: loop.call_soon_threadsafe(put, ev))
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            unsubscribe()
+
+
+#Espera como mucho 'timeout' a un evento del tipo dado. Sin bus (o sin telemetría) equivale a un sleep
+def _wait_event(self, event_type: Type[Event], timeout: float) -> Optional[Event]:
+    bus = getattr(self, "events", None)
+    if bus is None:
+        time.sleep(timeout)
+        return None
+    return bus.wait_for(event_type, timeout=timeout)
@@ -0,0 +1,159 @@
+from __future__ import annotations
+import threading
+import time
+from typing import Any, NamedTuple, Optional
+
+#Anillo de fotogramas de vídeo. Los huecos se reservan una sola vez (con la forma del primer frame) y el
+#decodificador copia cada imagen en el siguiente. Cada frame lleva un número de secuencia creciente y la
+#marca time.monotonic() de su captura. Los consumidores esperan con wait_next(seq) a que llegue un frame
+#nuevo de verdad (sin sondear ni repetir el mismo) y reciben vistas de solo lectura del hueco, sin copiar.
+#Una vista es válida mientras el anillo no dé la vuelta (slots - 1 frames más): si se va a guardar más
+#tiempo hay que copiarla (np.copy) o comprobar antes valid(seq)
+
+_DEFAULT_SLOTS = 4
+
+
+def _need_numpy():  # Los huecos del anillo son arrays de NumPy
+    try:
+        import numpy as np
+    except Exception as e:
+        raise RuntimeError("Falta NumPy (pip install numpy)") from e
+    return np
+
+
+class Frame(NamedTuple):
+    seq: int
+    ts: float       # time.monotonic() al terminar de decodificarse
+    image: Any      # ndarray de solo lectura (alto x ancho x 3, RGB)
+    pose: Optional[dict] = None  # Pose/altura/yaw del dron en 'ts' (la pone el pipeline de vídeo, ver pose_at)
+
+
+class FrameRing:
+
+    def __init__(self, slots: int = _DEFAULT_SLOTS):
+        self._np = _need_numpy()
+        self.slots = max(2, int(slots))
+        self._bufs = None                   # Se reservan con el primer frame
+        self._views = [None] * self.slots   # Vistas de solo lectura de cada hueco
+        self._seq = [0] * self.slots
+        self._ts = [0.0] * self.slots
+        self._last = 0
+        self._cond = threading.Condition()
+
+    @property
+    def last_seq(self) -> int:
+        return self._last
+
+    #Copia la imagen en el siguiente hueco y despierta a quien espere. Un solo productor (el decodificador)
+    def publish(self, image, ts: Optional[float] = None) -> int:
+        np = self._np
+        ts = time.monotonic() if ts is None else float(ts)
+        seq = self._last + 1
+        k = seq % self.slots
+        nuevo = self._bufs is None or self._bufs[0].shape != image.shape or self._bufs[0].dtype != image.dtype
+        if nuevo:
+            # Cambio de resolución: se reservan huecos nuevos y el frame se copia antes de cambiarlos por los viejos,
+            # así latest/wait_next nunca devuelven un hueco sin escribir
+            bufs = [np.empty_like(image) for _ in range(self.slots)]
+            views = []
+            for b in bufs:
+                v = b.view()
+                v.flags.writeable = False
+                views.append(v)
+            np.copyto(bufs[k], image)
+        else:
+            # Se escribe en el hueco más viejo; el último publicado sigue intacto mientras tanto
+            np.copyto(self._bufs[k], image)
+        with self._cond:
+            if nuevo:
+                self._bufs, self._views = bufs, views
+                self._seq = [0] * self.slots   # Los demás huecos aún no tienen frame: get/valid no deben darlos
+            self._seq[k] = seq
+            self._ts[k] = ts
+            self._last = seq
+            self._cond.notify_all()
+        return seq
+
+    def _frame(self, k) -> Frame:
+        return Frame(self._seq[k], self._ts[k], self._views[k])
+
+    def latest(self) -> Optional[Frame]:
+        with self._cond:
+            if self._last == 0:
+                return None
+            return self._frame(self._last % self.slots)
+
+    #Bloquea hasta que haya un frame posterior a 'after_seq' y devuelve el más nuevo (None si vence el timeout)
+    def wait_next(self, after_seq: int = 0, timeout: Optional[float] = None) -> Optional[Frame]:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._last > after_seq, timeout):
+                return None
+            return self._frame(self._last % self.slots)
+
+    #Frame con ese número de secuencia, si aún no se ha sobrescrito
+    def get(self, seq: int) -> Optional[Frame]:
+        with self._cond:
+            if not self.valid(seq):
+                return None
+            return self._frame(seq % self.slots)
+
+    #El hueco de 'seq' no se ha reutilizado (el siguiente publish escribe en el de last + 1 - slots) ni se ha
+    #reservado de nuevo por un cambio de resolución
+    def valid(self, seq: int) -> bool:
+        return (0 < seq <= self._last and self._last - seq < self.slots - 1
+                and self._seq[seq % self.slots] == seq)
+
+
+#Lector de vídeo: decodifica el H.264 del Tello con PyAV en su propio hilo y publica cada frame en un
+#FrameRing. Mantiene el atributo 'frame' del lector de djitellopy (última imagen) por compatibilidad
+class FrameReader:
+
+    def __init__(self, address: str, slots: int = _DEFAULT_SLOTS):
+        self.address = address
+        self.ring = FrameRing(slots)
+        self.stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def frame(self):
+        f = self.ring.latest()
+        return None if f is None else f.image
+
+    def start(self) -> "FrameReader":
+        try:
+            import av  # noqa: F401
+        except Exception as e:
+            raise RuntimeError("Falta PyAV (pip install av)") from e
+        self.stopped = False
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopped = True
+        t = self._thread
+        if t is not None and t is not threading.current_thread():
+            t.join(timeout=2.0)
+        self._thread = None
+
+    def _loop(self) -> None:
+        import av
+        while not self.stopped:
+            try:
+                # timeout (apertura, lectura): así el hilo puede comprobar 'stopped' aunque no llegue vídeo
+                container = av.open(self.address, timeout=(5.0, 1.0))
+            except Exception as e:
+                if not self.stopped:
+                    print(f"[video] No se pudo abrir {self.address}: {e}")
+                    time.sleep(0.5)
+                continue
+            try:
+                for frame in container.decode(video=0):
+                    if self.stopped:
+                        break
+                    self.ring.publish(frame.to_ndarray(format="rgb24"), time.monotonic())
+            except Exception as e:
+                if not self.stopped:
+                    print(f"[video] Decodificación interrumpida: {e}")
+            finally:
+                container.close()
@@ -3,14 +3,30 @@ import math
 import threading
 import time
 from typing import List, Tuple, Optional, Dict, Any
+from TelloLink.modules.tello_recorder import _record_config
+from TelloLink.modules.tello_events import PoseEvent
+from TelloLink.modules.tello_pose import MAX_SPEED_CM_S
 
 _DEFAULT_MAX_X_CM = 150.0
 _DEFAULT_MAX_Y_CM = 150.0
 _DEFAULT_MAX_Z_CM = 120.0
 _MODE_SOFT_ABORT = "soft"
 _MODE_HARD_LAND = "hard"
-_DEFAULT_POLL_S = 0.10
+_DEFAULT_CONFIRM_S = 0.08  # Tiempo seguido fuera antes de actuar (~2 paquetes de telemetría a 10 Hz)
 _HARD_LAND_DELAY = 0.2
+_GRID_CELL_CM = 100.0      # Tamaño de celda del índice espacial de exclusiones
+_PATH_STEP_CM = 10.0       # Separación de las muestras al validar una trayectoria
+_TTC_REACTION_S = 0.3      # Retardo desde que se manda un rc hasta que el dron empieza a frenar
+_TTC_DECEL_CM_S2 = 250.0   # Deceleración de frenada del Tello
+_TTC_MARGEN_CM = 15.0      # Distancia al límite a la que debe quedar parado (por defecto de _gf_margen)
+
+def _need_numpy():  # NumPy solo hace falta para las consultas en lote (check_points)
+    try:
+        import numpy as np
+    except Exception as e:
+        raise RuntimeError("Falta NumPy (pip install numpy)") from e
+    return np
+
 
 # Funciones geométricas
 
@@ -72,6 +88,222 @@ def _point_in_circle(x, y, cx, cy, r_cm):
     return (dx * dx + dy * dy) <= (r_cm * r_cm + 1e-6)
 
 
+# Polígono de exclusión "compilado": se sigue usando como el dict de siempre ({"poly", "zmin", "zmax"}),
+# pero al crearlo se precalculan la caja envolvente, los lados, las pendientes inversas y el centroide,
+# así cada consulta descarta por caja y hace una sola pasada por los lados
+class ExclusionPolygon(dict):
+
+    def __init__(self, points, z_min_cm=None, z_max_cm=None):
+        poly = [(float(x), float(y)) for (x, y) in points]
+        super().__init__(poly=poly,
+                         zmin=float(z_min_cm) if z_min_cm is not None else None,
+                         zmax=float(z_max_cm) if z_max_cm is not None else None)
+        n = len(poly)
+        xs = [p[0] for p in poly] or [0.0]
+        ys = [p[1] for p in poly] or [0.0]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+        self.centroid = (sum(xs) / len(xs), sum(ys) / len(ys))
+
+        # Lado i: de poly[i] a poly[i+1] -> (x1, y1, dx, dy, longitud², dx/dy o None si es horizontal)
+        self.edges = []
+        for i in range(n):
+            x1, y1 = poly[i]
+            x2, y2 = poly[(i + 1) % n]
+            dx, dy = x2 - x1, y2 - y1
+            self.edges.append((x1, y1, dx, dy, dx * dx + dy * dy, dx / dy if dy != 0 else None))
+        self._np_edges = None  # Los mismos lados como arrays de NumPy, se crean en la primera consulta en lote
+
+    # Convierte un dict de exclusión (p.ej. añadido a mano a _gf_excl_polys) en un ExclusionPolygon
+    @classmethod
+    def from_entry(cls, entry):
+        if isinstance(entry, cls):
+            return entry
+        return cls(entry.get("poly", []), entry.get("zmin"), entry.get("zmax"))
+
+    def in_z(self, z):
+        zmin, zmax = self["zmin"], self["zmax"]
+        return (zmin is None or z >= zmin) and (zmax is None or z <= zmax)
+
+    # Mismo criterio que _point_in_poly (el borde cuenta como dentro), en una sola pasada
+    def contains(self, x, y, eps=1e-6):
+        if len(self.edges) < 3:
+            return False
+        xmin, ymin, xmax, ymax = self.bbox
+        if x < xmin - eps or x > xmax + eps or y < ymin - eps or y > ymax + eps:
+            return False
+        inside = False
+        for x1, y1, dx, dy, _, inv in self.edges:
+            px, py = x - x1, y - y1
+            # Sobre el lado: alineado (producto vectorial ~0) y entre los dos extremos
+            if abs(px * dy - py * dx) <= eps and px * (px - dx) + py * (py - dy) <= eps:
+                return True
+            # Ray casting: el rayo horizontal hacia +X cruza este lado
+            if inv is not None and ((y1 > y) != (y1 + dy > y)) and x < x1 + py * inv:
+                inside = not inside
+        return inside
+
+    # Versión vectorizada de contains para arrays de puntos (matriz puntos x lados)
+    def contains_many(self, np, xs, ys, eps=1e-6):
+        if len(self.edges) < 3 or len(xs) == 0:
+            return np.zeros(len(xs), dtype=bool)
+        if self._np_edges is None:
+            e = np.array([(x1, y1, dx, dy, inv if inv is not None else 0.0)
+                          for x1, y1, dx, dy, _, inv in self.edges], dtype=float)
+            self._np_edges = tuple(e[:, k] for k in range(5))
+        x1, y1, dx, dy, inv = self._np_edges
+        px = xs[:, None] - x1
+        py = ys[:, None] - y1
+        on_edge = (np.abs(px * dy - py * dx) <= eps) & (px * (px - dx) + py * (py - dy) <= eps)
+        # En los lados horizontales (y1 > y) == (y2 > y), así que inv = 0 no llega a usarse
+        crosses = ((y1 > ys[:, None]) != (y1 + dy > ys[:, None])) & (xs[:, None] < x1 + py * inv)
+        return on_edge.any(axis=1) | (crosses.sum(axis=1) % 2 == 1)
+
+    # Distancia del punto al lado más cercano
+    def distance(self, x, y):
+        best = float('inf')
+        for x1, y1, dx, dy, len_sq, _ in self.edges:
+            px, py = x - x1, y - y1
+            t = 0.0 if len_sq == 0 else max(0.0, min(1.0, (px * dx + py * dy) / len_sq))
+            ex, ey = px - t * dx, py - t * dy
+            d2 = ex * ex + ey * ey
+            if d2 < best:
+                best = d2
+        return math.sqrt(best)
+
+
+# Índice espacial de las exclusiones
+
+# Caja envolvente (xmin, ymin, xmax, ymax) de un círculo o polígono de exclusión
+def _bbox_exclusion(kind, entry):
+    if kind == "circle":
+        cx, cy, r = entry["cx"], entry["cy"], entry["r"]
+        return cx - r, cy - r, cx + r, cy + r
+    return entry.bbox
+
+
+# Rejilla uniforme en XY: cada zona se apunta en todas las celdas que toca su caja envolvente,
+# así las consultas solo miran las zonas cercanas al dron y no recorren todas las exclusiones
+class _ExclusionGrid:
+
+    def __init__(self, cell_cm=_GRID_CELL_CM):
+        self.cell = float(cell_cm)
+        self.cells: Dict[Tuple[int, int], List[Tuple[str, dict]]] = {}
+        self.signature = None
+
+    def _cell_of(self, x, y):
+        return int(math.floor(x / self.cell)), int(math.floor(y / self.cell))
+
+    def insert(self, kind, entry):
+        if not isinstance(entry, dict):
+            return  # Ignoramos datos corruptos
+        try:
+            if kind == "poly":
+                entry = ExclusionPolygon.from_entry(entry)
+            xmin, ymin, xmax, ymax = _bbox_exclusion(kind, entry)
+        except (KeyError, TypeError, ValueError):
+            return
+        i0, j0 = self._cell_of(xmin, ymin)
+        i1, j1 = self._cell_of(xmax, ymax)
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                self.cells.setdefault((i, j), []).append((kind, entry))
+
+    # Zonas cuya caja envolvente contiene la celda del punto (candidatas para contención)
+    def at(self, x, y):
+        return self.cells.get(self._cell_of(x, y), ())
+
+    # Círculos y polígonos cuya caja envolvente está a menos de 'alcance' del punto (sin repetir)
+    def near(self, x, y, alcance):
+        i0, j0 = self._cell_of(x - alcance, y - alcance)
+        i1, j1 = self._cell_of(x + alcance, y + alcance)
+        seen = set()
+        circulos, poligonos = [], []
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                for kind, entry in self.cells.get((i, j), ()):
+                    if id(entry) in seen:
+                        continue
+                    seen.add(id(entry))
+                    (circulos if kind == "circle" else poligonos).append(entry)
+        return circulos, poligonos
+
+
+# Firma barata de las listas de exclusiones: detecta si alguien las ha cambiado por fuera (p.ej. el demostrador)
+def _excl_signature(self):
+    circles = getattr(self, "_gf_excl_circles", [])
+    polys = getattr(self, "_gf_excl_polys", [])
+    return (id(circles), len(circles), id(circles[-1]) if circles else None,
+            id(polys), len(polys), id(polys[-1]) if polys else None)
+
+
+# Devuelve el índice de exclusiones, reconstruyéndolo solo si las listas han cambiado
+def _gf_index(self):
+    grid = getattr(self, "_gf_grid", None)
+    sig = _excl_signature(self)
+    if grid is None or grid.signature != sig:
+        grid = _ExclusionGrid()
+        for entry in getattr(self, "_gf_excl_circles", []):
+            grid.insert("circle", entry)
+        for entry in getattr(self, "_gf_excl_polys", []):
+            grid.insert("poly", entry)
+        grid.signature = sig
+        self._gf_grid = grid
+    return grid
+
+
+# Firma de la inclusión: si cambian los límites o el centro, el campo de distancias se reconstruye
+def _limits_signature(self):
+    lim = getattr(self, "_gf_limits", None)
+    return (tuple(sorted(lim.items())) if lim else None, tuple(getattr(self, "_gf_center", (0.0, 0.0))))
+
+
+# Devuelve el campo de distancias (GeofenceSDF) para consultar, o None si no se pidió o si ya no corresponde a
+# la inclusión y las exclusiones actuales (p.ej. listas cambiadas por fuera). Nunca lo construye: las consultas
+# llegan del hilo de eventos o del de rc, y reconstruir cuesta cientos de ms. Sin campo, se usan las exactas
+def _gf_field(self):
+    if not getattr(self, "_gf_sdf_cell", None):
+        return None
+    field = getattr(self, "_gf_sdf", None)
+    if field is None or field.signature != (_excl_signature(self), _limits_signature(self)):
+        return None
+    return field
+
+
+# Reconstruye entero el campo de distancias, en el hilo de quien cambia la configuración (set_geofence,
+# recenter_geofence, clear_exclusions...). El campo nuevo se publica de una vez al final
+def _gf_build_field(self):
+    cell = getattr(self, "_gf_sdf_cell", None)
+    if not cell:
+        self._gf_sdf = None
+        return None
+    from TelloLink.modules.tello_sdf import GeofenceSDF
+    try:
+        field = GeofenceSDF(getattr(self, "_gf_limits", None), getattr(self, "_gf_center", (0.0, 0.0)),
+                            list(getattr(self, "_gf_excl_circles", [])), list(getattr(self, "_gf_excl_polys", [])),
+                            cell_cm=cell)
+    except (RuntimeError, ValueError) as e:
+        print(f"[geofence] Sin campo de distancias: {e}")
+        self._gf_sdf_cell = None
+        self._gf_sdf = None
+        return None
+    field.signature = (_excl_signature(self), _limits_signature(self))
+    self._gf_sdf = field
+    return field
+
+
+# Añade al campo la zona nueva sobre una copia (with_zone) y la cambia por la actual de una vez. 'field' es el
+# campo válido de antes de añadir la zona; si no lo había o la zona cae fuera de la rejilla, se reconstruye entero
+def _gf_field_add(self, field, kind, item):
+    if not getattr(self, "_gf_sdf_cell", None):
+        return
+    if field is None or not field.covers(kind, item):
+        _gf_build_field(self)
+        return
+    new = field.with_zone(kind, item)
+    new.signature = (_excl_signature(self), _limits_signature(self))
+    self._gf_sdf = new
+
+
 # Función para construir el geofence
 
 def set_geofence(self,
@@ -80,7 +312,8 @@ def set_geofence(self,
                  max_z_cm=_DEFAULT_MAX_Z_CM,
                  z_min_cm=0.0,
                  mode=_MODE_SOFT_ABORT,
-                 poll_interval_s=_DEFAULT_POLL_S):
+                 confirm_s=_DEFAULT_CONFIRM_S,
+                 sdf_cell_cm=None):
     # Construimos diccionario de límites
     lim: Dict[str, float] = {}
     if max_x_cm and max_x_cm > 0:
@@ -96,7 +329,7 @@ def set_geofence(self,
     # Guardamos la configuración en atributos del objeto
     self._gf_limits = lim if lim else None
     self._gf_mode = mode if mode in (_MODE_SOFT_ABORT, _MODE_HARD_LAND) else _MODE_SOFT_ABORT
-    self._gf_poll_s = max(0.05, float(poll_interval_s))  # Mínimo 50ms
+    self._gf_confirm_s = max(0.0, float(confirm_s))  # 0: se actúa con la primera muestra fuera
 
     # Centro del geofence: si no está definido, usamos (0,0)
     if not hasattr(self, "_gf_center"):
@@ -110,10 +343,16 @@ def set_geofence(self,
     if not hasattr(self, "_gf_excl_circles"):
         self._gf_excl_circles = []
 
-    # Contador de violaciones consecutivas
-    self._gf_violation_streak = 0
+    # Inicio de la racha de violación en curso (None: dentro)
+    self._gf_violation_since = None
+
+    # Campo de distancias precalculado (opcional, NumPy): tamaño de celda en cm, None = consultas exactas
+    self._gf_sdf_cell = float(sdf_cell_cm) if sdf_cell_cm else None
+    field = _gf_build_field(self)
+    if field is not None:
+        print(f"[geofence] Campo de distancias: {field.nx}x{field.ny} celdas de {field.cell:g} cm")
 
-    # Reiniciamos el hilo monitor (lo paramos si existía, y lo iniciamos nuevo)
+    # Reiniciamos el monitor (lo paramos si existía, y lo iniciamos nuevo)
     _stop_geofence_monitor(self)
     _start_geofence_monitor(self)
 
@@ -121,6 +360,7 @@ def set_geofence(self,
     maxz_txt = f"z_max={lim.get('max_z', 0):.0f} cm" if lim else "z_max=∞"
     zmin_txt = f"z_min={lim.get('zmin', 0):.0f} cm"
     print(f"[geofence] Activado: {span_txt}, {zmin_txt}, {maxz_txt}, modo={self._gf_mode}")
+    _record_config(self)
 
 
 # Función para desactivar el geofence
@@ -128,6 +368,7 @@ def disable_geofence(self):
     self._gf_enabled = False
     _stop_geofence_monitor(self)
     print("[geofence] Desactivado.")
+    _record_config(self)
 
 
 # Función para reecentrar el geofence a la posición actual del dron en ese momento
@@ -137,7 +378,9 @@ def recenter_geofence(self):
         # Extraemos coordenadas actuales (con fallback a 0 si no existen)
         self._gf_center = (float(getattr(pose, "x_cm", 0.0) or 0.0),
                            float(getattr(pose, "y_cm", 0.0) or 0.0))
+        _gf_build_field(self)  # La inclusión se ha movido: campo nuevo (si se usa)
         print(f"[geofence] Recentrado en {self._gf_center}")
+        _record_config(self)
     else:
         print("[geofence] No se pudo recentrar (pose desconocida).")
 
@@ -162,7 +405,12 @@ def add_exclusion_circle(self, cx, cy, r_cm, z_min_cm=None, z_max_cm=None):
         "zmax": float(z_max_cm) if z_max_cm is not None else None
     }
 
+    grid = _gf_index(self)
+    field = _gf_field(self)
     self._gf_excl_circles.append(item)
+    grid.insert("circle", item)
+    grid.signature = _excl_signature(self)
+    _gf_field_add(self, field, "circle", item)
 
     # Nos aseguramos de que el monitor esté corriendo
     _ensure_gf_monitor(self)
@@ -170,6 +418,7 @@ def add_exclusion_circle(self, cx, cy, r_cm, z_min_cm=None, z_max_cm=None):
     z_range = f"z∈[{item['zmin']},{item['zmax']}]" if item['zmin'] is not None and item[
         'zmax'] is not None else "z=todas"
     print(f"[geofence] Círculo añadido: centro=({cx:.1f},{cy:.1f}), r={r:.1f}cm, {z_range}")
+    _record_config(self)
 
     return item
 
@@ -179,21 +428,22 @@ def add_exclusion_poly(self, points, z_min_cm=None, z_max_cm=None):
     if not hasattr(self, "_gf_excl_polys"):
         self._gf_excl_polys = []
 
-    # Convertimos todos los puntos a float
-    poly = [(float(x), float(y)) for (x, y) in points]
-
-    item = {
-        "poly": poly,
-        "zmin": float(z_min_cm) if z_min_cm is not None else None,
-        "zmax": float(z_max_cm) if z_max_cm is not None else None
-    }
+    # Compilamos el polígono una sola vez (caja, lados, centroide)
+    item = ExclusionPolygon(points, z_min_cm, z_max_cm)
+    poly = item["poly"]
 
+    grid = _gf_index(self)
+    field = _gf_field(self)
     self._gf_excl_polys.append(item)
+    grid.insert("poly", item)
+    grid.signature = _excl_signature(self)
+    _gf_field_add(self, field, "poly", item)
     _ensure_gf_monitor(self)
 
     z_range = f"z∈[{item['zmin']},{item['zmax']}]" if item['zmin'] is not None and item[
         'zmax'] is not None else "z=todas"
     print(f"[geofence] Polígono añadido: {len(poly)} vértices, {z_range}")
+    _record_config(self)
 
     return item
 
@@ -202,37 +452,40 @@ def add_exclusion_poly(self, points, z_min_cm=None, z_max_cm=None):
 def clear_exclusions(self):
     self._gf_excl_polys = []
     self._gf_excl_circles = []
+    self._gf_grid = None  # El índice se reconstruye en la siguiente consulta
+    _gf_build_field(self)  # Y el campo de distancias, si lo hay, queda solo con la inclusión
     print("[geofence] Exclusiones eliminadas.")
+    _record_config(self)
 
 
-# Función para iniciar el hilo que monitorea constantemente el dron
+# Función para iniciar el monitor: se suscribe de forma síncrona a los cambios de pose del dron, así cada paquete
+# de telemetría y cada movimiento confirmado se comprueban en el momento, sin hilo, sin sondeo y sin saltarse
+# ninguna muestra (no pasa por la cola del bus, que descarta eventos si se llena)
 def _start_geofence_monitor(self, force=False):
     # Si ya está monitoreando y no forzamos reinicio, no hacemos nada
     if getattr(self, "_gf_monitoring", False) and not force:
         return
+    if force:
+        _stop_geofence_monitor(self)
 
-    self._gf_monitoring = True
-
-    # Creamos hilo daemon (se cierra automáticamente cuando termina el programa)
-    t = threading.Thread(target=_gf_monitor_loop, args=(self,), daemon=True)
-    self._gf_thread = t
-    t.start()
+    bus = getattr(self, "events", None)
+    if bus is None:
+        print("[geofence] Sin bus de eventos: no se puede monitorizar la pose.")
+        return
 
+    self._gf_violation_since = None
+    self._gf_unsubscribe = bus.subscribe_sync(PoseEvent, lambda ev: _gf_on_pose(self, ev))
+    self._gf_monitoring = True
     print("[geofence] Monitor iniciado.")
 
 
-# Función para detener el hilo de monitoreo
+# Función para detener el monitor
 def _stop_geofence_monitor(self):
-    self._gf_monitoring = False  # Señal para que el loop termine
-
-    t = getattr(self, "_gf_thread", None)
-    if t and isinstance(t, threading.Thread):
-        try:
-            t.join(timeout=1.0)  # Esperamos máximo 1 segundo
-        except Exception:
-            pass
-
-    self._gf_thread = None
+    unsubscribe = getattr(self, "_gf_unsubscribe", None)
+    if unsubscribe is not None:
+        unsubscribe()
+    self._gf_unsubscribe = None
+    self._gf_monitoring = False
     print("[geofence] Monitor detenido.")
 
 
@@ -241,52 +494,45 @@ def _ensure_gf_monitor(self):
         _start_geofence_monitor(self)
 
 
-# Función principal del monitor del geofence, que verifica si se encuentra dentro o fuera de las zonas de exclusión e inclusión
-def _gf_monitor_loop(self):
-    self._gf_violation_streak = 0  # Contador de violaciones consecutivas
-
-    while getattr(self, "_gf_monitoring", False) and getattr(self, "_gf_enabled", False):
-        try:
-            # Solo verificamos si el dron está en un estado de vuelo activo
-            st = getattr(self, "state", "")
-            if st not in ("flying", "landing", "hovering", "takingoff"):
-                time.sleep(self._gf_poll_s)
-                continue  # Si está en tierra, no hay nada que verificar
-
-            # Obtenemos la posición actual del dron
-            pose = getattr(self, "pose", None)
-            if pose is None:
-                time.sleep(self._gf_poll_s)
-                continue  # Sin pose, no podemos verificar
-
-            # Extraemos coordenadas
-            x = float(getattr(pose, "x_cm", 0.0) or 0.0)
-            y = float(getattr(pose, "y_cm", 0.0) or 0.0)
-            z = float(getattr(pose, "z_cm", getattr(self, "height_cm", 0.0)) or 0.0)
-
-            violated = (not _inside_inclusion(self, x, y, z)) or _inside_any_exclusion(self, x, y, z)
-
-            if violated:
-                self._gf_violation_streak += 1
-            else:
-                self._gf_violation_streak = 0
+# Racha de violación medida en tiempo: se confirma cuando la pose lleva al menos _gf_confirm_s seguidos fuera.
+# ts: marca de time.monotonic() de la muestra
+def _gf_confirm(self, violated, ts):
+    if not violated:
+        self._gf_violation_since = None
+        return False
+    since = getattr(self, "_gf_violation_since", None)
+    if since is None:
+        self._gf_violation_since = since = ts
+    return ts - since >= getattr(self, "_gf_confirm_s", _DEFAULT_CONFIRM_S)
 
-            # Actuamos solo si hay 2 lecturas consecutivas de violación
 
-            if self._gf_violation_streak >= 2:
-                _handle_violation(self)
+# El punto está fuera de la inclusión o dentro de una exclusión (con campo de distancias, una consulta a la rejilla)
+def _gf_violated(self, x, y, z):
+    field = _gf_field(self)
+    d = field.distance(x, y, z) if field is not None else None
+    if d is not None:
+        return d < 0
+    return (not _inside_inclusion(self, x, y, z)) or _inside_any_exclusion(self, x, y, z)
 
-                # En modo HARD, salimos del loop después de ordenar aterrizaje
-                if getattr(self, "_gf_mode", _MODE_SOFT_ABORT) == _MODE_HARD_LAND:
-                    break
 
-        except Exception as e:
-            print(f"[geofence] Error monitor: {e}")
+# Función principal del monitor del geofence: se ejecuta con cada PoseEvent, en el hilo que ha cambiado la pose
+# (telemetría, goto, rc...), y verifica si se encuentra dentro o fuera de las zonas de exclusión e inclusión
+def _gf_on_pose(self, ev):
+    if not getattr(self, "_gf_enabled", False):
+        return
+    try:
+        # Solo verificamos si el dron está en un estado de vuelo activo
+        st = getattr(self, "state", "")
+        if st not in ("flying", "landing", "hovering", "takingoff"):
+            self._gf_violation_since = None
+            return  # Si está en tierra, no hay nada que verificar
 
-        time.sleep(self._gf_poll_s)  # Esperamos antes de la siguiente verificación
+        x, y, z = float(ev.x_cm), float(ev.y_cm), float(ev.z_cm)
+        if _gf_confirm(self, _gf_violated(self, x, y, z), ev.ts):
+            _handle_violation(self)
 
-    # Salimos del bucle - marcamos que ya no estamos monitoreando
-    self._gf_monitoring = False
+    except Exception as e:
+        print(f"[geofence] Error monitor: {e}")
 
 
 # Función para verificar si se encuentra dentro de la zona de inclusión
@@ -317,44 +563,145 @@ def _inside_inclusion(self, x, y, z):
     return in_x and in_y and in_z
 
 
-# Función para verificar si se encuentra dentro de alguna zona de exclusión
+# Función para verificar si se encuentra dentro de alguna zona de exclusión.
+# Solo se miran las zonas apuntadas en la celda del índice donde está el dron
 def _inside_any_exclusion(self, x, y, z):
-    # Verificamos polígonos de exclusión
-    for entry in list(getattr(self, "_gf_excl_polys", [])):
-        if not isinstance(entry, dict):
-            continue  # Ignoramos datos corruptos
-
-        poly = entry.get("poly", [])
-        zmin = entry.get("zmin")
-        zmax = entry.get("zmax")
-
-        if _point_in_poly(x, y, poly):
-            # El punto está dentro del polígono en X,Y
-            # Ahora verificamos si también está en el rango de altura
+    for kind, entry in _gf_index(self).at(x, y):
+        if kind == "poly":
+            # El índice guarda los polígonos ya compilados (la caja descarta casi todos)
+            if entry.contains(x, y):
+                # El punto está dentro del polígono en X,Y
+                # Ahora verificamos si también está en el rango de altura
+                if entry.in_z(z):
+                    print(f"[geofence]  VIOLACIÓN POLY @ ({x:.1f},{y:.1f},{z:.1f})")
+                    return True
+
+        elif _point_in_circle(x, y, entry.get("cx"), entry.get("cy"), entry.get("r")):
+            # Está dentro del círculo en X,Y, verificamos altura
+            zmin = entry.get("zmin")
+            zmax = entry.get("zmax")
             z_ok = (zmin is None or z >= zmin) and (zmax is None or z <= zmax)
             if z_ok:
-                print(f"[geofence]  VIOLACIÓN POLY @ ({x:.1f},{y:.1f},{z:.1f})")
+                print(f"[geofence]  VIOLACIÓN CIRCLE @ ({x:.1f},{y:.1f},{z:.1f})")
                 return True
 
-    # Verificamos círculos de exclusión
-    for entry in list(getattr(self, "_gf_excl_circles", [])):
+    return False  # No está en ninguna exclusión
+
+
+# Evaluación en lote de muchos puntos (trayectorias, validación previa, reproducciones).
+# Devuelve (violado, zonas): violado es un array bool con un valor por punto y zonas es un dict
+# {id_zona: array bool de los puntos que la violan} con ids "inclusion", "circle:<i>" y "poly:<i>"
+# (i = posición en _gf_excl_circles / _gf_excl_polys). Solo aparecen las zonas con algún punto
+def check_points(self, xs, ys, zs):
+    np = _need_numpy()
+    x, y, z = np.broadcast_arrays(np.asarray(xs, dtype=float).ravel(),
+                                  np.asarray(ys, dtype=float).ravel(),
+                                  np.asarray(zs, dtype=float).ravel())
+    n = len(x)
+    violated = np.zeros(n, dtype=bool)
+    zonas: Dict[str, Any] = {}
+
+    # Inclusión: mismos criterios que _inside_inclusion
+    lim = getattr(self, "_gf_limits", None)
+    if lim:
+        cx, cy = getattr(self, "_gf_center", (0.0, 0.0))
+        max_x = float(lim.get("max_x", 0.0) or 0.0)
+        max_y = float(lim.get("max_y", 0.0) or 0.0)
+        max_z = float(lim.get("max_z", 0.0) or 0.0)
+        zmin = float(lim.get("zmin", 0.0) or 0.0)
+        inside = np.ones(n, dtype=bool)
+        if max_x > 0:
+            inside &= np.abs(x - cx) <= max_x / 2.0
+        if max_y > 0:
+            inside &= np.abs(y - cy) <= max_y / 2.0
+        if max_z > 0:
+            inside &= (z >= zmin) & (z <= max_z)
+        if not inside.all():
+            zonas["inclusion"] = ~inside
+            violated |= ~inside
+
+    # Exclusiones: ordenamos los puntos por X una vez y cada zona solo mira la franja de su caja envolvente
+    order = np.argsort(x, kind="stable")
+    x_sorted = x[order]
+
+    def candidatos(xmin, ymin, xmax, ymax, zmin, zmax):
+        lo = np.searchsorted(x_sorted, xmin - 1e-6, side="left")
+        hi = np.searchsorted(x_sorted, xmax + 1e-6, side="right")
+        idx = order[lo:hi]
+        sel = (y[idx] >= ymin - 1e-6) & (y[idx] <= ymax + 1e-6)
+        if zmin is not None:
+            sel &= z[idx] >= zmin
+        if zmax is not None:
+            sel &= z[idx] <= zmax
+        return idx[sel]
+
+    def marcar(zona, idx):
+        hit = np.zeros(n, dtype=bool)
+        hit[idx] = True
+        zonas[zona] = hit
+        violated[idx] = True
+
+    for i, c in enumerate(getattr(self, "_gf_excl_circles", [])):
+        if not isinstance(c, dict):
+            continue
+        cx_c, cy_c, r = float(c["cx"]), float(c["cy"]), float(c["r"])
+        idx = candidatos(cx_c - r, cy_c - r, cx_c + r, cy_c + r, c.get("zmin"), c.get("zmax"))
+        if len(idx):
+            idx = idx[(x[idx] - cx_c) ** 2 + (y[idx] - cy_c) ** 2 <= r * r + 1e-6]
+            if len(idx):
+                marcar(f"circle:{i}", idx)
+
+    # Polígonos: tras el filtro por caja, test completo vectorizado (matriz puntos x lados)
+    for i, entry in enumerate(getattr(self, "_gf_excl_polys", [])):
         if not isinstance(entry, dict):
             continue
+        poly = ExclusionPolygon.from_entry(entry)
+        idx = candidatos(*poly.bbox, poly["zmin"], poly["zmax"])
+        if len(idx):
+            idx = idx[poly.contains_many(np, x[idx], y[idx])]
+            if len(idx):
+                marcar(f"poly:{i}", idx)
 
-        cx_c = entry.get("cx")
-        cy_c = entry.get("cy")
-        r = entry.get("r")
-        zmin = entry.get("zmin")
-        zmax = entry.get("zmax")
+    return violated, zonas
 
-        if _point_in_circle(x, y, cx_c, cy_c, r):
-            # Está dentro del círculo en X,Y, verificamos altura
-            z_ok = (zmin is None or z >= zmin) and (zmax is None or z <= zmax)
-            if z_ok:
-                print(f"[geofence]  VIOLACIÓN CIRCLE @ ({x:.1f},{y:.1f},{z:.1f})")
-                return True
 
-    return False  # No está en ninguna exclusión
+# Valida una trayectoria planificada antes de volarla. 'tramos' es una lista de polilíneas [(x, y, z), ...],
+# una por tramo, que se muestrean cada paso_cm y se evalúan de una vez con check_points.
+# Devuelve None si no cruza ninguna zona prohibida (o el geofence está desactivado) y, si la cruza,
+# (índice del tramo, id de zona, (x, y, z)) del primer punto que la viola
+def check_path(self, tramos, paso_cm=_PATH_STEP_CM):
+    if not getattr(self, "_gf_enabled", False):
+        return None
+    try:
+        np = _need_numpy()
+    except RuntimeError as e:
+        print(f"[geofence] Trayectoria sin validar: {e}")
+        return None
+
+    paso = max(1.0, float(paso_cm))
+    muestras, tramo_de = [], []
+    for k, pts in enumerate(tramos):
+        pts = np.asarray(pts, dtype=float).reshape(-1, 3)
+        if len(pts) == 0:
+            continue
+        for a, b in zip(pts[:-1], pts[1:]):
+            n = max(1, int(math.ceil(np.linalg.norm(b - a) / paso)))
+            t = np.arange(n)[:, None] / n
+            muestras.append(a + t * (b - a))
+            tramo_de.append(np.full(n, k))
+        muestras.append(pts[-1:])
+        tramo_de.append(np.full(1, k))
+    if not muestras:
+        return None
+
+    pts = np.concatenate(muestras)
+    tramo_de = np.concatenate(tramo_de)
+    violated, zonas = check_points(self, pts[:, 0], pts[:, 1], pts[:, 2])
+    if not violated.any():
+        return None
+    first = int(np.argmax(violated))
+    zona = next(z for z, m in zonas.items() if m[first])
+    return int(tramo_de[first]), zona, tuple(round(float(v), 1) for v in pts[first])
 
 
 # Función que maneja y decide el tratamiento a las violaciones dependiendo del modo de geofence
@@ -383,8 +730,8 @@ def _handle_violation(self):
 
         print("[geofence]  Aterrizando de emergencia…")
 
-        # Detenemos el monitor para evitar bucles infinitos
-        self._gf_monitoring = False
+        # Detenemos el monitor para no volver a disparar mientras aterriza
+        _stop_geofence_monitor(self)
 
         # Ejecutamos el aterrizaje en un hilo separado
         def do_land():
@@ -552,281 +899,6 @@ def joystick_a_mundo(vx_joy, vy_joy, yaw_deg):
 
 
 
-#Función para calcular la distancia al "peligro" (límite) más cercano en la dirección del movimiento
-#Como busco que el dron se pueda acercar al "peligro" y que vaya siendo avisado de que está a punto de llegar a un límite, por eso se usa esta función
-def calcular_distancia_peligro(x_dron, y_dron, z_dron,
-                               vel_X_mundo, vel_Y_mundo, vel_Z,
-                               limites, centro,
-                               circulos_excl, poligonos_excl):
-
-
-    # Lista donde guardaremos todas las distancias a "peligros"
-
-    distancias = []
-
-
-    #Inclusión
-
-    # Aquí calculamos la distancia a los bordes del rectángulo
-    # Solo nos importa el borde hacia donde vamos
-
-    if limites:
-        # Extraemos el centro del geofence
-        cx, cy = centro
-
-
-        half_x = limites.get("max_x", 0) / 2
-        half_y = limites.get("max_y", 0) / 2
-
-
-        z_min = limites.get("zmin", 0)
-        z_max = limites.get("max_z", 200)
-
-
-
-        # Si vamos hacia +X (adelante en el mundo)
-        if vel_X_mundo > 0 and half_x > 0:
-            # El límite adelante está en: centro + mitad del ancho
-            limite_adelante= cx + half_x
-            # La distancia es: límite - donde estoy
-            dist = limite_adelante - x_dron
-            distancias.append(dist)
-
-        # Si vamos hacia -X (atras en el mundo)
-        elif vel_X_mundo < 0 and half_x > 0:
-            # El límite atras está en: centro - mitad del ancho
-            limite_atras = cx - half_x
-            # La distancia es: donde estoy - límite
-            dist = x_dron - limite_atras
-            distancias.append(dist)
-
-
-
-        if vel_Y_mundo > 0 and half_y > 0:
-            limite_derecha = cy + half_y
-            dist = limite_derecha - y_dron
-            distancias.append(dist)
-
-        elif vel_Y_mundo < 0 and half_y > 0:
-            limite_izquierda = cy - half_y
-            dist = y_dron - limite_izquierda
-            distancias.append(dist)
-
-
-
-        # Si subimos
-        if vel_Z > 0 and z_max > 0:
-            dist = z_max - z_dron
-            distancias.append(dist)
-
-        # Si bajamos
-        elif vel_Z < 0:
-            dist = z_dron - z_min
-            distancias.append(dist)
-
-
-    #Exclusión (círculos)
-
-    # Para cada círculo, calculamos si vamos hacia él
-    # y a qué distancia está su borde
-
-    for c in circulos_excl:
-
-        c_x = c["cx"]  # Centro X del círculo
-        c_y = c["cy"]  # Centro Y del círculo
-        radio = c["r"]  # Radio del círculo
-
-        # Vector que va desde el dron hacia el centro del círculo
-        # Si el círculo está a la derecha, dy será positivo
-        # Si el círculo está arriba, dx será positivo
-        dx = c_x - x_dron
-        dy = c_y - y_dron
-
-        #Producto escalar: nos dice si vamos hacia el círculo o no
-        # Si es positivo: vamos hacia el círculo
-        # Si es negativo o cero: vamos en otra dirección
-        producto = vel_X_mundo * dx + vel_Y_mundo * dy
-
-        if producto > 0:
-
-
-            # Distancia del dron al centro  del círculo (Pitágoras)
-            dist_al_centro = math.sqrt(dx * dx + dy * dy)
-
-            # Distancia al borde del círculo (perímetro)
-
-            dist_al_borde = dist_al_centro - radio
-
-            # Solo añadimos si es positiva
-            if dist_al_borde > 0:
-                distancias.append(dist_al_borde)
-
-
-    # Exclusión (polígonos)
-
-    for p in poligonos_excl:
-        # Extraemos la lista de puntos del polígono
-
-        poly = p["poly"]
-
-        # Vamos a buscar la distancia al segmento más cercano
-        dist_min_poly = float('inf')
-
-        # Recorremos cada lado del polígono
-        # El lado i va del punto i al punto i+1
-        for i in range(len(poly)):
-            # Punto inicial del lado
-            x1, y1 = poly[i]
-            # Punto final del lado (% len para cerrar el polígono)
-            x2, y2 = poly[(i + 1) % len(poly)]
-
-            # Calculamos distancia del dron a este segmento
-            dist_segmento = _distancia_punto_a_segmento(x_dron, y_dron, x1, y1, x2, y2)
-
-            # Nos quedamos con la menor
-            if dist_segmento < dist_min_poly:
-                dist_min_poly = dist_segmento
-
-        # Ahora verificamos si vamos hacia  el polígono
-        # Usamos el  (punto medio) del polígono como referencia rápida de donde está el polígono
-        centroide_x = sum(pt[0] for pt in poly) / len(poly)
-        centroide_y = sum(pt[1] for pt in poly) / len(poly)
-
-        # Vector del dron al centroide
-        dx = centroide_x - x_dron
-        dy = centroide_y - y_dron
-
-        # Producto escalar:
-        producto = vel_X_mundo * dx + vel_Y_mundo * dy
-
-        if producto > 0 and dist_min_poly < float('inf'):
-            # Sí vamos hacia él, añadimos la distancia
-            distancias.append(dist_min_poly)
-
-
-
-    # Devolvemos la distancia mínima, es decir el peligro más cercano
-
-    if distancias:
-
-        return max(0, min(distancias))
-    else:
-
-        return float('inf')
-
-#Función para calcular la distancia a un segmento
-def _distancia_punto_a_segmento(px, py, x1, y1, x2, y2):
-
-
-    # Vector del segmento (de punto 1 a punto 2)
-    dx = x2 - x1
-    dy = y2 - y1
-
-    # Longitud al cuadrado del segmento
-
-    len_sq = dx * dx + dy * dy
-
-    if len_sq == 0:
-        # Caso especial: el segmento es un punto (los dos extremos son iguales)
-        # La distancia es simplemente la distancia al punto
-        return math.sqrt((px - x1) ** 2 + (py - y1) ** 2)
-
-    # "t" es la proyección del punto sobre la línea del segmento
-    # t=0 significa que el punto más cercano es el extremo (x1,y1)
-    # t=1 significa que el punto más cercano es el extremo (x2,y2)
-    # t entre 0 y 1 significa que el punto más cercano está en medio del segmento
-    t = ((px - x1) * dx + (py - y1) * dy) / len_sq
-
-    # Limitamos t entre 0 y 1
-    t = max(0, min(1, t))
-
-    # Calculamos el punto más cercano en el segmento
-    cerca_x = x1 + t * dx
-    cerca_y = y1 + t * dy
-
-    # Distancia del punto original al punto más cercano (Pitágoras)
-    return math.sqrt((px - cerca_x) ** 2 + (py - cerca_y) ** 2)
-
-#Función para calcular el factor de atenuacion en la velocidad a medida que nos acercamos al peligro
-#La idea es que a medida que nos acercamos, cada vez nos cuesta mas, finalmente el dron no avanzará
-def calcular_factor_atenuacion(distancia, margen=30.0):
-
-
-    # Si estamos lejos del peligro (fuera del margen)
-    if distancia >= margen:
-        return 1.0  # Velocidad completa normal
-
-    # Si estamos en el límite o ya lo pasamos
-    if distancia <= 0:
-        return 0.0  # Parar completamente el dron
-
-    # Si estamos en la zona de transición
-    # Factor proporcional: más cerca = más frena el dron
-    factor = distancia / margen
-
-    return factor
-
-
-#Función para aplicar la atenuación
-def aplicar_atenuacion_completa(vel_X_mundo, vel_Y_mundo, vel_Z, factor, x_dron, y_dron, peligro_info):
-
-
-    vel_X_at = vel_X_mundo
-    vel_Y_at = vel_Y_mundo
-    vel_Z_at = vel_Z
-
-    tipo = peligro_info.get("tipo")
-
-    #Rectangulo
-    if tipo == "rectangulo":
-        direccion = peligro_info.get("direccion")
-
-        if direccion == "+X" and vel_X_mundo > 0:
-            vel_X_at = vel_X_mundo * factor
-        elif direccion == "-X" and vel_X_mundo < 0:
-            vel_X_at = vel_X_mundo * factor
-        elif direccion == "+Y" and vel_Y_mundo > 0:
-            vel_Y_at = vel_Y_mundo * factor
-        elif direccion == "-Y" and vel_Y_mundo < 0:
-            vel_Y_at = vel_Y_mundo * factor
-        elif direccion == "+Z" and vel_Z > 0:
-            vel_Z_at = vel_Z * factor
-        elif direccion == "-Z" and vel_Z < 0:
-            vel_Z_at = vel_Z * factor
-
-    #Círculo o polígono
-    elif tipo in ("circulo", "poligono"):
-
-        # Atenuamos la componente de velocidad que va hacia él "peligro"
-
-        cx, cy = peligro_info.get("centro", (0, 0))
-
-        # Vector del dron hacia el peligro
-        dx = cx - x_dron
-        dy = cy - y_dron
-
-        # Normalizamos (longitud = 1)
-        longitud = math.sqrt(dx * dx + dy * dy)
-        if longitud > 0:
-            dx_norm = dx / longitud
-            dy_norm = dy / longitud
-
-            # Componente de velocidad hacia el peligro
-            vel_hacia_peligro = vel_X_mundo * dx_norm + vel_Y_mundo * dy_norm
-
-            # Solo atenuamos si vamos hacia el peligro
-            if vel_hacia_peligro > 0:
-                # Calculamos cuánto hay que restar
-                reduccion = vel_hacia_peligro * (1 - factor)
-
-                # Restamos en la dirección del peligro
-                vel_X_at = vel_X_mundo - reduccion * dx_norm
-                vel_Y_at = vel_Y_mundo - reduccion * dy_norm
-
-    return vel_X_at, vel_Y_at, vel_Z_at
-
-
-
 #Función que transforma velocidades del mundo a velocidades relativas al dron
 def mundo_a_joystick(vel_X_mundo, vel_Y_mundo, yaw_deg):
 
@@ -846,6 +918,95 @@ def mundo_a_joystick(vel_X_mundo, vel_Y_mundo, yaw_deg):
 
     return vx_joy, vy_joy
 
+#Capa predictiva: lanzamos el rayo de la velocidad (en cm/s, ejes del mundo) contra las caras de la caja de
+#inclusión y contra los bordes y tapas de cada exclusión, y devolvemos el tiempo hasta el primer impacto.
+#Cada exclusión es un prisma: su planta (círculo o polígono, cóncavo o no) entre zmin y zmax.
+#Si el rayo no choca con nada devuelve inf; si ya está fuera de la inclusión y se aleja más, 0
+def tiempo_hasta_impacto(x_dron, y_dron, z_dron, vel_X, vel_Y, vel_Z,
+                         limites, centro, circulos_excl, poligonos_excl):
+
+    impactos = [float('inf')]
+
+    # Inclusión: solo cuentan las caras hacia las que vamos
+    if limites:
+        cx, cy = centro
+        half_x = limites.get("max_x", 0) / 2
+        half_y = limites.get("max_y", 0) / 2
+        caras = []
+        if half_x > 0:
+            caras.append((x_dron, vel_X, cx - half_x, cx + half_x))
+        if half_y > 0:
+            caras.append((y_dron, vel_Y, cy - half_y, cy + half_y))
+        caras.append((z_dron, vel_Z, limites.get("zmin", 0.0), limites.get("max_z", float('inf'))))
+        for pos, vel, bajo, alto in caras:
+            if vel > 0 and alto < float('inf'):
+                impactos.append(max(0.0, (alto - pos) / vel))
+            elif vel < 0:
+                impactos.append(max(0.0, (bajo - pos) / vel))
+
+    def en_banda(zona, t):
+        z = z_dron + vel_Z * t
+        return (zona["zmin"] is None or z >= zona["zmin"]) and (zona["zmax"] is None or z <= zona["zmax"])
+
+    # Tapas del prisma: instante en que el rayo cruza zmin/zmax con la planta debajo
+    def tapas(zona, dentro_planta):
+        if vel_Z == 0:
+            return
+        for zc in (zona["zmin"], zona["zmax"]):
+            if zc is None:
+                continue
+            t = (zc - z_dron) / vel_Z
+            if t >= 0 and dentro_planta(x_dron + vel_X * t, y_dron + vel_Y * t):
+                impactos.append(t)
+
+    # Exclusiones circulares: |p + v·t - c| = r
+    for c in circulos_excl:
+        dentro = lambda px, py, c=c: _point_in_circle(px, py, c["cx"], c["cy"], c["r"])
+        if dentro(x_dron, y_dron) and en_banda(c, 0.0):
+            continue  # Ya dentro: de eso se encarga el monitor, aquí se deja salir
+        dx, dy = x_dron - c["cx"], y_dron - c["cy"]
+        a = vel_X * vel_X + vel_Y * vel_Y
+        b = 2.0 * (dx * vel_X + dy * vel_Y)
+        k = dx * dx + dy * dy - c["r"] * c["r"]
+        disc = b * b - 4.0 * a * k
+        if a > 0 and disc >= 0:
+            raiz = math.sqrt(disc)
+            for t in ((-b - raiz) / (2.0 * a), (-b + raiz) / (2.0 * a)):
+                if t >= 0 and en_banda(c, t):
+                    impactos.append(t)
+        tapas(c, dentro)
+
+    # Exclusiones poligonales: cruce del rayo con cada lado
+    for p in poligonos_excl:
+        if not isinstance(p, ExclusionPolygon):
+            p = ExclusionPolygon.from_entry(p)
+        if len(p.edges) < 3:
+            continue
+        if p.contains(x_dron, y_dron) and p.in_z(z_dron):
+            continue
+        for x1, y1, ex, ey, _, _ in p.edges:
+            den = vel_X * ey - vel_Y * ex
+            if den == 0:
+                continue  # Rayo paralelo al lado
+            qx, qy = x1 - x_dron, y1 - y_dron
+            t = (qx * ey - qy * ex) / den
+            u = (qx * vel_Y - qy * vel_X) / den
+            if t >= 0 and 0.0 <= u <= 1.0 and en_banda(p, t):
+                impactos.append(t)
+        tapas(p, p.contains)
+
+    return min(impactos)
+
+
+#Velocidad máxima (cm/s) con la que aún se puede parar en 'distancia' cm: la que cumple
+#v·reacción + v²/(2·deceleración) = distancia. Equivale a exigir tiempo_hasta_impacto >= reacción + v/(2·decel)
+def velocidad_segura(distancia, reaccion_s=_TTC_REACTION_S, decel_cm_s2=_TTC_DECEL_CM_S2):
+    if distancia <= 0:
+        return 0.0
+    a = float(decel_cm_s2)
+    return a * (-reaccion_s + math.sqrt(reaccion_s * reaccion_s + 2.0 * distancia / a))
+
+
 #Función principal que aplica el geofence a los comandos rc del joystick
 def aplicar_geofence_rc(self, vx_joy, vy_joy, vz, yaw_joy):
 
@@ -867,18 +1028,34 @@ def aplicar_geofence_rc(self, vx_joy, vy_joy, vz, yaw_joy):
     # Obtenemos los límites y exclusiones
     limites = getattr(self, "_gf_limits", None)
     centro = getattr(self, "_gf_center", (0.0, 0.0))
-    circulos = getattr(self, "_gf_excl_circles", [])
-    poligonos = getattr(self, "_gf_excl_polys", [])
-    margen = getattr(self, "_gf_margen", 30.0)
+    margen = getattr(self, "_gf_margen", _TTC_MARGEN_CM)
+    # Con EKF, el margen crece con la incertidumbre de la pose (2 sigmas)
+    ekf = getattr(pose, "ekf", None)
+    if ekf is not None:
+        margen = float(margen) + 2.0 * ekf.sigma_xy_cm
 
-    #Transformarmos joystick a "mundo"
+    #Transformarmos joystick a "mundo" y de % a cm/s
     vel_X_mundo, vel_Y_mundo = joystick_a_mundo(vx_joy, vy_joy, yaw_deg)
+    escala = MAX_SPEED_CM_S / 100.0
+    vX, vY, vZ = vel_X_mundo * escala, vel_Y_mundo * escala, vz * escala
+    rapidez = math.sqrt(vX * vX + vY * vY + vZ * vZ)
+    if rapidez <= 0:
+        return vx_joy, vy_joy, vz, yaw_joy
 
-    #Calcular distancia al peligro más cercano
-    distancia = calcular_distancia_peligro(x_dron, y_dron, z_dron, vel_X_mundo, vel_Y_mundo, vz, limites, centro, circulos, poligonos)
-
-    #Calcular factor de atenuación
-    factor = calcular_factor_atenuacion(distancia, margen)
+    #Tiempo hasta el impacto siguiendo la velocidad pedida. Solo importan las exclusiones que se alcanzan
+    #antes de poder parar, así que del índice se piden las que están a menos de esa distancia
+    frenada = rapidez * _TTC_REACTION_S + rapidez * rapidez / (2.0 * _TTC_DECEL_CM_S2) + float(margen)
+    #Con campo de distancias, el rayo se recorre por sphere tracing (unas pocas consultas a la rejilla)
+    field = _gf_field(self)
+    ttc = field.time_to_impact(x_dron, y_dron, z_dron, vX, vY, vZ, frenada) if field is not None else None
+    if ttc is None:
+        circulos, poligonos = _gf_index(self).near(x_dron, y_dron, frenada)
+        ttc = tiempo_hasta_impacto(x_dron, y_dron, z_dron, vX, vY, vZ, limites, centro, circulos, poligonos)
+
+    #Se limita la rapidez a la que permite parar antes del impacto (dejando 'margen' cm); con tiempo de sobra, 1
+    factor = 1.0
+    if ttc < float('inf'):
+        factor = min(1.0, velocidad_segura(rapidez * ttc - float(margen)) / rapidez)
 
     #Aplicar la atenuación
     vel_X_at = vel_X_mundo * factor
@@ -3,7 +3,8 @@ import math
 import threading
 import time
 from typing import Optional, Callable, Any
-from TelloLink.modules.tello_move import MIN_STEP
+from TelloLink.modules.tello_move import MIN_STEP, MAX_STEP, punto_sdk_valido
+from TelloLink.modules.tello_pose import MAX_SPEED_CM_S
 
 #Parámetros ajustables
 _MIN_BAT_PCT   = 20        #Batería mínima para realizar la operación
@@ -11,8 +12,25 @@ _STEP_XY_CM    = 25.0      #Paso horizontal
 _STEP_Z_CM     = 20.0      #Paso vertical
 _TOL_XY_CM     = 8         #Tolerancia horizontal
 _TOL_Z_CM      = 8         #Tolerancia vertical
+_TOL_MAX_CM    = 20        #Tolerancia máxima cuando crece la incertidumbre del EKF
 _SLEEP_S       = 0.10      #Pausa entre comandos
 _MAX_RETRY_CMD = 2         #Reintentos de cada paso si falla
+_GO_SPEED_CM_S = 50        #Velocidad de los tramos "go" si no se indica otra
+_TAKEOFF_Z_CM  = 50.0      #Altura del despegue automático (takeOff(0.5))
+
+#Parámetros del modo "rc" (control continuo de velocidad)
+_RC_HZ          = 30.0     #Frecuencia de envío de consignas rc (20-50 Hz)
+_RC_VMAX_XY     = 80.0     #Velocidad de crucero horizontal por defecto (cm/s)
+_RC_VMAX_Z      = 50.0     #Velocidad vertical máxima (cm/s)
+_RC_ACCEL       = 150.0    #Aceleración máxima de la consigna (cm/s²): rampa de arranque y frenada
+_RC_KP          = 1.5      #Ganancia proporcional sobre la posición (1/s)
+_RC_KI          = 0.3      #Ganancia integral (corrige derivas pequeñas cerca del objetivo)
+_RC_I_MAX       = 15.0     #Saturación del término integral (cm/s)
+_RC_KYAW        = 1.5      #Ganancia del yaw (% rc por grado de error)
+_RC_YAW_MAX_PCT = 60
+_RC_TOL_YAW_DEG = 3.0
+_RC_SETTLE_TICKS = 4       #Ticks seguidos dentro de tolerancia para dar el objetivo por alcanzado
+_TELEMETRY_MAX_AGE_S = 0.5 #Si la telemetría es más vieja, la pose se estima con la consigna enviada
 
 #Función que decide el tamaño de cada paso a realizar según lo que le queda por recorrer.
 def _adaptive_step(rest: float, base: float, min_step: float = MIN_STEP) -> float:
@@ -40,7 +58,7 @@ def _rotate_to_yaw(self, target_yaw_deg: float) -> bool:
 
 
 
-#Esta función envía un mmovimiento al dron, espera la confirmación y actualiza la pose virtual si tuvo éxito
+#Esta función envía un mmovimiento al dron y espera la confirmación, reintentando si falla
 def _send_and_update(self, cmd: str, dist_cm: float) -> bool:
     dist_i = int(round(dist_cm))
     if dist_i <= 0: #Si la distancia del paso a realizar es 0, devuelve True
@@ -48,23 +66,166 @@ def _send_and_update(self, cmd: str, dist_cm: float) -> bool:
     for _ in range(_MAX_RETRY_CMD + 1): #Hacemos un bucle con el numero de "vueltas" (intentos) que son el inicial + el número de reintentos
         resp = getattr(self, cmd)(dist_i) #Ejecuta el movimiento
         ok = bool(str(resp).lower() == "ok" or resp is True) #Comprueba si el dron confirmó el movimiento
-        if ok: #Si se ejecutó correctamente
-            try:
-                if hasattr(self, "pose") and self.pose: #Comprueba que haya el atributo pose exista
-                    self.pose.update_move(cmd, dist_i) #Si existe, actualiza las coordenadas
-            except Exception:
-                pass
+        if ok: #Si se ejecutó correctamente (la pose ya la actualiza _move tras el "ok")
             return True
         time.sleep(0.05)
     return False
 
 
+def _wrap180(deg: float) -> float:
+    return (deg + 180.0) % 360.0 - 180.0
+
+
+def _clamp(v: float, lim: float) -> float:
+    return max(-lim, min(lim, v))
+
+
+#Pasa un desplazamiento en el mapa (x, y) a los ejes del SDK (x adelante, y izquierda) según el yaw actual
+def _mundo_a_sdk(self, dx: float, dy: float) -> tuple:
+    yaw = math.radians(getattr(self.pose, "yaw_deg", 0.0) or 0.0)
+    f = dx * math.cos(yaw) + dy * math.sin(yaw)
+    l = dx * math.sin(yaw) - dy * math.cos(yaw)
+    return f, l
+
+
+#Lleva el dron hacia el objetivo con comandos "go": un solo comando por tramo de hasta MAX_STEP cm por eje.
+#Devuelve False si el SDK rechaza algún tramo; en ese caso (y para lo que quede) siguen los micro-pasos
+def _go_towards(self, x_goal: float, y_goal: float, z_goal: float, speed_cm_s: float) -> bool:
+    f, l = _mundo_a_sdk(self, x_goal - self.pose.x_cm, y_goal - self.pose.y_cm)
+    u = z_goal - self.pose.z_cm
+    n = max(1, math.ceil(max(abs(f), abs(l), abs(u)) / MAX_STEP))
+    seg = (int(round(f / n)), int(round(l / n)), int(round(u / n)))
+    if not punto_sdk_valido(*seg):
+        return True  #Demasiado corto para "go": lo harán los micro-pasos
+    for _ in range(n):
+        if getattr(self, "_goto_abort", False):
+            return False
+        bat = getattr(self, "battery_pct", None)
+        if isinstance(bat, int) and bat < _MIN_BAT_PCT:
+            return False
+        try:
+            self.go(*seg, speed_cm_s)
+        except Exception as e:
+            print(f"[goto] Tramo go fallido ({e}); sigo con micro-pasos.")
+            return False
+    return True
+
+
+#Tolerancias de llegada: con EKF no se exige más precisión que 2 sigmas de la estimación (con tope)
+def _tolerances(self):
+    ekf = getattr(getattr(self, "pose", None), "ekf", None)
+    if ekf is None:
+        return _TOL_XY_CM, _TOL_Z_CM
+    return (min(_TOL_MAX_CM, max(_TOL_XY_CM, 2.0 * ekf.sigma_xy_cm)),
+            min(_TOL_MAX_CM, max(_TOL_Z_CM, 2.0 * ekf.sigma_z_cm)))
+
+
+#Integra la pose durante el modo rc. Si llega telemetría, las velocidades medidas ya las integra (o las fusiona
+#el EKF) el hilo de telemetría con sus marcas de tiempo; si no, se estima con la consigna enviada
+def _integrate_rc_pose(self, fb_pct: float, lr_pct: float, ud_pct: float, yaw_pct: float, dt: float) -> None:
+    ekf = getattr(self.pose, "ekf", None)
+    if ekf is not None and ekf.telemetry_fresh():
+        ekf.advance()
+        return
+    if not self.telemetry_fresh(_TELEMETRY_MAX_AGE_S):
+        self.pose.update_from_rc(fb_pct, lr_pct, ud_pct, yaw_pct, dt_sec=dt)
+
+
+def _stop_rc(self) -> None:
+    for _ in range(3):  #rc no tiene confirmación: lo repetimos por si se pierde algún paquete
+        self.rc(0, 0, 0, 0)
+        time.sleep(0.02)
+
+
+#Lazo cerrado de velocidad: en cada tick calcula la velocidad deseada hacia el objetivo con un perfil
+#trapezoidal (acelera, crucero y frena a tiempo), le suma un PI sobre el error de posición y la envía como rc
+#yaw_goal va en el sistema de la pose (relativo al despegue), como pose.yaw_deg
+def _goto_rc_loop(self, x_goal: float, y_goal: float, z_goal: float,
+                  yaw_goal: Optional[float], vmax_xy: float) -> bool:
+    dt_nom = 1.0 / _RC_HZ
+    vmax_xy = max(10.0, min(float(vmax_xy), MAX_SPEED_CM_S))
+    dist0 = math.sqrt((x_goal - self.pose.x_cm) ** 2 + (y_goal - self.pose.y_cm) ** 2 + (z_goal - self.pose.z_cm) ** 2)
+    t_max = 8.0 + 3.0 * dist0 / min(vmax_xy, _RC_VMAX_Z)  #Tiempo máximo antes de rendirse
+
+    v_cmd = [0.0, 0.0, 0.0]   #Consigna actual en mundo (x, y, z) en cm/s
+    integ = [0.0, 0.0, 0.0]
+    settled = 0
+    t0 = last = time.monotonic()
+    cmd = (0.0, 0.0, 0.0, 0.0)
+
+    try:
+        while True:
+            if getattr(self, "_goto_abort", False):
+                print("[goto] Abortado por solicitud externa.")
+                return False
+            bat = getattr(self, "battery_pct", None)
+            if isinstance(bat, int) and bat < _MIN_BAT_PCT:
+                print(f"[goto] Abortado por batería ({bat}%).")
+                return False
+
+            now = time.monotonic()
+            dt = max(1e-3, now - last)
+            last = now
+            _integrate_rc_pose(self, cmd[0], cmd[1], cmd[2], cmd[3], dt)
+
+            ex = x_goal - self.pose.x_cm
+            ey = y_goal - self.pose.y_cm
+            ez = z_goal - self.pose.z_cm
+            exy = math.hypot(ex, ey)
+            eyaw = _wrap180(yaw_goal - self.pose.yaw_deg) if yaw_goal is not None else 0.0
+
+            tol_xy, tol_z = _tolerances(self)
+            if exy <= tol_xy and abs(ez) <= tol_z and abs(eyaw) <= _RC_TOL_YAW_DEG:
+                settled += 1
+                if settled >= _RC_SETTLE_TICKS:
+                    return True
+            else:
+                settled = 0
+            if now - t0 > t_max:
+                print(f"[goto] Tiempo agotado en modo rc (error {exy:.0f} cm, {ez:.0f} cm).")
+                return False
+
+            #Velocidad deseada: como mucho la de crucero y la que permite frenar a tiempo (v² = 2·a·d)
+            v_xy = min(vmax_xy, math.sqrt(2.0 * _RC_ACCEL * exy), _RC_KP * exy)
+            v_z = min(_RC_VMAX_Z, math.sqrt(2.0 * _RC_ACCEL * abs(ez)), _RC_KP * abs(ez))
+            target = [v_xy * ex / exy if exy > 1e-6 else 0.0,
+                      v_xy * ey / exy if exy > 1e-6 else 0.0,
+                      math.copysign(v_z, ez)]
+            for i, e in enumerate((ex, ey, ez)):
+                integ[i] = _clamp(integ[i] + _RC_KI * e * dt, _RC_I_MAX)
+                target[i] += integ[i]
+                #Rampa: la consigna no cambia más de a·dt por tick
+                v_cmd[i] += _clamp(target[i] - v_cmd[i], _RC_ACCEL * dt)
+
+            #Mundo -> ejes del dron (forward, right)
+            yaw = math.radians(self.pose.yaw_deg)
+            vf = v_cmd[0] * math.cos(yaw) + v_cmd[1] * math.sin(yaw)
+            vr = -v_cmd[0] * math.sin(yaw) + v_cmd[1] * math.cos(yaw)
+            fb = _clamp(vf / MAX_SPEED_CM_S * 100.0, 100)
+            lr = _clamp(vr / MAX_SPEED_CM_S * 100.0, 100)
+            ud = _clamp(v_cmd[2] / MAX_SPEED_CM_S * 100.0, 100)
+            yw = _clamp(_RC_KYAW * eyaw, _RC_YAW_MAX_PCT)
+
+            #El geofence atenúa la consigna igual que con el joystick
+            if hasattr(self, "aplicar_geofence_rc"):
+                lr, fb, ud, yw = self.aplicar_geofence_rc(lr, fb, ud, yw)
+
+            lr_i, fb_i, ud_i, yw_i = (int(round(v)) for v in (lr, fb, ud, yw))
+            self.rc(lr_i, fb_i, ud_i, yw_i)
+            cmd = (float(fb_i), float(lr_i), float(ud_i), float(yw_i))
+
+            time.sleep(max(0.0, dt_nom - (time.monotonic() - now)))
+    finally:
+        _stop_rc(self)
+
+
 def _goto_rel_worker(self,
                      dx_cm: float, dy_cm: float, dz_cm: float = 0.0,
                      yaw_deg: Optional[float] = None,
                      speed_cm_s: Optional[float] = None,
                      callback: Optional[Callable[..., Any]] = None,
-                     params: Any = None) -> None:
+                     params: Any = None,
+                     mode: str = "step") -> None:
     #Chequeos básicos previos
     if not hasattr(self, "pose") or self.pose is None: #Si la pose no existe, aborta
         print("[goto] No hay PoseVirtual; abortando.")
@@ -77,6 +238,32 @@ def _goto_rel_worker(self,
         print(f"[goto] Batería baja ({bat}%), abortando.")
         return
 
+    #Antes de mover nada, comprobamos que el tramo recto (y el despegue, si hace falta) no cruce el geofence
+    p = (float(self.pose.x_cm), float(self.pose.y_cm), float(self.pose.z_cm))
+    tramo = [p]
+    if getattr(self, "state", "") != "flying":
+        p = (p[0], p[1], _TAKEOFF_Z_CM)
+        tramo.append(p)
+    goal = (p[0] + float(dx_cm), p[1] + float(dy_cm), p[2] + float(dz_cm))
+    tramo.append(goal)
+    fallo = self.check_path([tramo]) if hasattr(self, "check_path") else None
+    if fallo is not None:
+        #Si el tramo recto cruza una exclusión, buscamos un desvío con el planificador
+        ruta = self.plan_path(p, goal) if hasattr(self, "plan_path") else None
+        if not ruta or self.check_path([tramo[:-1] + ruta]) is not None:
+            print(f"[goto] Rechazado: la trayectoria entra en '{fallo[1]}' en {fallo[2]}.")
+            return
+        print(f"[goto] Desvío por {len(ruta) - 1} punto(s) para evitar '{fallo[1]}'.")
+        for wx, wy, wz in ruta[:-1]:
+            _goto_rel_worker(self, wx - self.pose.x_cm, wy - self.pose.y_cm, wz - self.pose.z_cm,
+                             None, speed_cm_s, None, None, mode)
+            if getattr(self, "_goto_abort", False):
+                return
+        #Último tramo hasta el objetivo, ya en línea recta
+        dx_cm = goal[0] - self.pose.x_cm
+        dy_cm = goal[1] - self.pose.y_cm
+        dz_cm = goal[2] - self.pose.z_cm
+
     #Si el dron no está volando, hace un despegue seguro a 0,5 metros
     if getattr(self, "state", "") != "flying":
         ok = self.takeOff(0.5, blocking=True)
@@ -85,6 +272,26 @@ def _goto_rel_worker(self,
             return
         time.sleep(0.4)
 
+    #Modo rc: la velocidad y el giro los lleva el propio lazo de control
+    if mode == "rc":
+        x_goal = self.pose.x_cm + float(dx_cm)
+        y_goal = self.pose.y_cm + float(dy_cm)
+        z_goal = self.pose.z_cm + float(dz_cm)
+        #yaw_deg es el yaw absoluto de la IMU (igual que en el modo step); el lazo trabaja con el de la pose,
+        #relativo al despegue, así que se resta la referencia tomada al despegar
+        yaw_goal = ((float(yaw_deg) - float(self.pose.yaw0_deg or 0.0)) % 360.0
+                    if yaw_deg is not None else None)
+        vmax = float(speed_cm_s) if speed_cm_s is not None else _RC_VMAX_XY
+        if not _goto_rc_loop(self, x_goal, y_goal, z_goal, yaw_goal, vmax):
+            return
+        print("[goto] Objetivo alcanzado.")
+        if callback:
+            try: callback(params)
+            except TypeError:
+                try: callback()
+                except Exception: pass
+        return
+
     #Si la velocidad no se ha pasado en la función, intenta fijar la velocidad del SDK de Tello
     if speed_cm_s is not None:
         try:
@@ -114,7 +321,8 @@ def _goto_rel_worker(self,
 
     # Si ya estamos dentro de tolerancia, nada que hacer
     _, _, rz0, rxy0 = remaining()
-    if (abs(rz0) <= _TOL_Z_CM) and (rxy0 <= _TOL_XY_CM):
+    tol_xy, tol_z = _tolerances(self)
+    if (abs(rz0) <= tol_z) and (rxy0 <= tol_xy):
         if callback:
             try: callback(params)
             except TypeError:
@@ -122,6 +330,10 @@ def _goto_rel_worker(self,
                 except Exception: pass
         return
 
+    #Tramo principal con "go" nativo; los micro-pasos quedan para corregir el residuo
+    _go_towards(self, x_goal, y_goal, z_goal,
+                float(speed_cm_s) if speed_cm_s is not None else _GO_SPEED_CM_S)
+
     # Bucle hasta llegar al objetivo, o que haya algún error debido a motivos de seguridad
     while True:
         # posibilidad de aborto externo
@@ -135,14 +347,15 @@ def _goto_rel_worker(self,
             return
 
         rx, ry, rz, rxy = remaining() #Actualiza la distancia que falta en tiempo real
+        tol_xy, tol_z = _tolerances(self)
 
         #Si consideramos que ya ha llegado (dentro de las tolerancias) se hace el break, y sale del bucle
-        if (abs(rz) <= _TOL_Z_CM) and (rxy <= _TOL_XY_CM):
+        if (abs(rz) <= tol_z) and (rxy <= tol_xy):
             break
 
-        #Corregir primero la altura
-        if abs(rz) > _TOL_Z_CM: #si aún hay que subir o bajar
-            stepz = _adaptive_step(rz, _STEP_Z_CM, min_step=20.0) #realiza el paso
+        #Corregir primero la altura (solo si falta al menos el paso mínimo del SDK: uno más corto se ampliaría a 20 cm y oscilaría)
+        if abs(rz) > tol_z and abs(rz) >= MIN_STEP: #si aún hay que subir o bajar
+            stepz = _adaptive_step(rz, _STEP_Z_CM) #realiza el paso
             cmd = "up" if rz > 0 else "down"
             if not _send_and_update(self, cmd, stepz): #se envía el paso al dron y actualiza la pose, si falla se muestra el mensaje
                 print("[goto] Micro-paso Z fallido.")
@@ -152,29 +365,31 @@ def _goto_rel_worker(self,
         #Este bloque convierte lo que falta en el mapa a cuanto falta avanzar/retroceder/izquierda/derecha según hacia donde mira el dron (yaw)
         yaw = math.radians(getattr(self.pose, "yaw_deg", 0.0) or 0.0) #lee el yaw actual y lo convierte a radianes
         fx, fy = math.cos(yaw), math.sin(yaw)  # eje forward (mundo)
-        rx_, ry_ = math.sin(yaw), -math.cos(yaw)  # eje right = forward rotado -90° (CW)
+        rx_, ry_ = -math.sin(yaw), math.cos(yaw)  # eje right, mismo convenio que PoseVirtual.update_move
 
         f_comp = rx * fx + ry * fy     #componente frontal
         r_comp = rx * rx_ + ry * ry_   #componente horizontal
 
         moved = False
 
-        if abs(f_comp) > (_TOL_XY_CM * 0.4): #Si lo que falta por avanzar o retroceder es mayor que el 40% de la tolerancia
-            stepx = _adaptive_step(f_comp, _STEP_XY_CM, min_step=15.0) #Se realiza el paso con su función
+        if abs(f_comp) >= MIN_STEP: #Si lo que falta por avanzar o retroceder admite un paso del SDK
+            stepx = _adaptive_step(f_comp, _STEP_XY_CM) #Se realiza el paso con su función
             cmd = "forward" if f_comp > 0 else "back" #decide si va hacia delante o detrás
             if not _send_and_update(self, cmd, stepx): #se manda el comando al dron y se actualiza la pose
                 print("[goto] Micro-paso forward/back fallido.")
             moved = True
         #Se realiza lo mismo pero para derecha o izquierda
-        if abs(r_comp) > (_TOL_XY_CM * 0.4):
-            stepy = _adaptive_step(r_comp, _STEP_XY_CM, min_step=15.0)
+        if abs(r_comp) >= MIN_STEP:
+            stepy = _adaptive_step(r_comp, _STEP_XY_CM)
             cmd = "right" if r_comp > 0 else "left"
             if not _send_and_update(self, cmd, stepy):
                 print("[goto] Micro-paso right/left fallido.")
             moved = True
 
-        # si no hay nada significativo que mover, evita bucle vacío
-        if not moved and rxy <= _TOL_XY_CM:
+        #Lo que queda es menor que el paso mínimo del SDK: se termina con el lazo cerrado rc, que sí admite correcciones finas
+        if not moved:
+            if not _goto_rc_loop(self, x_goal, y_goal, z_goal, None, _RC_VMAX_XY):
+                return
             break
 
         time.sleep(_SLEEP_S)
@@ -193,12 +408,18 @@ def goto_rel(self,
              speed_cm_s: Optional[float] = None,
              blocking: bool = True,
              callback: Optional[Callable[..., Any]] = None,
-             params: Any = None) -> None:
+             params: Any = None,
+             mode: str = "step") -> None:
+    #mode="step": un "go" por tramo, micro-pasos forward/right/up y el lazo rc para el residuo de menos de 20 cm (por defecto)
+    #mode="rc": lazo cerrado que envía consignas rc a _RC_HZ y converge de forma continua
+    #yaw_deg, en ambos modos, es el yaw absoluto de la IMU del Tello (self.yaw_deg), no el relativo al despegue
+    if mode not in ("step", "rc"):
+        raise ValueError(f"Modo de goto desconocido: {mode}")
     setattr(self, "_goto_abort", False)
 
     t = threading.Thread(
         target=_goto_rel_worker,
-        args=(self, dx_cm, dy_cm, dz_cm, yaw_deg, speed_cm_s, callback, params),
+        args=(self, dx_cm, dy_cm, dz_cm, yaw_deg, speed_cm_s, callback, params, mode),
         daemon=True
     )
     t.start()
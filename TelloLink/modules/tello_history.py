@@ -0,0 +1,191 @@
+from __future__ import annotations
+import threading
+from typing import Optional
+
+#Historial de telemetría de capacidad fija sobre un array estructurado de NumPy reservado de una vez.
+#Cada paquete se escribe dos veces (en i y en i + capacidad): así cualquier ventana de hasta 'capacidad'
+#registros es un trozo contiguo del array y last(n)/between(t0, t1) devuelven vistas sin copiar.
+#La memoria no crece aunque el vuelo dure horas: los registros más viejos se van sobrescribiendo.
+#Las vistas son "en vivo": si se van a guardar mucho tiempo, hay que copiarlas (np.copy)
+
+_DEFAULT_CAPACITY = 6000   #10 minutos a 10 Hz
+_MAX_GAP_S = 0.5           #at(): distancia máxima a un paquete fuera del historial para dar el estado por válido
+_INTERP_FIELDS = ("wall_ts", "height_cm", "tof_cm", "vx_cm_s", "vy_cm_s", "vz_cm_s", "x_cm", "y_cm", "z_cm")
+_ANGLE_FIELDS = ("yaw_deg", "pose_yaw_deg")
+
+
+def _need_numpy():  # El historial es un array estructurado de NumPy
+    try:
+        import numpy as np
+    except Exception as e:
+        raise RuntimeError("Falta NumPy (pip install numpy)") from e
+    return np
+
+
+def _dtype(np):
+    return np.dtype([
+        ("ts", "f8"),            # time.monotonic() de llegada del paquete
+        ("wall_ts", "f8"),
+        ("height_cm", "f4"),
+        ("tof_cm", "f4"),
+        ("baro_cm", "f4"),
+        ("yaw_deg", "f4"),
+        ("vx_cm_s", "f4"),       # Mismo signo que TelloDron.vx_cm_s (adelante)
+        ("vy_cm_s", "f4"),
+        ("vz_cm_s", "f4"),
+        ("battery_pct", "f4"),
+        ("temp_c", "f4"),
+        ("x_cm", "f4"),          # Pose estimada tras procesar el paquete
+        ("y_cm", "f4"),
+        ("z_cm", "f4"),
+        ("pose_yaw_deg", "f4"),  # Yaw de la pose (relativo al despegue); yaw_deg es el absoluto del Tello
+    ])
+
+
+class TelemetryHistory:
+
+    def __init__(self, capacity: int = _DEFAULT_CAPACITY):
+        np = _need_numpy()
+        self._np = np
+        self.capacity = max(1, int(capacity))
+        self._buf = np.zeros(2 * self.capacity, dtype=_dtype(np))
+        self._next = 0           # Posición (0..capacidad-1) del próximo registro
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._next = 0
+            self._count = 0
+
+    #O(1): un registro en las dos copias del anillo
+    def append(self, st, pose=None) -> None:
+        rec = (st.ts, st.wall_ts, st.height_cm, st.tof_cm, st.baro_cm, st.yaw_deg,
+               st.vx_cm_s, st.vy_cm_s, st.vz_cm_s, st.battery_pct, st.temp_c,
+               getattr(pose, "x_cm", 0.0), getattr(pose, "y_cm", 0.0), getattr(pose, "z_cm", 0.0),
+               getattr(pose, "yaw_deg", 0.0))
+        with self._lock:
+            i = self._next
+            self._buf[i] = rec
+            self._buf[i + self.capacity] = rec
+            self._next = (i + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    #Vista contigua con todo lo guardado, del más viejo al más nuevo
+    def _window(self):
+        with self._lock:
+            end = self._next + self.capacity if self._count == self.capacity else self._next
+            return self._buf[end - self._count:end]
+
+    def all(self):
+        return self._window()
+
+    def last(self, n: int):
+        w = self._window()
+        n = max(0, min(int(n), len(w)))
+        return w[len(w) - n:]
+
+    #Registros con t0 <= ts <= t1 (marcas de time.monotonic()); búsqueda binaria porque ts es creciente
+    def between(self, t0: float, t1: float):
+        w = self._window()
+        ts = w["ts"]
+        a = int(self._np.searchsorted(ts, t0, side="left"))
+        b = int(self._np.searchsorted(ts, t1, side="right"))
+        return w[a:b]
+
+    #Estado interpolado en el instante 'ts' (time.monotonic()) entre los dos paquetes que lo rodean; los ángulos
+    #por el camino corto. Fuera del historial se toma el paquete más cercano (p.ej. un frame más nuevo que el
+    #último paquete), salvo que esté a más de 'max_gap_s'. 'dt_ms' es la distancia al paquete más cercano
+    def at(self, ts: float, max_gap_s: float = _MAX_GAP_S) -> Optional[dict]:
+        np = self._np
+        w = self._window()
+        if len(w) == 0:
+            return None
+        t = w["ts"]
+        b = int(np.searchsorted(t, ts, side="left"))
+        if b == 0 or b == len(w):
+            r = w[0] if b == 0 else w[-1]
+            gap = abs(float(r["ts"]) - ts)
+            if gap > max_gap_s:
+                return None
+            out = {k: float(r[k]) for k in _INTERP_FIELDS + _ANGLE_FIELDS}
+        else:
+            r0, r1 = w[b - 1], w[b]
+            t0, t1 = float(r0["ts"]), float(r1["ts"])
+            a = (ts - t0) / (t1 - t0) if t1 > t0 else 1.0
+            out = {k: float(r0[k]) + a * (float(r1[k]) - float(r0[k])) for k in _INTERP_FIELDS}
+            for k in _ANGLE_FIELDS:
+                d = (float(r1[k]) - float(r0[k]) + 180.0) % 360.0 - 180.0
+                out[k] = (float(r0[k]) + a * d) % 360.0
+            gap = min(ts - t0, t1 - ts)
+        out["ts"] = float(ts)
+        out["dt_ms"] = round(1000.0 * gap, 1)
+        return out
+
+    #Registros de los últimos 'seconds' segundos (respecto al último paquete)
+    def last_seconds(self, seconds: float):
+        w = self._window()
+        if len(w) == 0:
+            return w
+        return self.between(float(w["ts"][-1]) - float(seconds), float(w["ts"][-1]))
+
+    #Estadísticas vectorizadas sobre una ventana (por defecto, todo el historial)
+
+    def mean_speed(self, rows=None) -> Optional[float]:
+        np = self._np
+        rows = self._window() if rows is None else rows
+        if len(rows) == 0:
+            return None
+        v = np.sqrt(rows["vx_cm_s"].astype("f8") ** 2 + rows["vy_cm_s"] ** 2 + rows["vz_cm_s"] ** 2)
+        return float(v.mean())
+
+    def max_height(self, rows=None) -> Optional[float]:
+        rows = self._window() if rows is None else rows
+        if len(rows) == 0:
+            return None
+        return float(rows["height_cm"].max())
+
+    #Pendiente de la batería en %/s por mínimos cuadrados (negativa al descargar)
+    def battery_slope(self, rows=None) -> Optional[float]:
+        np = self._np
+        rows = self._window() if rows is None else rows
+        if len(rows) < 2:
+            return None
+        t = rows["ts"] - rows["ts"][0]
+        b = rows["battery_pct"].astype("f8")
+        tc = t - t.mean()
+        den = float(np.dot(tc, tc))
+        if den <= 0:
+            return None
+        return float(np.dot(tc, b - b.mean()) / den)
+
+    #Distancia recorrida en el plano según la pose guardada
+    def distance_xy(self, rows=None) -> Optional[float]:
+        np = self._np
+        rows = self._window() if rows is None else rows
+        if len(rows) < 2:
+            return None
+        return float(np.hypot(np.diff(rows["x_cm"].astype("f8")), np.diff(rows["y_cm"].astype("f8"))).sum())
+
+
+#Pose, altura y yaw del dron en el instante 'ts' (time.monotonic(), p.ej. Frame.ts), interpolados del historial
+#de telemetría. Sin historial (o si 'ts' cae lejos de él) se usa la pose actual, con dt_ms = None
+def pose_at(self, ts: float) -> Optional[dict]:
+    hist = getattr(self, "history", None)
+    h = hist.at(ts) if hist is not None else None
+    if h is not None:
+        return {"ts": h["ts"], "wall_ts": round(h["wall_ts"], 3),
+                "x_cm": round(h["x_cm"], 1), "y_cm": round(h["y_cm"], 1), "z_cm": round(h["z_cm"], 1),
+                "yaw_deg": round(h["pose_yaw_deg"], 1), "height_cm": round(h["height_cm"], 1),
+                "dt_ms": h["dt_ms"]}
+    pose = getattr(self, "pose", None)
+    if pose is None:
+        return None
+    out = {"ts": float(ts), "wall_ts": None}
+    out.update(pose.capture())
+    out["height_cm"] = getattr(self, "height_cm", None)
+    out["dt_ms"] = None
+    return out
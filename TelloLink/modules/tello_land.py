@@ -1,5 +1,6 @@
 import threading
 import time
+from TelloLink.modules.tello_events import HeightEvent, _wait_event
 
 #Función en la que intentamos leer la altura del backend del Tello, y si falla usamos el valor guardado en self.height_cm
 def _read_height_cm_runtime(self) -> float:
@@ -95,7 +96,7 @@ def _land(self, callback=None, params=None):
             h = _read_height_cm_runtime(self)
             if h <= LOW_CM:
                 break
-            time.sleep(0.2)
+            _wait_event(self, HeightEvent, 0.2)  # Despierta con la próxima altura (sin telemetría, cada 0.2 s)
 
         #Normalizamos el estado al final
         _normalize_after_land(self)
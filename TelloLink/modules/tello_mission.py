@@ -1,10 +1,16 @@
 from __future__ import annotations
+import math
 import threading
 import time
 from typing import Any, Dict, List, Optional, Callable
+from TelloLink.modules.tello_goto import _mundo_a_sdk
+from TelloLink.modules.tello_move import punto_sdk_valido, radio_curva, CURVE_MIN_RADIUS, CURVE_MAX_RADIUS
 
 
 _MIN_BAT_PCT = 20  # batería mínima para ejecutar una misión
+_CURVE_SPEED_CM_S = 50  # velocidad de los tramos "curve" (el SDK admite 10-60)
+_TAKEOFF_Z_CM = 50.0    # altura del despegue automático de la misión
+_ARC_SAMPLES = 24       # puntos con los que se aproxima un "curve" al validar la misión
 
 def _is_abs_wp(wp: Dict[str, Any]) -> bool:
     has_abs = all(k in wp for k in ("x", "y", "z"))
@@ -43,6 +49,128 @@ def _validate_and_normalize(waypoints: List[Dict[str, Any]]) -> List[Dict[str, A
     return norm
 
 
+#Objetivo absoluto (x, y, z) de un waypoint partiendo de 'desde' (las coordenadas que falten se mantienen)
+def _goal_of(wp: Dict[str, Any], desde: tuple) -> tuple:
+    if wp["mode"] == "rel":
+        return desde[0] + wp["dx"], desde[1] + wp["dy"], desde[2] + wp["dz"]
+    return tuple(desde[i] if wp[k] is None else wp[k] for i, k in enumerate(("x", "y", "z")))
+
+
+#Dos waypoints seguidos solo se unen en un "curve" si en el primero no hay que girar ni esperar
+def _curvable(wp_a: Dict[str, Any], wp_b: Dict[str, Any]) -> bool:
+    return wp_a["yaw"] is None and wp_b["yaw"] is None and wp_a["delay"] <= 0
+
+
+#Regla única para volar de 'desde' a goal_b pasando por goal_a con un "curve" (la usan la misión y su
+#validación previa): puntos válidos para el SDK, radio admitido y arco fuera del geofence.
+#Devuelve (p1, p2, arco) o None para ir punto a punto
+def _curve_plan(self, desde: tuple, goal_a: tuple, goal_b: tuple) -> Optional[tuple]:
+    pts = []
+    for g in (goal_a, goal_b):
+        f, l = _mundo_a_sdk(self, g[0] - desde[0], g[1] - desde[1])
+        pts.append((int(round(f)), int(round(l)), int(round(g[2] - desde[2]))))
+    p1, p2 = pts
+    if not (punto_sdk_valido(*p1) and punto_sdk_valido(*p2)):
+        return None
+    if not (CURVE_MIN_RADIUS <= radio_curva(p1, p2) <= CURVE_MAX_RADIUS):
+        return None
+    # El arco no puede cruzar el geofence (si lo hace, cada tramo irá por goto_rel, que sabe desviarse)
+    arco = _arco(desde, goal_a, goal_b)
+    if arco is None or (hasattr(self, "check_path") and self.check_path([arco]) is not None):
+        return None
+    return p1, p2, arco
+
+
+#Mira si los waypoints a y b se pueden volar desde la pose actual con un único "curve" (el arco pasa por a y
+#termina en b). Devuelve (p1, p2, objetivo_b) o None para ir punto a punto
+def _curve_pair(self, wp_a: Dict[str, Any], wp_b: Dict[str, Any]) -> Optional[tuple]:
+    if not _curvable(wp_a, wp_b):
+        return None
+    pose = (float(self.pose.x_cm), float(self.pose.y_cm), float(self.pose.z_cm))
+    goal_a = _goal_of(wp_a, pose)
+    goal_b = _goal_of(wp_b, goal_a)
+    plan = _curve_plan(self, pose, goal_a, goal_b)
+    if plan is None:
+        return None
+    return plan[0], plan[1], goal_b
+
+
+#Puntos del arco que empieza en p0, pasa por p1 y termina en p2 (None si no es un "curve" válido)
+def _arco(p0: tuple, p1: tuple, p2: tuple, n: int = _ARC_SAMPLES) -> Optional[List[tuple]]:
+    a = [p1[i] - p0[i] for i in range(3)]
+    b = [p2[i] - p0[i] for i in range(3)]
+    if not (CURVE_MIN_RADIUS <= radio_curva(a, b) <= CURVE_MAX_RADIUS):
+        return None
+
+    def cross(u, v):
+        return (u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0])
+
+    def dot(u, v):
+        return sum(ui * vi for ui, vi in zip(u, v))
+
+    # Centro de la circunferencia por los tres puntos y base ortonormal (u, w) de su plano
+    nrm = cross(a, b)
+    k = [dot(a, a) * b[i] - dot(b, b) * a[i] for i in range(3)]
+    off = cross(k, nrm)
+    nn = dot(nrm, nrm)
+    c = tuple(p0[i] + off[i] / (2.0 * nn) for i in range(3))
+    r0 = [p0[i] - c[i] for i in range(3)]
+    radio = math.sqrt(dot(r0, r0))
+    u = [v / radio for v in r0]
+    nh = [v / math.sqrt(nn) for v in nrm]
+    w = cross(nh, u)
+
+    def angulo(p):
+        d = [p[i] - c[i] for i in range(3)]
+        return math.atan2(dot(d, w), dot(d, u)) % (2.0 * math.pi)
+
+    # Sentido de giro: el que pasa por p1 antes de llegar a p2
+    t1, t2 = angulo(p1), angulo(p2)
+    fin = t2 if t1 <= t2 else t2 - 2.0 * math.pi
+    pts = []
+    for j in range(n + 1):
+        t = fin * j / n
+        pts.append(tuple(c[i] + radio * (math.cos(t) * u[i] + math.sin(t) * w[i]) for i in range(3)))
+    return pts
+
+
+#Trayectoria que seguirá la misión, con las mismas reglas que _mission_worker (despegue, curves y tramos rectos).
+#Devuelve (tramos, etiquetas): una polilínea [(x, y, z), ...] y una descripción por tramo
+def _plan_tramos(self, wps: List[Dict[str, Any]], curves: bool) -> tuple:
+    p = (float(self.pose.x_cm), float(self.pose.y_cm), float(self.pose.z_cm))
+    tramos, etiquetas = [], []
+    if getattr(self, "state", "") != "flying":
+        q = (p[0], p[1], _TAKEOFF_Z_CM)
+        tramos.append([p, q])
+        etiquetas.append("despegue")
+        p = q
+
+    i = 0
+    while i < len(wps):
+        a = wps[i]
+        goal_a = _goal_of(a, p)
+        if curves and i + 1 < len(wps) and _curvable(a, wps[i + 1]):
+            goal_b = _goal_of(wps[i + 1], goal_a)
+            plan = _curve_plan(self, p, goal_a, goal_b)
+            if plan is not None:
+                tramos.append(plan[2])
+                etiquetas.append(f"WP{i + 1}-WP{i + 2} (curve)")
+                p = goal_b
+                i += 2
+                continue
+        # Tramo recto o, si cruza una exclusión, el desvío que usará goto_rel
+        tramo = [p, goal_a]
+        if hasattr(self, "check_path") and hasattr(self, "plan_path") and self.check_path([tramo]) is not None:
+            ruta = self.plan_path(p, goal_a)
+            if ruta:
+                tramo = [p] + ruta
+        tramos.append(tramo)
+        etiquetas.append(f"WP{i + 1}")
+        p = goal_a
+        i += 1
+    return tramos, etiquetas
+
+
 #Ésta función convierte un waypoint absoluto en un movimiento relativo, así se puede ejecutar, ya que Tello no entiende de coordenadas absolutas
 def _rel_from_abs(self, wp_abs: Dict[str, Any]) -> tuple[float, float, float]:
 
@@ -61,11 +189,23 @@ def _rel_from_abs(self, wp_abs: Dict[str, Any]) -> tuple[float, float, float]:
     return dx, dy, dz
 
 
+def _aviso_wp(on_wp, avisados, idx, wp) -> None:
+    if not on_wp or idx in avisados:
+        return
+    avisados.add(idx)
+    try:
+        on_wp(idx, dict(wp))
+    except Exception:
+        pass
+
+
 def _mission_worker(self,
                     waypoints: List[Dict[str, Any]],
                     do_land: bool = True,
                     on_wp: Optional[Callable[[int, Dict[str, Any]], None]] = None,
-                    on_finish: Optional[Callable[[], None]] = None) -> None:
+                    on_finish: Optional[Callable[[], None]] = None,
+                    curves: bool = False,
+                    validate: bool = True) -> None:
     #Flag de aborto
     setattr(self, "_mission_abort", False)
 
@@ -76,6 +216,10 @@ def _mission_worker(self,
         print(f"[mission] Waypoints inválidos: {e}")
         return
 
+    rec = getattr(self, "_recorder", None)
+    if rec is not None:
+        rec.mission(waypoints, curves)
+
     # Chequeos básicos de seguridad (se asegura de que el dron esté conectado y que tenga batería suficiente)
     if getattr(self, "state", "") == "disconnected":
         print("[mission] Dron desconectado; abortando.")
@@ -85,6 +229,15 @@ def _mission_worker(self,
         print(f"[mission] Batería baja ({bat}%), abortando.")
         return
 
+    # Validación previa: la trayectoria completa contra el geofence, antes de gastar batería
+    if validate and getattr(self, "pose", None) is not None and hasattr(self, "check_path"):
+        tramos, etiquetas = _plan_tramos(self, wps, curves)
+        fallo = self.check_path(tramos)
+        if fallo is not None:
+            k, zona, punto = fallo
+            print(f"[mission] Rechazada: el tramo {etiquetas[k]} entra en '{zona}' en {punto}.")
+            return
+
     # Despegue si hace falta. Si el dron está en tierra despega a una altura segura de 0,5 metros, si no se puede despegar, aborta la misión
     if getattr(self, "state", "") != "flying":
         print("[mission] Dron en tierra: despegando a 0.5 m")
@@ -94,6 +247,8 @@ def _mission_worker(self,
         time.sleep(0.4)
 
     # Recorremos los waypoints numerados.
+    curved_idx, curved_goal = 0, None  # waypoint al que ya se llegó con un "curve" y su objetivo
+    avisados = set()                   # waypoints ya notificados con on_wp
     for idx, wp in enumerate(wps, start=1):
         if getattr(self, "_mission_abort", False): #Si se pide _mission_abort desde fuera, el bucle termina
             print("[mission] Abortada por solicitud externa.")
@@ -105,8 +260,14 @@ def _mission_worker(self,
             print(f"[mission] Abortada por batería ({bat}%).")
             break
 
+        #Si ya se llegó con el "curve" anterior, solo queda corregir el residuo hasta su objetivo
+        if idx == curved_idx:
+            dx = curved_goal[0] - float(self.pose.x_cm)
+            dy = curved_goal[1] - float(self.pose.y_cm)
+            dz = curved_goal[2] - float(self.pose.z_cm)
+            target_desc = f"fin de curve: x={curved_goal[0]:.1f}, y={curved_goal[1]:.1f}, z={curved_goal[2]:.1f}"
         #Si el destino es relativo, se usa directamente dx/dy/dz
-        if wp["mode"] == "rel":
+        elif wp["mode"] == "rel":
             dx, dy, dz = wp["dx"], wp["dy"], wp["dz"]
             target_desc = f"REL: dx={dx:.1f}, dy={dy:.1f}, dz={dz:.1f}"
         #Si es absoluto, llama a _rel_from_abs para convertirlo en relativo
@@ -126,11 +287,22 @@ def _mission_worker(self,
         print(f"[mission] WP{idx} → {target_desc}, yaw={yaw}, delay={delay}s")
 
 
-        if on_wp:
+        # on_wp(i) se llama siempre antes de salir hacia el waypoint i (una sola vez, aunque se llegue con un curve)
+        _aviso_wp(on_wp, avisados, idx, wp)
+
+        #Este waypoint y el siguiente en un solo "curve" si el SDK lo admite
+        pair = None
+        if curves and idx != curved_idx and idx < len(wps) and getattr(self, "pose", None) is not None:
+            pair = _curve_pair(self, wp, wps[idx])
+        if pair is not None:
+            p1, p2, goal = pair
             try:
-                on_wp(idx, dict(wp))
-            except Exception:
-                pass
+                _aviso_wp(on_wp, avisados, idx + 1, wps[idx])  # El curve también es el tramo hacia el siguiente
+                self.curve(*p1, *p2, _CURVE_SPEED_CM_S)
+                curved_idx, curved_goal = idx + 1, goal
+                continue
+            except Exception as e:
+                print(f"[mission] curve WP{idx}-WP{idx + 1} no ejecutado ({e}); sigo punto a punto.")
 
         # Ejecuta el movimiento y manda el dron hacia el waypoint
         try:
@@ -171,10 +343,14 @@ def run_mission(self,
                 do_land: bool = True,
                 blocking: bool = True,
                 on_wp: Optional[Callable[[int, Dict[str, Any]], None]] = None,
-                on_finish: Optional[Callable[[], None]] = None) -> None:
-
+                on_finish: Optional[Callable[[], None]] = None,
+                curves: bool = False,
+                validate: bool = True) -> None:
+    #curves=True: dos waypoints seguidos sin giro ni espera se vuelan con un solo "curve" del SDK (arco que pasa
+    #por el primero, en lugar de parar en él). Por defecto False: las misiones paran en cada waypoint
+    #validate=True: con el geofence activo, la misión se rechaza antes de despegar si algún tramo lo cruza
     th = threading.Thread(target=_mission_worker,
-                          args=(self, waypoints, do_land, on_wp, on_finish),
+                          args=(self, waypoints, do_land, on_wp, on_finish, curves, validate),
                           daemon=True)
     th.start()
     if blocking:
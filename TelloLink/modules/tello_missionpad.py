@@ -0,0 +1,93 @@
+from __future__ import annotations
+import math
+import time
+from typing import Dict, Optional, Tuple
+from TelloLink.modules.tello_recorder import _record_config
+
+#Localización absoluta con mission pads (Tello EDU). Con "mon" activado, cada paquete de estado trae el id
+#del pad que ve el dron (mid > 0) y su posición x, y, z respecto a ese pad. Si el pad está en el mapa
+#(id -> posición y orientación en el mundo), la posición del dron pasa a ser absoluta: se corrige la
+#PoseVirtual (o se fusiona en el EKF) y la deriva acumulada desaparece cada vez que se sobrevuela un pad.
+#Ejes del pad: los mismos que "go" (x adelante del pad, y a su izquierda). El yaw del pad en el mapa
+#sigue el convenio de PoseVirtual (rumbo del eje x del pad, cw positivo)
+
+_PAD_SIGMA_CM = 5.0        #Error de la posición medida sobre un pad
+_PAD_DIRECTIONS = (0, 1, 2)  #mdirection: 0 = cámara inferior, 1 = frontal, 2 = ambas
+
+
+#Activa la detección de pads y elige la cámara con la que se buscan
+def enable_mission_pads(self, direction: int = 0) -> bool:
+    self._require_connected()
+    d = int(direction)
+    if d not in _PAD_DIRECTIONS:
+        raise ValueError(f"mdirection {d}: debe ser 0, 1 o 2")
+    for cmd in ("mon", f"mdirection {d}"):
+        resp = self._send(cmd)
+        if str(resp).lower() != "ok":
+            raise RuntimeError(f"{cmd} -> {resp}")
+    self._mp_enabled = True
+    return True
+
+
+def disable_mission_pads(self) -> bool:
+    self._require_connected()
+    resp = self._send("moff")
+    if str(resp).lower() != "ok":
+        raise RuntimeError(f"moff -> {resp}")
+    self._mp_enabled = False
+    return True
+
+
+#Coloca un pad en el mapa: posición (cm) y rumbo de su eje x en el mundo
+def add_pad(self, pad_id: int, x_cm: float, y_cm: float, yaw_deg: float = 0.0) -> None:
+    pid = int(pad_id)
+    if not 1 <= pid <= 8:
+        raise ValueError(f"pad {pid}: los ids de mission pad van de 1 a 8")
+    if getattr(self, "_pad_map", None) is None:
+        self._pad_map = {}
+    self._pad_map[pid] = (float(x_cm), float(y_cm), float(yaw_deg))
+    _record_config(self)
+
+
+#Sustituye el mapa completo: {id: (x, y) | (x, y, yaw) | {"x":..., "y":..., "yaw":...}}
+def set_pad_map(self, pads: Dict[int, object]) -> None:
+    self._pad_map = {}
+    for pid, p in (pads or {}).items():
+        if isinstance(p, dict):
+            add_pad(self, pid, p["x"], p["y"], p.get("yaw", 0.0))
+        else:
+            add_pad(self, pid, *p)
+    _record_config(self)
+
+
+#Posición (x, y) en el mundo a partir de una observación de pad, o None si no hay pad conocido a la vista
+def pad_fix(self, st) -> Optional[Tuple[float, float]]:
+    pads = getattr(self, "_pad_map", None)
+    mid = int(getattr(st, "mid", -1))
+    if not pads or mid not in pads:
+        return None
+    px, py, pyaw = pads[mid]
+    th = math.radians(pyaw)
+    f, l = float(st.mp_x_cm), float(st.mp_y_cm)
+    # Misma rotación que PoseVirtual.update_go (x adelante, y izquierda)
+    return px + f * math.cos(th) + l * math.sin(th), py + f * math.sin(th) - l * math.cos(th)
+
+
+#Se llama desde la telemetría por cada paquete: corrige la pose con el pad visto
+def _on_pad(self, st) -> None:
+    fix = pad_fix(self, st)
+    pose = getattr(self, "pose", None)
+    if fix is None or pose is None:
+        return
+    ekf = getattr(pose, "ekf", None)
+    if ekf is not None:
+        ekf.observe_position(fix[0], fix[1], _PAD_SIGMA_CM * _PAD_SIGMA_CM)
+    else:
+        pose.correct_position(fix[0], fix[1])
+    self.last_pad = (int(st.mid), st.ts)
+
+
+#Segundos desde la última corrección por pad (None si no ha habido ninguna)
+def pad_age_s(self) -> Optional[float]:
+    last = getattr(self, "last_pad", None)
+    return None if last is None else time.monotonic() - last[1]
@@ -1,3 +1,4 @@
+import math
 import time
 
 #Valores máximos y mínimos del SDK de Tello
@@ -6,6 +7,9 @@ MAX_STEP = 500      # cm (límite superior de movimiento del Tello)
 MIN_SPEED = 10      # cm/s
 MAX_SPEED = 100     # cm/s
 COOLDOWN_S = 0.4    # pequeña pausa entre comandos por seguridad
+CURVE_MAX_SPEED = 60        # cm/s (el SDK limita "curve" a 10-60)
+CURVE_MIN_RADIUS = 50.0     # cm, radio del arco admitido por el SDK (0.5-10 m)
+CURVE_MAX_RADIUS = 1000.0
 
 
 
@@ -28,12 +32,25 @@ def _distancia_acotada(dist_cm: int) -> int:
         d = MIN_STEP
     return max(MIN_STEP, min(MAX_STEP, d)) #Si d es mas pequeño que el mínimo se sube a 20 y si es mayor que el maximo se baja a 500
 
+#Avisa a la pose (y a su EKF, si lo hay) de que va a empezar un movimiento
+def _mark_pose(self) -> None:
+    pose = getattr(self, "pose", None)
+    if pose is not None and hasattr(pose, "mark_command"):
+        pose.mark_command()
+
+def _unmark_pose(self) -> None:
+    pose = getattr(self, "pose", None)
+    if pose is not None and hasattr(pose, "cancel_command"):
+        pose.cancel_command()
+
 def _move(self, verb, dist_cm):
     #Envia un movimiento horizontal simple ("forward", "back", "left", "right" son los tipos de "verb" (opciones de movimiento))
     self._require_connected()
     d = _distancia_acotada(dist_cm)
+    _mark_pose(self)
     resp = self._send(f"{verb} {d}") #Se envia el tipo de verb y su distancia, por ejemplo forward y 50)
     if not _resp_is_ok(resp):   #Si el dron no responde con un "ok", lanzamos ek error
+        _unmark_pose(self)
         raise RuntimeError(f"{verb} {d} -> {resp}")
     #POSE (añadido mínimo): actualizar pose tras OK ---
     try:
@@ -80,8 +97,10 @@ def up(self, dist_cm: int):
     if d == 0:
         return True
 
+    _mark_pose(self)
     resp = self._send(f"up {d}") #Se manda el comando al Tello
     if not _resp_is_ok(resp): #Si no devuelve "ok"
+        _unmark_pose(self)
         raise RuntimeError(f"up {d} -> {resp}") #Lanza error
     # --- POSE (añadido mínimo): actualizar pose tras OK ---
     try:
@@ -102,8 +121,10 @@ def down(self, dist_cm: int): #Función para bajar
     if isinstance(curr_h, int):
         if d > curr_h: #Si la altura que se desea bajar es mayor que la altura actual (imposible)
             d = max(MIN_STEP, curr_h)  #Va a bajar  la altura actual o lo que pueda (MIN_STEP)
+    _mark_pose(self)
     resp = self._send(f"down {d}") #Se manda el comando al Tello
     if not _resp_is_ok(resp): #Si no devuelve "ok"
+        _unmark_pose(self)
         raise RuntimeError(f"down {d} -> {resp}") #Lanza error
     # --- POSE (añadido mínimo): actualizar pose tras OK ---
     try:
@@ -132,6 +153,94 @@ def set_speed(self, speed_cm_s: int): #En vez de trabajar siempre con la velocid
     return True
 
 
+#Comprueba que un punto (x, y, z) sea válido para go/curve: cada eje en ±500 y no todos a la vez por debajo de 20
+def punto_sdk_valido(x: int, y: int, z: int) -> bool:
+    if max(abs(x), abs(y), abs(z)) > MAX_STEP:
+        return False
+    return not (abs(x) < MIN_STEP and abs(y) < MIN_STEP and abs(z) < MIN_STEP)
+
+
+#Radio del arco que pasa por el origen, p1 y p2 (infinito si los tres puntos están alineados)
+def radio_curva(p1, p2) -> float:
+    a = math.dist((0, 0, 0), p1)
+    b = math.dist((0, 0, 0), p2)
+    c = math.dist(p1, p2)
+    cx = p1[1] * p2[2] - p1[2] * p2[1]
+    cy = p1[2] * p2[0] - p1[0] * p2[2]
+    cz = p1[0] * p2[1] - p1[1] * p2[0]
+    cross = math.sqrt(cx * cx + cy * cy + cz * cz)
+    if cross < 1e-6:
+        return math.inf
+    return a * b * c / (2.0 * cross)
+
+
+#Recorta la subida de un go/curve para no pasar del techo de seguridad
+def _z_acotada(self, z: int) -> int:
+    _ensure_techo(self)
+    curr_h = getattr(self, "height_cm", None)
+    if isinstance(curr_h, int) and z > 0:
+        z = min(z, max(0, int(self.TECHO_M * 100) - curr_h))
+    return z
+
+
+#Desplazamiento 3D en un solo comando. Ejes del SDK: x adelante, y izquierda, z arriba (cm)
+def go(self, x_cm: int, y_cm: int, z_cm: int, speed_cm_s: int = 50):
+    self._require_connected()
+    x, y = int(round(x_cm)), int(round(y_cm))
+    z = _z_acotada(self, int(round(z_cm)))
+    if not punto_sdk_valido(x, y, z):
+        raise ValueError(f"go {x} {y} {z}: fuera de los límites del SDK")
+    v = max(MIN_SPEED, min(MAX_SPEED, int(speed_cm_s)))
+
+    # El timeout del comando depende de lo que tarde el tramo
+    timeout = math.sqrt(x * x + y * y + z * z) / v + 7.0
+    _mark_pose(self)
+    resp = self._send(f"go {x} {y} {z} {v}", timeout=timeout)
+    if not _resp_is_ok(resp):
+        _unmark_pose(self)
+        raise RuntimeError(f"go {x} {y} {z} {v} -> {resp}")
+    try:
+        pose = getattr(self, "pose", None)
+        if pose is not None:
+            pose.update_go(x, y, z)
+    except Exception:
+        pass
+    time.sleep(COOLDOWN_S)
+    return True
+
+
+#Arco que pasa por (x1, y1, z1) y termina en (x2, y2, z2), en los mismos ejes que go
+def curve(self, x1_cm: int, y1_cm: int, z1_cm: int,
+          x2_cm: int, y2_cm: int, z2_cm: int, speed_cm_s: int = 30):
+    self._require_connected()
+    # Como en go, la subida se recorta para no pasar del techo de seguridad (en el punto intermedio y en el final)
+    p1 = (int(round(x1_cm)), int(round(y1_cm)), _z_acotada(self, int(round(z1_cm))))
+    p2 = (int(round(x2_cm)), int(round(y2_cm)), _z_acotada(self, int(round(z2_cm))))
+    if not (punto_sdk_valido(*p1) and punto_sdk_valido(*p2)):
+        raise ValueError(f"curve {p1} {p2}: fuera de los límites del SDK")
+    r = radio_curva(p1, p2)
+    if not (CURVE_MIN_RADIUS <= r <= CURVE_MAX_RADIUS):
+        raise ValueError(f"curve {p1} {p2}: radio {r:.0f} cm fuera de 50-1000 cm")
+    v = max(MIN_SPEED, min(CURVE_MAX_SPEED, int(speed_cm_s)))
+
+    # Longitud aproximada por la poligonal (el arco es algo más largo)
+    length = math.dist((0, 0, 0), p1) + math.dist(p1, p2)
+    _mark_pose(self)
+    resp = self._send(f"curve {p1[0]} {p1[1]} {p1[2]} {p2[0]} {p2[1]} {p2[2]} {v}",
+                      timeout=1.6 * length / v + 7.0)
+    if not _resp_is_ok(resp):
+        _unmark_pose(self)
+        raise RuntimeError(f"curve {p1} {p2} {v} -> {resp}")
+    try:
+        pose = getattr(self, "pose", None)
+        if pose is not None:
+            pose.update_go(*p2)
+    except Exception:
+        pass
+    time.sleep(COOLDOWN_S)
+    return True
+
+
 def rc(self, vx: int, vy: int, vz: int, yaw: int):
     # Limitar valores al rango válido del SDK Tello
     vx = max(-100, min(100, int(vx)))
@@ -142,6 +251,9 @@ def rc(self, vx: int, vy: int, vz: int, yaw: int):
     try:
 
         self._tello.send_rc_control(vx, vy, vz, yaw)
+        rec = getattr(self, "_recorder", None)
+        if rec is not None:
+            rec.rc(vx, vy, vz, yaw)
         return True
     except Exception as e:
         print(f"[rc] Error enviando comando: {e}")
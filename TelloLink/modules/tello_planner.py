@@ -0,0 +1,255 @@
+from __future__ import annotations
+import heapq
+import math
+from typing import Dict, List, Optional, Tuple
+
+#Planificador de rutas que esquiva las exclusiones del geofence. Trabaja en el plano XY con un grafo
+#de visibilidad: cada exclusión se infla con un margen de seguridad y se convierte en un polígono
+#convexo, y la ruta más corta va de vértice en vértice de esos polígonos.
+#El grafo se guarda en caché y solo se reconstruye cuando cambian las zonas, el margen o la altura
+
+_PLAN_MARGIN_CM = 30.0     #Margen de seguridad alrededor de cada exclusión
+_CIRCLE_SIDES = 8          #Lados del polígono que envuelve cada círculo
+_EPS = 1e-6
+_CACHE_SIZE = 4            #Grafos guardados (uno por franja de altura activa)
+
+Point = Tuple[float, float]
+
+
+def _cross(o: Point, a: Point, b: Point) -> float:
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+#Envolvente convexa (cadena monótona), vértices en sentido antihorario
+def _convex_hull(points: List[Point]) -> List[Point]:
+    pts = sorted(set(points))
+    if len(pts) <= 2:
+        return pts
+    lower: List[Point] = []
+    for p in pts:
+        while len(lower) >= 2 and _cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    upper: List[Point] = []
+    for p in reversed(pts):
+        while len(upper) >= 2 and _cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    return lower[:-1] + upper[:-1]
+
+
+#Polígono convexo que contiene la zona inflada: cada punto se rodea de un octógono circunscrito de radio 'margen'
+def _inflate(points: List[Point], margen: float) -> List[Point]:
+    if margen <= 0:
+        return _convex_hull(points)
+    rad = margen / math.cos(math.pi / _CIRCLE_SIDES)
+    ring = [(rad * math.cos(2 * math.pi * k / _CIRCLE_SIDES), rad * math.sin(2 * math.pi * k / _CIRCLE_SIDES))
+            for k in range(_CIRCLE_SIDES)]
+    return _convex_hull([(x + dx, y + dy) for x, y in _convex_hull(points) for dx, dy in ring])
+
+
+#Obstáculo convexo ya inflado, con sus semiplanos precalculados (normal unitaria hacia fuera y offset)
+class _Obstacle:
+    __slots__ = ("poly", "bbox", "planes")
+
+    def __init__(self, poly: List[Point]):
+        self.poly = poly
+        xs = [p[0] for p in poly]
+        ys = [p[1] for p in poly]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+        self.planes = []
+        n = len(poly)
+        for i in range(n):
+            (x1, y1), (x2, y2) = poly[i], poly[(i + 1) % n]
+            nx, ny = y2 - y1, -(x2 - x1)   # Normal hacia fuera (polígono antihorario)
+            norm = math.hypot(nx, ny)
+            if norm > 0:
+                self.planes.append((nx / norm, ny / norm, (nx * x1 + ny * y1) / norm))
+
+    def contains(self, p: Point) -> bool:
+        return all(nx * p[0] + ny * p[1] - c < -_EPS for nx, ny, c in self.planes)
+
+    #El segmento a-b pasa por el interior (tocar el borde o un vértice no cuenta)
+    def blocks(self, a: Point, b: Point) -> bool:
+        xmin, ymin, xmax, ymax = self.bbox
+        if max(a[0], b[0]) <= xmin or min(a[0], b[0]) >= xmax or max(a[1], b[1]) <= ymin or min(a[1], b[1]) >= ymax:
+            return False
+        # Recorte de Cyrus-Beck contra los semiplanos
+        t0, t1 = 0.0, 1.0
+        dx, dy = b[0] - a[0], b[1] - a[1]
+        for nx, ny, c in self.planes:
+            num = nx * a[0] + ny * a[1] - c + _EPS
+            den = nx * dx + ny * dy
+            if abs(den) < 1e-12:
+                if num >= 0:
+                    return False
+                continue
+            t = -num / den
+            if den > 0:
+                t1 = min(t1, t)
+            else:
+                t0 = max(t0, t)
+            if t1 - t0 <= 1e-9:
+                return False
+        return True
+
+
+class _VisibilityGraph:
+
+    def __init__(self, obstacles: List[_Obstacle], box: Optional[Tuple[float, float, float, float]]):
+        self.obstacles = obstacles
+        self.box = box
+        # Nodos: vértices de los obstáculos que quedan dentro de la inclusión y fuera de los demás obstáculos
+        self.nodes: List[Point] = [p for ob in obstacles for p in ob.poly
+                                   if self._in_box(p) and not any(o.contains(p) for o in obstacles)]
+        self.adj: Dict[int, List[Tuple[int, float]]] = {i: [] for i in range(len(self.nodes))}
+        for i in range(len(self.nodes)):
+            for j in range(i + 1, len(self.nodes)):
+                a, b = self.nodes[i], self.nodes[j]
+                if self.visible(a, b):
+                    w = math.dist(a, b)
+                    self.adj[i].append((j, w))
+                    self.adj[j].append((i, w))
+
+    def _in_box(self, p: Point) -> bool:
+        if self.box is None:
+            return True
+        xmin, ymin, xmax, ymax = self.box
+        return xmin - _EPS <= p[0] <= xmax + _EPS and ymin - _EPS <= p[1] <= ymax + _EPS
+
+    def visible(self, a: Point, b: Point) -> bool:
+        return not any(ob.blocks(a, b) for ob in self.obstacles)
+
+    #A* desde 'a' hasta 'b' conectando ambos al grafo. Devuelve los puntos intermedios y el final, o None
+    def shortest(self, a: Point, b: Point) -> Optional[List[Point]]:
+        if not (self._in_box(a) and self._in_box(b)):
+            return None
+        if self.visible(a, b):
+            return [b]
+        n = len(self.nodes)
+        start, goal = n, n + 1
+        from_start = [(i, math.dist(a, p)) for i, p in enumerate(self.nodes) if self.visible(a, p)]
+        to_goal = {i: math.dist(p, b) for i, p in enumerate(self.nodes) if self.visible(p, b)}
+        if not from_start or not to_goal:
+            return None
+
+        dist = {start: 0.0}
+        prev: Dict[int, int] = {}
+        heap = [(math.dist(a, b), start)]
+        done = set()
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            if u == goal:
+                break
+            if u == start:
+                edges = from_start
+            else:
+                edges = list(self.adj[u])
+                if u in to_goal:
+                    edges.append((goal, to_goal[u]))
+            for v, w in edges:
+                nd = dist[u] + w
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    prev[v] = u
+                    h = 0.0 if v == goal else math.dist(self.nodes[v], b)
+                    heapq.heappush(heap, (nd + h, v))
+        if goal not in prev:
+            return None
+
+        ruta = [b]
+        u = prev[goal]
+        while u != start:
+            ruta.append(self.nodes[u])
+            u = prev[u]
+        return ruta[::-1]
+
+
+#Zonas de exclusión activas en la franja de altura [z_lo, z_hi] (las que no tienen franja cuentan siempre)
+def _active_zones(self, z_lo: float, z_hi: float) -> List[Tuple[Tuple[str, int], dict]]:
+    def activa(entry) -> bool:
+        zmin, zmax = entry.get("zmin"), entry.get("zmax")
+        return (zmin is None or z_hi >= zmin) and (zmax is None or z_lo <= zmax)
+
+    zonas = []
+    for i, c in enumerate(getattr(self, "_gf_excl_circles", [])):
+        if isinstance(c, dict) and activa(c):
+            zonas.append((("circle", i), c))
+    for i, p in enumerate(getattr(self, "_gf_excl_polys", [])):
+        if isinstance(p, dict) and activa(p) and len(p.get("poly", [])) >= 3:
+            zonas.append((("poly", i), p))
+    return zonas
+
+
+#Convierte cada zona en un obstáculo convexo inflado con el margen
+def _obstacles(zonas, margen: float) -> List[_Obstacle]:
+    obstacles = []
+    k_cos = math.cos(math.pi / _CIRCLE_SIDES)
+    for (kind, _), entry in zonas:
+        if kind == "circle":
+            r = float(entry["r"]) / k_cos   # Polígono circunscrito: contiene al círculo
+            pts = [(entry["cx"] + r * math.cos(2 * math.pi * k / _CIRCLE_SIDES),
+                    entry["cy"] + r * math.sin(2 * math.pi * k / _CIRCLE_SIDES)) for k in range(_CIRCLE_SIDES)]
+        else:
+            pts = list(entry["poly"])
+        obstacles.append(_Obstacle(_inflate(pts, margen)))
+    return obstacles
+
+
+#Caja de inclusión en XY (xmin, ymin, xmax, ymax) o None si no hay límites horizontales
+def _inclusion_box(self) -> Optional[Tuple[float, float, float, float]]:
+    lim = getattr(self, "_gf_limits", None)
+    if not lim:
+        return None
+    cx, cy = getattr(self, "_gf_center", (0.0, 0.0))
+    hx = float(lim.get("max_x", 0.0) or 0.0) / 2.0
+    hy = float(lim.get("max_y", 0.0) or 0.0) / 2.0
+    return (cx - hx if hx > 0 else -math.inf, cy - hy if hy > 0 else -math.inf,
+            cx + hx if hx > 0 else math.inf, cy + hy if hy > 0 else math.inf)
+
+
+def _graph_for(self, z_lo: float, z_hi: float, margen: float) -> _VisibilityGraph:
+    from TelloLink.modules.tello_geofence import _excl_signature
+    zonas = _active_zones(self, z_lo, z_hi)
+    box = _inclusion_box(self)
+    key = (_excl_signature(self), tuple(z for z, _ in zonas), box, float(margen))
+    cache = getattr(self, "_plan_cache", None)
+    if cache is None:
+        cache = self._plan_cache = {}
+    graph = cache.get(key)
+    if graph is None:
+        graph = _VisibilityGraph(_obstacles(zonas, margen), box)
+        if len(cache) >= _CACHE_SIZE:
+            cache.pop(next(iter(cache)))
+        cache[key] = graph
+    return graph
+
+
+#Ruta más corta de 'inicio' a 'fin' (x, y, z en cm) que esquiva las exclusiones infladas 'margen_cm' y
+#no sale de la inclusión. Devuelve la lista de puntos a visitar (el último es 'fin') o None si no hay ruta.
+#La altura se interpola a lo largo de la ruta
+def plan_path(self, inicio, fin, margen_cm: Optional[float] = None) -> Optional[List[Tuple[float, float, float]]]:
+    margen = _PLAN_MARGIN_CM if margen_cm is None else max(0.0, float(margen_cm))
+    x0, y0, z0 = (float(v) for v in inicio)
+    x1, y1, z1 = (float(v) for v in fin)
+    graph = _graph_for(self, min(z0, z1), max(z0, z1), margen)
+
+    # Si el inicio o el fin caen dentro del margen de alguna zona, se planifica sin margen para no quedar encerrados
+    if any(ob.contains((x0, y0)) or ob.contains((x1, y1)) for ob in graph.obstacles):
+        graph = _graph_for(self, min(z0, z1), max(z0, z1), 0.0)
+
+    ruta = graph.shortest((x0, y0), (x1, y1))
+    if ruta is None:
+        return None
+
+    total = 0.0
+    prev = (x0, y0)
+    acum = []
+    for p in ruta:
+        total += math.dist(prev, p)
+        acum.append(total)
+        prev = p
+    return [(p[0], p[1], z0 + (z1 - z0) * (s / total if total > 0 else 1.0)) for p, s in zip(ruta, acum)]
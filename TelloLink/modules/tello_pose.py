@@ -1,5 +1,12 @@
 import  math
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any
+from TelloLink.modules.tello_events import PoseEvent
+
+# Velocidad máxima del Tello en modo "slow" al usar el joystick (rc a 100%). Es un valor que se encuentra en el SDK,
+# el cual está en torno a 2-2.1 m/s. Lo usan también goto (modo rc), el geofence y el simulador
+MAX_SPEED_CM_S = 210.0  # cm/s
+MAX_YAW_DEG_S = 100.0  # grados/s
 
 
 # Función para mantener siempre el ángulo entre 0 y 360 grados
@@ -18,15 +25,79 @@ class PoseVirtual:
     # Referencia de yaw en el momento del despegue (para yaw relativo = 0) ---
     yaw0_deg: float = 0.0
 
+    # Estimador opcional (PoseEKF de tello_ekf). Si está puesto, los desplazamientos pasan por él
+    ekf: Any = field(default=None, repr=False, compare=False)
+    # Posición al empezar el último movimiento mandado (sin EKF). Al confirmarse, manda el movimiento
+    _mark: Any = field(default=None, init=False, repr=False, compare=False)
+    # FlightRecorder (tello_recorder) mientras se graba: guarda las llamadas que modifican la pose
+    recorder: Any = field(default=None, repr=False, compare=False)
+    # EventBus del dron: cada cambio por un movimiento se publica como PoseEvent
+    bus: Any = field(default=None, repr=False, compare=False)
+
+    def _record(self, name: str, *args) -> None:
+        if self.recorder is not None:
+            self.recorder.pose_event(name, *args)
+
+    def _publish(self, source: str) -> None:
+        if self.bus is not None:
+            self.bus.publish(PoseEvent(x_cm=self.x_cm, y_cm=self.y_cm, z_cm=self.z_cm,
+                                       yaw_deg=self.yaw_deg, source=source))
+
     # Métodos básicos
-    def reset(self) -> None:
-        # Reinicia la pose al origen (punto de despegue).
+    def reset(self, z_cm: float = 0.0) -> None:
+        # Reinicia la pose al origen (punto de despegue). z_cm: altura a la que queda (la del despegue)
+        self._record("reset", z_cm)
         self.x_cm = 0.0
         self.y_cm = 0.0
-        self.z_cm = 0.0
+        self.z_cm = float(z_cm)
         self.yaw_deg = 0.0
         # También reseteamos la referencia
         self.yaw0_deg = 0.0
+        self._mark = None
+        if self.ekf is not None:
+            self.ekf.reset()
+        self._publish("reset")
+
+    # Fija la altura conocida sin tocar x/y (p.ej. 0 al aterrizar). Queda grabada y, con EKF, el filtro se
+    # reinicia desde esta pose en lugar de tomar el salto como un movimiento
+    def set_z(self, z_cm: float) -> None:
+        self._record("set_z", z_cm)
+        self.z_cm = float(z_cm)
+        self._mark = None
+        if self.ekf is not None:
+            self.ekf.reset()
+        self._publish("reset")
+
+    # Aviso antes de mandar un movimiento: se guarda la posición de partida (en el EKF, si lo hay)
+    def mark_command(self) -> None:
+        self._record("mark_command")
+        if self.ekf is not None:
+            self.ekf.mark_command()
+        else:
+            self._mark = (self.x_cm, self.y_cm, self.z_cm)
+
+    # El movimiento no se ha confirmado: la pose se queda con lo integrado por telemetría
+    def cancel_command(self) -> None:
+        self._record("cancel_command")
+        self._mark = None
+        if self.ekf is not None:
+            self.ekf.cancel_command()
+
+    # Aplica un desplazamiento en ejes del mapa. 'medido' indica un movimiento confirmado por el dron (ok);
+    # si no, es una estimación a partir de consignas (rc)
+    def _apply_delta(self, dx: float, dy: float, dz: float, medido: bool = True) -> None:
+        if self.ekf is None:
+            # Lo integrado por telemetría durante el movimiento se sustituye por el movimiento confirmado
+            if medido and self._mark is not None:
+                self.x_cm, self.y_cm, self.z_cm = self._mark
+                self._mark = None
+            self.x_cm += dx
+            self.y_cm += dy
+            self.z_cm += dz
+        elif medido:
+            self.ekf.observe_displacement(dx, dy, dz)
+        else:
+            self.ekf.command_delta(dx, dy, dz)
 
     def capture(self) -> dict:
         # Devuelve la pose actual y se redondea a un decimal
@@ -41,41 +112,66 @@ class PoseVirtual:
 
     def set_from_telemetry(self, height_cm: float | None = None,
                            yaw_deg: float | None = None) -> None:
-        if height_cm is not None:
+        # Con EKF la altura entra como medida del filtro (update_state), no se copia tal cual
+        if height_cm is not None and self.ekf is None:
             self.z_cm = float(height_cm)
         if yaw_deg is not None:
             # Interpretamos yaw_deg como yaw ABSOLUTO del Tello y lo pasamos a relativo
             self.set_heading_from_absolute_yaw(float(yaw_deg))
 
+    # Desplazamiento en x/y del mapa integrado a partir de las velocidades medidas (hilo de telemetría)
+    def integrate_velocity(self, dx_cm: float, dy_cm: float) -> None:
+        self.x_cm += float(dx_cm)
+        self.y_cm += float(dy_cm)
+
+    # Posición absoluta en x/y (mission pad). Si hay un movimiento en curso, su partida se corrige igual
+    def correct_position(self, x_cm: float, y_cm: float) -> None:
+        dx, dy = float(x_cm) - self.x_cm, float(y_cm) - self.y_cm
+        self.x_cm, self.y_cm = float(x_cm), float(y_cm)
+        if self._mark is not None:
+            mx, my, mz = self._mark
+            self._mark = (mx + dx, my + dy, mz)
+
     def update_yaw(self, delta_deg: float) -> None:
+        self._record("update_yaw", delta_deg)
         # Delta relativo (cw positivo) sobre el yaw relativo actual
         self.yaw_deg = _wrap_deg(self.yaw_deg + float(delta_deg))
+        self._publish("yaw")
 
     def update_move(self, direction: str, dist_cm: float) -> None:
+        self._record("update_move", direction, dist_cm)
         d = float(dist_cm)
         yaw = math.radians(self.yaw_deg)  # usamos el yaw RELATIVO
+        c, s = math.cos(yaw), math.sin(yaw)
 
         if direction == "forward":
-            self.x_cm += d * math.cos(yaw)
-            self.y_cm += d * math.sin(yaw)
+            self._apply_delta(d * c, d * s, 0.0)
 
         elif direction == "back":
-            self.x_cm -= d * math.cos(yaw)
-            self.y_cm -= d * math.sin(yaw)
+            self._apply_delta(-d * c, -d * s, 0.0)
 
         elif direction == "right":
-            self.x_cm -= d * math.sin(yaw)
-            self.y_cm += d * math.cos(yaw)
+            self._apply_delta(-d * s, d * c, 0.0)
 
         elif direction == "left":
-            self.x_cm += d * math.sin(yaw)
-            self.y_cm -= d * math.cos(yaw)
+            self._apply_delta(d * s, -d * c, 0.0)
 
         elif direction == "up":
-            self.z_cm += d
+            self._apply_delta(0.0, 0.0, d)
 
         elif direction == "down":
-            self.z_cm -= d
+            self._apply_delta(0.0, 0.0, -d)
+        self._publish("move")
+
+    # Desplazamiento de un "go"/"curve" del SDK: x adelante, y izquierda, z arriba (ejes del dron)
+    def update_go(self, x_cm: float, y_cm: float, z_cm: float) -> None:
+        self._record("update_go", x_cm, y_cm, z_cm)
+        yaw = math.radians(self.yaw_deg)
+        f, l = float(x_cm), float(y_cm)
+        self._apply_delta(f * math.cos(yaw) + l * math.sin(yaw),
+                          f * math.sin(yaw) - l * math.cos(yaw),
+                          float(z_cm))
+        self._publish("move")
 
     # Distancia entre una pose y otra
     def distance_to(self, other: "PoseVirtual") -> float:
@@ -107,13 +203,10 @@ class PoseVirtual:
 
 #A partir de usar el joystick (modo rc), la pose se calcula de esta manera, a partir de las velocidades del joystick.
     def update_from_rc(self, vx_pct, vy_pct, vz_pct, yaw_pct, dt_sec=0.1):
+        self._record("update_from_rc", vx_pct, vy_pct, vz_pct, yaw_pct, dt_sec)
 
         import math
 
-        # Velocidad máxima del Tello en modo "slow" al usar el joystick. Es un valor que se encuentra en el SDK, el cual está en torno a 2-2.1 m/s
-        MAX_SPEED_CM_S = 210  # cm/s
-        MAX_YAW_DEG_S = 100  # grados/s
-
         # Convertir porcentajes de la velocidad leída del joystick (-100 a 100) a velocidades reales
         vx_cm_s = (vx_pct / 100.0) * MAX_SPEED_CM_S
         vy_cm_s = (vy_pct / 100.0) * MAX_SPEED_CM_S
@@ -136,7 +229,6 @@ class PoseVirtual:
         dy_global = dx_local * sin_theta + dy_local * cos_theta
 
         # Actualizar la posición y la orientación sumando el desplazamiento que se calcula en cada dt
-        self.x_cm += dx_global
-        self.y_cm += dy_global
-        self.z_cm += dz
-        self.yaw_deg = (self.yaw_deg + dyaw) % 360.0
\ No newline at end of file
+        self._apply_delta(dx_global, dy_global, dz, medido=False)
+        self.yaw_deg = (self.yaw_deg + dyaw) % 360.0
+        self._publish("rc")
\ No newline at end of file
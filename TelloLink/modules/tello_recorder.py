@@ -0,0 +1,352 @@
+from __future__ import annotations
+import json
+import mmap
+import struct
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from TelloLink.modules.tello_state import TelloState
+
+#Caja negra del vuelo: un fichero binario con registros de longitud prefijada y marca time.monotonic().
+#Se graba todo lo que entra y sale: comandos de _send y sus respuestas, consignas rc, paquetes de estado,
+#la pose tras cada paquete, las llamadas que modifican la PoseVirtual, las misiones y la configuración
+#(geofence, pads, EKF). replay_flight() lee el fichero con mmap y lo vuelve a pasar por la misma
+#telemetría, pose, monitor del geofence y planificación de misiones, sin dron y tan rápido como se pueda.
+#Si el código nuevo da otra pose o salta el geofence donde antes no, es una regresión
+#
+#Formato: cabecera _MAGIC y registros  [longitud u32][ts f64][tipo u8][payload]
+
+_MAGIC = b"TLREC\x01\n"
+_HDR = struct.Struct("<IdB")
+
+REC_CONFIG = 1      # JSON con geofence, pads y EKF
+REC_CMD = 2         # Texto del comando enviado
+REC_RESP = 3        # comando \0 respuesta
+REC_RC = 4          # lr, fb, ud, yaw (int8)
+REC_STATE = 5       # TelloState empaquetado + estado de vuelo del dron
+REC_POSE = 6        # x, y, z, yaw de la pose tras el paquete (f64)
+REC_POSE_EVT = 7    # JSON [método, args...] de una llamada que modifica la PoseVirtual
+REC_MISSION = 8     # JSON con los waypoints y curves de run_mission
+
+_RC = struct.Struct("<4b")
+_POSE = struct.Struct("<4d")
+
+
+#Empaquetado de TelloState: los campos en su orden, con el tipo que declaran
+def _state_layout():
+    fmt, names = "<", []
+    for f in fields(TelloState):
+        t = str(f.type)
+        if t.startswith("Tuple"):
+            fmt += "3h"
+        elif f.name in ("ts", "wall_ts"):
+            fmt += "d"
+        elif t == "int":
+            fmt += "i"
+        else:
+            fmt += "d"
+        names.append(f.name)
+    return struct.Struct(fmt), names
+
+
+_STATE, _STATE_FIELDS = _state_layout()
+
+
+def _pack_state(st: TelloState, flight_state: str) -> bytes:
+    vals = []
+    for name in _STATE_FIELDS:
+        v = getattr(st, name)
+        if isinstance(v, tuple):
+            vals.extend(int(c) for c in v)
+        else:
+            vals.append(v)
+    return _STATE.pack(*vals) + str(flight_state).encode("utf-8")
+
+
+def _unpack_state(payload: bytes) -> Tuple[TelloState, str]:
+    vals = list(_STATE.unpack_from(payload))
+    kw, i = {}, 0
+    for name in _STATE_FIELDS:
+        if name == "mpry":
+            kw[name] = tuple(vals[i:i + 3])
+            i += 3
+        else:
+            kw[name] = vals[i]
+            i += 1
+    return TelloState(**kw), payload[_STATE.size:].decode("utf-8")
+
+
+#Configuración que afecta a la pose y al geofence, en forma serializable
+def _config_of(dron) -> dict:
+    def circulo(c):
+        return {k: c.get(k) for k in ("cx", "cy", "r", "zmin", "zmax")}
+
+    def poligono(p):
+        return {"poly": [list(v) for v in p.get("poly", [])], "zmin": p.get("zmin"), "zmax": p.get("zmax")}
+
+    pose = getattr(dron, "pose", None)
+    return {
+        "gf_enabled": bool(getattr(dron, "_gf_enabled", False)),
+        "gf_limits": getattr(dron, "_gf_limits", None),
+        "gf_center": list(getattr(dron, "_gf_center", (0.0, 0.0))),
+        "gf_mode": getattr(dron, "_gf_mode", None),
+        "gf_margen": getattr(dron, "_gf_margen", None),
+        "gf_confirm_s": getattr(dron, "_gf_confirm_s", None),
+        "gf_sdf_cell": getattr(dron, "_gf_sdf_cell", None),
+        "circles": [circulo(c) for c in getattr(dron, "_gf_excl_circles", []) if isinstance(c, dict)],
+        "polys": [poligono(p) for p in getattr(dron, "_gf_excl_polys", []) if isinstance(p, dict)],
+        "pads": {str(k): list(v) for k, v in (getattr(dron, "_pad_map", None) or {}).items()},
+        "ekf": getattr(pose, "ekf", None) is not None,
+    }
+
+
+#Con el bus de eventos del dron, write() solo empaqueta el registro (con su marca de tiempo) y la escritura en
+#disco se hace en el hilo del bus: el receptor de telemetría (bucle asyncio de todos los drones) no toca el
+#disco. El orden del fichero es el de las llamadas a write(), vengan del hilo que vengan
+class FlightRecorder:
+
+    def __init__(self, path: str, bus=None):
+        self.path = path
+        self._f = open(path, "wb", buffering=1 << 16)
+        self._f.write(_MAGIC)
+        self._lock = threading.Lock()
+        self._bus = bus
+        self.records = 0
+
+    def write(self, kind: int, payload: bytes, ts: Optional[float] = None) -> None:
+        data = _HDR.pack(len(payload), time.monotonic() if ts is None else ts, kind) + payload
+        with self._lock:
+            if self._f is None:
+                return
+            self.records += 1
+            if self._bus is None:
+                self._f.write(data)
+            else:
+                self._bus.post(self._write_data, data)   # Bajo el lock: la cola del bus conserva el orden
+
+    def _write_data(self, data: bytes) -> None:
+        with self._lock:
+            if self._f is not None:
+                self._f.write(data)
+
+    def command(self, cmd: str) -> None:
+        self.write(REC_CMD, str(cmd).encode("utf-8"))
+
+    def response(self, cmd: str, resp: Any) -> None:
+        self.write(REC_RESP, f"{cmd}\0{resp}".encode("utf-8"))
+
+    def rc(self, lr: int, fb: int, ud: int, yaw: int) -> None:
+        self.write(REC_RC, _RC.pack(int(lr), int(fb), int(ud), int(yaw)))
+
+    def state(self, st: TelloState, flight_state: str) -> None:
+        self.write(REC_STATE, _pack_state(st, flight_state), ts=st.ts)
+
+    def pose(self, pose) -> None:
+        self.write(REC_POSE, _POSE.pack(pose.x_cm, pose.y_cm, pose.z_cm, pose.yaw_deg))
+
+    def pose_event(self, name: str, *args) -> None:
+        self.write(REC_POSE_EVT, json.dumps([name, *args]).encode("utf-8"))
+
+    def mission(self, waypoints, curves: bool) -> None:
+        self.write(REC_MISSION, json.dumps({"waypoints": waypoints, "curves": bool(curves)}).encode("utf-8"))
+
+    def config(self, dron) -> None:
+        self.write(REC_CONFIG, json.dumps(_config_of(dron)).encode("utf-8"))
+
+    #Espera a que el hilo del bus haya escrito lo pendiente y cierra el fichero
+    def close(self) -> None:
+        bus = self._bus
+        if bus is not None and not bus.in_dispatcher():
+            hecho = threading.Event()
+            bus.post(hecho.set)
+            hecho.wait(5.0)
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+
+#Empieza a grabar el vuelo en 'path' (se sobrescribe si existe)
+def start_flight_recording(self, path: str) -> FlightRecorder:
+    stop_flight_recording(self)
+    rec = FlightRecorder(path, getattr(self, "events", None))
+    rec.config(self)
+    self._recorder = rec
+    if getattr(self, "pose", None) is not None:
+        self.pose.recorder = rec
+    print(f"[recorder] Grabando en {path}")
+    return rec
+
+
+def stop_flight_recording(self) -> Optional[str]:
+    rec = getattr(self, "_recorder", None)
+    if rec is None:
+        return None
+    self._recorder = None
+    if getattr(self, "pose", None) is not None:
+        self.pose.recorder = None
+    rec.close()
+    print(f"[recorder] {rec.records} registros guardados en {rec.path}")
+    return rec.path
+
+
+#Se llama al cambiar la configuración del geofence, los pads o el EKF mientras se graba
+def _record_config(self) -> None:
+    rec = getattr(self, "_recorder", None)
+    if rec is not None:
+        rec.config(self)
+
+
+#Recorre el fichero (con mmap, sin cargarlo entero) devolviendo (ts, tipo, valor decodificado)
+def read_flight_log(path: str) -> Iterator[Tuple[float, int, Any]]:
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(_MAGIC)] != _MAGIC:
+                raise ValueError(f"{path}: no es un registro de vuelo de TelloLink")
+            pos, end = len(_MAGIC), len(mm)
+            while pos + _HDR.size <= end:
+                n, ts, kind = _HDR.unpack_from(mm, pos)
+                pos += _HDR.size
+                if pos + n > end:
+                    break  # Último registro cortado (p.ej. el programa murió grabando)
+                payload = mm[pos:pos + n]
+                pos += n
+                if kind == REC_STATE:
+                    value = _unpack_state(payload)
+                elif kind == REC_RC:
+                    value = _RC.unpack(payload)
+                elif kind == REC_POSE:
+                    value = _POSE.unpack(payload)
+                elif kind in (REC_CONFIG, REC_POSE_EVT, REC_MISSION):
+                    value = json.loads(payload.decode("utf-8"))
+                elif kind == REC_RESP:
+                    value = tuple(payload.decode("utf-8").split("\0", 1))
+                else:
+                    value = payload.decode("utf-8")
+                yield ts, kind, value
+
+
+@dataclass
+class ReplayResult:
+    records: int = 0
+    duration_s: float = 0.0            # Duración del vuelo grabado
+    replay_s: float = 0.0              # Lo que ha tardado la reproducción
+    commands: List[Tuple[float, str, str]] = field(default_factory=list)      # (ts, comando, respuesta)
+    trajectory: List[Tuple[float, float, float, float, float]] = field(default_factory=list)  # (ts, x, y, z, yaw)
+    pose_max_err_cm: float = 0.0       # Máxima diferencia con la pose grabada
+    violations: List[Tuple[float, float, float, float]] = field(default_factory=list)  # (ts, x, y, z)
+    missions: List[Tuple[float, list, Any]] = field(default_factory=list)     # (ts, etiquetas, fallo de check_path)
+
+
+#Dron sin conexión sobre el que se reproduce el vuelo
+def _replay_drone(clock):
+    from TelloLink.Tello import TelloDron
+    dron = TelloDron(id="replay")
+    dron._telemetry_stop = False
+    dron._replay_clock = clock
+    return dron
+
+
+def _apply_config(dron, cfg: dict) -> None:
+    from TelloLink.modules.tello_geofence import ExclusionPolygon, _gf_build_field
+    from TelloLink.modules.tello_ekf import PoseEKF
+    dron._gf_enabled = cfg.get("gf_enabled", False)
+    dron._gf_limits = cfg.get("gf_limits")
+    dron._gf_center = tuple(cfg.get("gf_center") or (0.0, 0.0))
+    if cfg.get("gf_mode") is not None:
+        dron._gf_mode = cfg["gf_mode"]
+    if cfg.get("gf_margen") is not None:
+        dron._gf_margen = cfg["gf_margen"]
+    if cfg.get("gf_confirm_s") is not None:
+        dron._gf_confirm_s = cfg["gf_confirm_s"]
+    dron._gf_sdf_cell = cfg.get("gf_sdf_cell")
+    dron._gf_excl_circles = [dict(c) for c in cfg.get("circles", [])]
+    dron._gf_excl_polys = [ExclusionPolygon(p["poly"], p.get("zmin"), p.get("zmax")) for p in cfg.get("polys", [])]
+    _gf_build_field(dron)
+    dron._pad_map = {int(k): tuple(v) for k, v in cfg.get("pads", {}).items()}
+    if cfg.get("ekf") and dron.pose.ekf is None:
+        dron.pose.ekf = PoseEKF(dron.pose, clock=dron._replay_clock)
+    elif not cfg.get("ekf"):
+        dron.pose.ekf = None
+
+
+#Reproduce un vuelo grabado. speed=None: lo más rápido posible; speed=1.0: tiempo real; 2.0: el doble...
+#on_record(ts, tipo, valor, dron) se llama tras procesar cada registro
+def replay_flight(path: str, speed: Optional[float] = None,
+                  on_record: Optional[Callable[[float, int, Any, Any], None]] = None) -> ReplayResult:
+    from TelloLink.modules.tello_telemetry import _on_state
+    from TelloLink.modules.tello_geofence import _gf_violated, _gf_confirm
+    from TelloLink.modules.tello_mission import _validate_and_normalize, _plan_tramos
+
+    now = [0.0]
+    dron = _replay_drone(lambda: now[0])
+    res = ReplayResult()
+    t_first = None
+    t0_wall = time.perf_counter()
+    pending_cmd = {}
+    confirmada = False
+
+    for ts, kind, value in read_flight_log(path):
+        if t_first is None:
+            t_first = ts
+        if speed and speed > 0:
+            espera = (ts - t_first) / speed - (time.perf_counter() - t0_wall)
+            if espera > 0:
+                time.sleep(espera)
+        now[0] = ts
+        res.records += 1
+        res.duration_s = ts - t_first
+
+        if kind == REC_CONFIG:
+            _apply_config(dron, value)
+
+        elif kind == REC_STATE:
+            st, flight_state = value
+            dron.state = flight_state
+            _on_state(dron, st)
+            p = dron.pose
+            res.trajectory.append((ts, p.x_cm, p.y_cm, p.z_cm, p.yaw_deg))
+            # Mismo criterio que el monitor: fuera durante al menos _gf_confirm_s (se anota al confirmarse)
+            if dron._gf_enabled and flight_state in ("flying", "landing", "hovering", "takingoff"):
+                ahora = _gf_confirm(dron, _gf_violated(dron, p.x_cm, p.y_cm, p.z_cm), st.ts)
+                if ahora and not confirmada:
+                    res.violations.append((ts, p.x_cm, p.y_cm, p.z_cm))
+                confirmada = ahora
+
+        elif kind == REC_POSE:
+            if res.trajectory:
+                _, x, y, z, _ = res.trajectory[-1]
+                err = ((x - value[0]) ** 2 + (y - value[1]) ** 2 + (z - value[2]) ** 2) ** 0.5
+                res.pose_max_err_cm = max(res.pose_max_err_cm, err)
+
+        elif kind == REC_POSE_EVT:
+            name, args = value[0], value[1:]
+            if name == "ekf_advance":
+                if dron.pose.ekf is not None:
+                    dron.pose.ekf.advance()
+            else:
+                getattr(dron.pose, name)(*args)
+
+        elif kind == REC_CMD:
+            pending_cmd[value] = ts
+
+        elif kind == REC_RESP:
+            cmd, resp = value
+            res.commands.append((pending_cmd.pop(cmd, ts), cmd, resp))
+
+        elif kind == REC_MISSION:
+            try:
+                wps = _validate_and_normalize(value["waypoints"])
+                tramos, etiquetas = _plan_tramos(dron, wps, value["curves"])
+                fallo = dron.check_path(tramos) if dron._gf_enabled else None
+            except Exception as e:
+                etiquetas, fallo = [], f"error: {e}"
+            res.missions.append((ts, etiquetas, fallo))
+
+        if on_record is not None:
+            on_record(ts, kind, value, dron)
+
+    res.replay_s = time.perf_counter() - t0_wall
+    return res
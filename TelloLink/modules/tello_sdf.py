@@ -0,0 +1,232 @@
+from __future__ import annotations
+import copy
+import math
+from typing import Dict, Optional, Tuple
+from TelloLink.modules.tello_geofence import ExclusionPolygon
+
+#Campo de distancias con signo (SDF) del geofence, precalculado en una rejilla XY de NumPy.
+#Cada celda guarda la distancia libre hasta el peligro más cercano (positiva = zona permitida, negativa =
+#dentro de una exclusión o fuera de la inclusión) y su gradiente, que apunta hacia donde uno se aleja del peligro.
+#Las exclusiones se agrupan por banda de altura (zmin, zmax): una capa 2D por banda. La altura se combina al
+#consultar: suelo y techo de la inclusión, y la distancia vertical a cada banda que no contiene a z.
+#Las distancias se guardan truncadas a 'trunc_cm' (más allá no frenan nada), así que añadir una zona solo
+#recalcula las celdas de su entorno. Las consultas son interpolación bilineal, sin recorrer las zonas
+
+_DEFAULT_CELL_CM = 2.0
+_TRUNC_CM = 200.0         #Distancia máxima guardada en las capas de exclusión
+_PAD_CM = 20.0            #Borde extra alrededor de la inclusión (para poder medir cuánto se ha salido)
+_MAX_CELLS = 4_000_000    #Tope de celdas (~16 MB por capa en float32)
+_TRACE_STEPS = 64         #Pasos máximos del sphere tracing
+
+
+def _need_numpy():  # La rejilla del campo se guarda en arrays de NumPy
+    try:
+        import numpy as np
+    except Exception as e:
+        raise RuntimeError("Falta NumPy (pip install numpy)") from e
+    return np
+
+
+class GeofenceSDF:
+
+    def __init__(self, limits, center, circles=(), polys=(), cell_cm=_DEFAULT_CELL_CM, trunc_cm=_TRUNC_CM):
+        np = _need_numpy()
+        self._np = np
+        self.cell = float(cell_cm)
+        self.trunc = float(trunc_cm)
+        self.limits = dict(limits) if limits else None
+        self.center = (float(center[0]), float(center[1]))
+        self.signature = None
+
+        xmin, ymin, xmax, ymax = self._extent(circles, polys)
+        self.nx = int(math.ceil((xmax - xmin) / self.cell)) + 1
+        self.ny = int(math.ceil((ymax - ymin) / self.cell)) + 1
+        if self.nx * self.ny > _MAX_CELLS:
+            raise ValueError(f"SDF de {self.nx}x{self.ny} celdas: demasiado grande, usa celdas mayores que {self.cell} cm")
+        self.x0, self.y0 = xmin, ymin
+        self._xs = xmin + np.arange(self.nx) * self.cell
+        self._ys = ymin + np.arange(self.ny) * self.cell
+
+        # Capas: banda (zmin, zmax) -> [distancia, gradiente x, gradiente y], arrays (nx, ny) en float32
+        self.layers: Dict[Tuple[Optional[float], Optional[float]], list] = {}
+        self._incl = None
+        if self.limits and (self.limits.get("max_x") or self.limits.get("max_y")):
+            self._incl = self._gradient(self._inclusion_field(self._xs[:, None], self._ys[None, :]))
+        for c in circles:
+            self.add_zone("circle", c)
+        for p in polys:
+            self.add_zone("poly", p)
+
+    # Caja de la rejilla: la inclusión (con borde) o, sin ella, las exclusiones más la distancia de truncado
+    def _extent(self, circles, polys):
+        if self.limits and self.limits.get("max_x") and self.limits.get("max_y"):
+            hx, hy = self.limits["max_x"] / 2 + _PAD_CM, self.limits["max_y"] / 2 + _PAD_CM
+            cx, cy = self.center
+            return cx - hx, cy - hy, cx + hx, cy + hy
+        cajas = [_bbox(k, e) for k, es in (("circle", circles), ("poly", polys)) for e in es]
+        if not cajas:
+            cajas = [(-1.0, -1.0, 1.0, 1.0)]
+        return (min(b[0] for b in cajas) - self.trunc, min(b[1] for b in cajas) - self.trunc,
+                max(b[2] for b in cajas) + self.trunc, max(b[3] for b in cajas) + self.trunc)
+
+    # La zona entra en la rejilla (si no, hay que reconstruir con otra extensión)
+    def covers(self, kind, entry) -> bool:
+        if self.limits and self.limits.get("max_x") and self.limits.get("max_y"):
+            return True  # Fuera de la inclusión todo es ya peligro: basta con lo que caiga dentro
+        xmin, ymin, xmax, ymax = _bbox(kind, entry)
+        return (xmin - self.trunc >= self.x0 and ymin - self.trunc >= self.y0 and
+                xmax + self.trunc <= self._xs[-1] and ymax + self.trunc <= self._ys[-1])
+
+    # Distancia libre dentro de la caja de inclusión (solo x/y; suelo y techo se miran al consultar)
+    def _inclusion_field(self, X, Y):
+        np = self._np
+        cx, cy = self.center
+        d = np.full(np.broadcast(X, Y).shape, float("inf"))
+        if self.limits.get("max_x"):
+            d = np.minimum(d, self.limits["max_x"] / 2 - np.abs(X - cx))
+        if self.limits.get("max_y"):
+            d = np.minimum(d, self.limits["max_y"] / 2 - np.abs(Y - cy))
+        return d
+
+    def _gradient(self, d):
+        np = self._np
+        d = np.asarray(d, dtype=np.float32)
+        gx, gy = np.gradient(d, self.cell) if min(d.shape) > 1 else (np.zeros_like(d), np.zeros_like(d))
+        return [d, gx.astype(np.float32), gy.astype(np.float32)]
+
+    # Rasteriza una exclusión en la capa de su banda, solo en su caja ± trunc (y recalcula ahí el gradiente)
+    def add_zone(self, kind, entry) -> None:
+        np = self._np
+        if kind == "poly":
+            entry = ExclusionPolygon.from_entry(entry)
+            if len(entry.edges) < 3:
+                return
+        band = (entry["zmin"], entry["zmax"])
+        if band not in self.layers:
+            full = np.full((self.nx, self.ny), self.trunc, dtype=np.float32)
+            self.layers[band] = [full, np.zeros_like(full), np.zeros_like(full)]
+        d, gx, gy = self.layers[band]
+
+        xmin, ymin, xmax, ymax = _bbox(kind, entry)
+        i0, j0 = self._index(xmin - self.trunc, ymin - self.trunc, math.floor)
+        i1, j1 = self._index(xmax + self.trunc, ymax + self.trunc, math.ceil)
+        if i0 > i1 or j0 > j1:
+            return
+        X, Y = self._xs[i0:i1 + 1, None], self._ys[None, j0:j1 + 1]
+
+        if kind == "circle":
+            zona = np.hypot(X - entry["cx"], Y - entry["cy"]) - entry["r"]
+        else:
+            zona = np.full(np.broadcast(X, Y).shape, float("inf"))
+            for x1, y1, ex, ey, len_sq, _ in entry.edges:
+                px, py = X - x1, Y - y1
+                t = np.clip((px * ex + py * ey) / len_sq, 0.0, 1.0) if len_sq > 0 else 0.0
+                zona = np.minimum(zona, np.hypot(px - t * ex, py - t * ey))
+            XX, YY = np.broadcast_arrays(X, Y)
+            dentro = entry.contains_many(np, XX.ravel(), YY.ravel()).reshape(zona.shape)
+            zona = np.where(dentro, -zona, zona)
+        d[i0:i1 + 1, j0:j1 + 1] = np.minimum(d[i0:i1 + 1, j0:j1 + 1], np.minimum(zona, self.trunc))
+
+        # Gradiente en la ventana con una celda más de contexto por cada lado
+        a0, b0 = max(0, i0 - 1), max(0, j0 - 1)
+        a1, b1 = min(self.nx, i1 + 2), min(self.ny, j1 + 2)
+        _, wgx, wgy = self._gradient(d[a0:a1, b0:b1])
+        gx[i0:i1 + 1, j0:j1 + 1] = wgx[i0 - a0:i1 + 1 - a0, j0 - b0:j1 + 1 - b0]
+        gy[i0:i1 + 1, j0:j1 + 1] = wgy[i0 - a0:i1 + 1 - a0, j0 - b0:j1 + 1 - b0]
+
+    # Copia del campo con una zona más, para cambiarlo mientras otros hilos lo consultan: solo se copian las capas
+    # de la banda de la zona y el resto se comparte. Quien tenga el campo viejo sigue viéndolo entero
+    def with_zone(self, kind, entry) -> "GeofenceSDF":
+        new = copy.copy(self)
+        new.layers = dict(self.layers)
+        zona = ExclusionPolygon.from_entry(entry) if kind == "poly" else entry
+        band = (zona["zmin"], zona["zmax"])
+        if band in new.layers:
+            new.layers[band] = [a.copy() for a in new.layers[band]]
+        new.add_zone(kind, entry)
+        return new
+
+    def _index(self, x, y, redondeo):
+        i = int(redondeo((x - self.x0) / self.cell))
+        j = int(redondeo((y - self.y0) / self.cell))
+        return min(max(i, 0), self.nx - 1), min(max(j, 0), self.ny - 1)
+
+    # Distancia libre en (x, y, z) y dirección de escape (unitaria), o None si el punto cae fuera de la rejilla
+    def query(self, x, y, z):
+        fx, fy = (x - self.x0) / self.cell, (y - self.y0) / self.cell
+        if not (0.0 <= fx <= self.nx - 1 and 0.0 <= fy <= self.ny - 1):
+            return None
+        i, j = min(int(fx), self.nx - 2), min(int(fy), self.ny - 2)
+        tx, ty = fx - i, fy - j
+        w00, w10, w01, w11 = (1 - tx) * (1 - ty), tx * (1 - ty), (1 - tx) * ty, tx * ty
+
+        def bil(a):
+            return float(a[i, j] * w00 + a[i + 1, j] * w10 + a[i, j + 1] * w01 + a[i + 1, j + 1] * w11)
+
+        best, grad = float("inf"), (0.0, 0.0, 0.0)
+        if self.limits:
+            zmin, zmax = self.limits.get("zmin", 0.0), self.limits.get("max_z")
+            if z - zmin < best:
+                best, grad = z - zmin, (0.0, 0.0, 1.0)
+            if zmax and zmax - z < best:
+                best, grad = zmax - z, (0.0, 0.0, -1.0)
+            if self._incl is not None:
+                d = bil(self._incl[0])
+                if d < best:
+                    best, grad = d, (bil(self._incl[1]), bil(self._incl[2]), 0.0)
+
+        for (bmin, bmax), (dl, gxl, gyl) in self.layers.items():
+            dxy = bil(dl)
+            abajo = (bmin - z) if bmin is not None else -float("inf")
+            arriba = (z - bmax) if bmax is not None else -float("inf")
+            gap = max(abajo, arriba, 0.0)
+            if gap > 0:
+                # Fuera de la banda: distancia al prisma combinando horizontal y vertical
+                h = max(dxy, 0.0)
+                d = math.hypot(h, gap)
+                if d < best:
+                    gz = -1.0 if abajo > 0 else 1.0
+                    best, grad = d, (h * bil(gxl) / d, h * bil(gyl) / d, gz * gap / d)
+            elif dxy < best:
+                best, grad = dxy, (bil(gxl), bil(gyl), 0.0)
+
+        n = math.sqrt(grad[0] ** 2 + grad[1] ** 2 + grad[2] ** 2)
+        return best, ((grad[0] / n, grad[1] / n, grad[2] / n) if n > 0 else (0.0, 0.0, 0.0))
+
+    def distance(self, x, y, z) -> Optional[float]:
+        q = self.query(x, y, z)
+        return None if q is None else q[0]
+
+    # Tiempo hasta el impacto siguiendo la velocidad (cm/s) por sphere tracing: se avanza cada vez lo que
+    # dice el campo, que nunca se pasa del peligro. inf si no hay impacto antes de 'alcance_cm';
+    # None si el rayo sale de la rejilla sin decidir (hay que usar el cálculo exacto)
+    def time_to_impact(self, x, y, z, vx, vy, vz, alcance_cm=float("inf")) -> Optional[float]:
+        rapidez = math.sqrt(vx * vx + vy * vy + vz * vz)
+        if rapidez <= 0:
+            return float("inf")
+        ux, uy, uz = vx / rapidez, vy / rapidez, vz / rapidez
+        eps = 0.25 * self.cell
+        recorrido = 0.0
+        saliendo = True
+        for _ in range(_TRACE_STEPS):
+            q = self.query(x + ux * recorrido, y + uy * recorrido, z + uz * recorrido)
+            if q is None:
+                return float("inf") if not self.limits else None
+            d, (gx, gy, gz) = q
+            if d <= eps:
+                # Pegado al peligro (o dentro) desde el principio: se deja alejarse o deslizar por el borde
+                if saliendo and ux * gx + uy * gy + uz * gz >= 0:
+                    recorrido += self.cell
+                    continue
+                return recorrido / rapidez
+            saliendo = False
+            recorrido += d
+            if recorrido > alcance_cm:
+                return float("inf")
+        return recorrido / rapidez
+
+
+def _bbox(kind, entry):
+    if kind == "circle":
+        return entry["cx"] - entry["r"], entry["cy"] - entry["r"], entry["cx"] + entry["r"], entry["cy"] + entry["r"]
+    return ExclusionPolygon.from_entry(entry).bbox
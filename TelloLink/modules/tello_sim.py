@@ -0,0 +1,451 @@
+from __future__ import annotations
+import heapq
+import math
+import random
+import socket
+import threading
+import time
+from typing import Optional, Tuple
+from TelloLink.modules.tello_pose import MAX_SPEED_CM_S, MAX_YAW_DEG_S
+
+#Simulador local del Tello: habla el protocolo de texto del SDK por UDP, así se puede probar
+#y medir TelloLink sin dron físico. Uso:
+#   python -m TelloLink.modules.tello_sim --port 8889 --latency 0.02 --loss 0.05 --video
+#y luego en el cliente:  dron.connect(host="127.0.0.1")
+
+SIM_HOST = "127.0.0.1"
+SIM_PORT = 8889
+STATE_PORT = 8890
+VIDEO_PORT = 11111
+
+_TICK_S = 0.02             #Paso del modelo cinemático (50 Hz)
+_STATE_PERIOD_S = 0.1      #El Tello real empuja el estado a ~10 Hz
+_TAKEOFF_H_CM = 80.0       #Altura tras "takeoff"
+_YAW_RATE_DEG_S = 90.0
+_BAT_DRAIN_PCT_S = 0.05    #Descarga de batería en vuelo
+_MIN_STEP, _MAX_STEP = 20, 500
+_MIN_SPEED, _MAX_SPEED = 10, 100
+_PAD_RANGE_CM = 60.0       #Distancia horizontal a la que la cámara inferior ve un mission pad
+_PAD_Z_CM = (30.0, 200.0)  #Alturas a las que se detectan los pads
+
+
+def _wrap180(deg: float) -> float:
+    return (deg + 180.0) % 360.0 - 180.0
+
+
+#Modelo cinemático muy simple: posición en el mismo convenio que PoseVirtual
+#(forward = (cos yaw, sin yaw), right = (-sin yaw, cos yaw), yaw cw positivo)
+class _Kinematics:
+
+    def __init__(self):
+        self.x = 0.0
+        self.y = 0.0
+        self.z = 0.0
+        self.yaw = 0.0
+        self.flying = False
+        self.speed = 50.0           # cm/s para los comandos de desplazamiento
+        self.rc = (0.0, 0.0, 0.0, 0.0)
+        self.targets = []           # Cola de puntos (x, y, z, yaw) de la maniobra en curso
+        self.v_body = (0.0, 0.0, 0.0)
+        self.battery = 100.0
+        self.flight_time = 0.0
+        self.pads = {}              # Mission pads: id -> (x, y, yaw) en el mundo simulado
+        self.mon = False
+
+    def busy(self) -> bool:
+        return bool(self.targets)
+
+    def step(self, dt: float) -> None:
+        prev = (self.x, self.y, self.z)
+        if self.flying:
+            self.flight_time += dt
+            self.battery = max(0.0, self.battery - _BAT_DRAIN_PCT_S * dt)
+
+        if self.targets:
+            tx, ty, tz, tyaw = self.targets[0]
+            dx, dy, dz = tx - self.x, ty - self.y, tz - self.z
+            dist = math.sqrt(dx * dx + dy * dy + dz * dz)
+            dyaw = _wrap180(tyaw - self.yaw)
+            step = self.speed * dt
+            if dist <= step:
+                self.x, self.y, self.z = tx, ty, tz
+            else:
+                self.x += dx / dist * step
+                self.y += dy / dist * step
+                self.z += dz / dist * step
+            ystep = _YAW_RATE_DEG_S * dt
+            self.yaw = tyaw if abs(dyaw) <= ystep else self.yaw + math.copysign(ystep, dyaw)
+            if dist <= step and abs(dyaw) <= ystep:
+                self.targets.pop(0)
+        elif self.flying:
+            lr, fb, ud, yw = self.rc
+            th = math.radians(self.yaw)
+            vf = fb / 100.0 * MAX_SPEED_CM_S
+            vr = lr / 100.0 * MAX_SPEED_CM_S
+            self.x += (vf * math.cos(th) - vr * math.sin(th)) * dt
+            self.y += (vf * math.sin(th) + vr * math.cos(th)) * dt
+            self.z = max(0.0, self.z + ud / 100.0 * MAX_SPEED_CM_S * dt)
+            self.yaw = _wrap180(self.yaw + yw / 100.0 * MAX_YAW_DEG_S * dt)
+
+        # Velocidad en ejes del dron (forward, right, up) a partir del desplazamiento real
+        th = math.radians(self.yaw)
+        vx = (self.x - prev[0]) / dt
+        vy = (self.y - prev[1]) / dt
+        self.v_body = (vx * math.cos(th) + vy * math.sin(th),
+                       -vx * math.sin(th) + vy * math.cos(th),
+                       (self.z - prev[2]) / dt)
+
+    def body_to_world(self, f: float, r: float) -> Tuple[float, float]:
+        th = math.radians(self.yaw)
+        return f * math.cos(th) - r * math.sin(th), f * math.sin(th) + r * math.cos(th)
+
+    #Pad visible más cercano como (id, x, y, z, yaw relativo), en los ejes del pad (x adelante, y izquierda)
+    def pad_in_view(self):
+        if not self.mon or not (_PAD_Z_CM[0] <= self.z <= _PAD_Z_CM[1]):
+            return None
+        best = None
+        for pid, (px, py, pyaw) in self.pads.items():
+            dx, dy = self.x - px, self.y - py
+            d = math.hypot(dx, dy)
+            if d <= _PAD_RANGE_CM and (best is None or d < best[0]):
+                th = math.radians(pyaw)
+                best = (d, pid, dx * math.cos(th) + dy * math.sin(th), dx * math.sin(th) - dy * math.cos(th),
+                        _wrap180(self.yaw - pyaw))
+        return None if best is None else (best[1], best[2], best[3], self.z, best[4])
+
+    def state_string(self) -> str:
+        vf, vr, vu = self.v_body
+        pad = self.pad_in_view()
+        mp = ("mid:-1;x:0;y:0;z:0;mpry:0,0,0;" if pad is None else
+              f"mid:{pad[0]};x:{int(round(pad[1]))};y:{int(round(pad[2]))};z:{int(round(pad[3]))};"
+              f"mpry:0,0,{int(round(pad[4]))};")
+        # Mismo convenio de signos que tello_state: vx_cm_s = -vgx, vy_cm_s = -vgy
+        return (f"{mp}pitch:0;roll:0;yaw:{int(round(self.yaw))};"
+                f"vgx:{int(round(-vf))};vgy:{int(round(-vr))};vgz:{int(round(vu))};"
+                f"templ:60;temph:63;tof:{int(self.z) + 10};h:{int(round(self.z))};"
+                f"bat:{int(self.battery)};baro:{self.z / 100.0:.2f};time:{int(self.flight_time)};"
+                f"agx:0.00;agy:0.00;agz:-1000.00;\r\n")
+
+
+class TelloSimulator:
+
+    def __init__(self, host: str = SIM_HOST, port: int = SIM_PORT,
+                 state_port: int = STATE_PORT, video_port: int = VIDEO_PORT,
+                 latency_s: float = 0.0, jitter_s: float = 0.0,
+                 loss: float = 0.0, error_rate: float = 0.0,
+                 video: bool = False, seed: Optional[int] = None,
+                 pads: Optional[dict] = None):
+        self.host = host
+        self.port = int(port)
+        self.state_port = int(state_port)
+        self.video_port = int(video_port)
+        self.latency_s = float(latency_s)
+        self.jitter_s = float(jitter_s)
+        self.loss = float(loss)                 #Probabilidad de perder un comando (sin respuesta)
+        self.error_rate = float(error_rate)     #Probabilidad de responder "error" a un comando válido
+        self.video = bool(video)
+        self.rng = random.Random(seed)
+
+        self.kin = _Kinematics()
+        self.kin.pads = dict(pads or {})          #Mission pads colocados: {id: (x, y, yaw)}
+        self.client: Optional[Tuple[str, int]] = None
+        self.commands_received = 0
+        self._lock = threading.RLock()
+        self._replies = []                      # heap (t_envío, seq, texto, addr)
+        self._seq = 0
+        self._motion_reply = None               # (addr, cmd) pendiente hasta acabar la maniobra
+        self._stream_on = False
+        self._run = False
+        self._threads = []
+        self._sock: Optional[socket.socket] = None
+
+    #CICLO DE VIDA
+    def start(self) -> "TelloSimulator":
+        # Todo (respuestas, estado y vídeo) sale del socket ligado a host: así varios simuladores
+        # en 127.0.0.2, 127.0.0.3... se distinguen por IP de origen, como drones en modo estación
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((self.host, self.port))
+        self._sock.settimeout(0.2)
+        self._run = True
+        targets = [self._rx_loop, self._sim_loop]
+        if self.video:
+            targets.append(self._video_loop)
+        for fn in targets:
+            th = threading.Thread(target=fn, daemon=True)
+            th.start()
+            self._threads.append(th)
+        print(f"[sim] Tello simulado en {self.host}:{self.port} (estado → :{self.state_port})")
+        return self
+
+    def stop(self) -> None:
+        self._run = False
+        for th in self._threads:
+            th.join(timeout=1.0)
+        self._threads = []
+        try:
+            if self._sock is not None:
+                self._sock.close()
+        except Exception:
+            pass
+        self._sock = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    #RESPUESTAS
+    def _schedule_reply(self, text: str, addr) -> None:
+        delay = self.latency_s + (self.rng.uniform(0.0, self.jitter_s) if self.jitter_s > 0 else 0.0)
+        with self._lock:
+            self._seq += 1
+            heapq.heappush(self._replies, (time.monotonic() + delay, self._seq, text, addr))
+
+    def _flush_replies(self) -> None:
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._replies or self._replies[0][0] > now:
+                    return
+                _, _, text, addr = heapq.heappop(self._replies)
+            try:
+                self._sock.sendto(text.encode("utf-8"), addr)
+            except OSError:
+                pass
+
+    #BUCLES
+    def _rx_loop(self) -> None:
+        while self._run:
+            try:
+                data, addr = self._sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.client = addr
+            self.commands_received += 1
+            if self.loss > 0 and self.rng.random() < self.loss:
+                continue  # Comando perdido: el cliente no verá respuesta
+            try:
+                cmd = data.decode("utf-8").strip()
+            except UnicodeDecodeError:
+                continue
+            with self._lock:
+                reply = self._handle(cmd, addr)
+            if reply is not None:
+                if reply == "ok" and self.error_rate > 0 and self.rng.random() < self.error_rate:
+                    reply = "error"
+                self._schedule_reply(reply, addr)
+
+    def _sim_loop(self) -> None:
+        next_state = time.monotonic()
+        last = time.monotonic()
+        while self._run:
+            now = time.monotonic()
+            with self._lock:
+                self.kin.step(max(1e-3, now - last))
+                if self._motion_reply is not None and not self.kin.busy():
+                    addr, _ = self._motion_reply
+                    self._motion_reply = None
+                    self._schedule_reply("ok", addr)
+                state = self.kin.state_string() if now >= next_state else None
+            last = now
+            self._flush_replies()
+            if state is not None and self.client is not None:
+                next_state = now + _STATE_PERIOD_S
+                try:
+                    self._sock.sendto(state.encode("ascii"), (self.client[0], self.state_port))
+                except OSError:
+                    pass
+            time.sleep(_TICK_S)
+
+    #Stream H.264 sintético (barra que se desplaza + contador), requiere PyAV y NumPy
+    def _video_loop(self) -> None:
+        try:
+            import av
+            import numpy as np
+        except Exception:
+            print("[sim] Vídeo desactivado: falta PyAV/NumPy (pip install av numpy)")
+            return
+        w, h, fps = 480, 360, 30
+        codec = av.CodecContext.create("libx264", "w")
+        codec.width, codec.height, codec.pix_fmt = w, h, "yuv420p"
+        codec.framerate = fps
+        codec.options = {"preset": "ultrafast", "tune": "zerolatency", "g": str(fps)}
+        img = np.zeros((h, w, 3), dtype=np.uint8)
+        n = 0
+        while self._run:
+            t0 = time.monotonic()
+            if self._stream_on and self.client is not None:
+                img[:] = 40
+                col = (n * 4) % w
+                img[:, col:col + 16] = (255, 200, 0)
+                img[(n % 10) * (h // 10):(n % 10 + 1) * (h // 10), :16] = (0, 255, 0)
+                frame = av.VideoFrame.from_ndarray(img, format="rgb24")
+                for pkt in codec.encode(frame):
+                    data = bytes(pkt)
+                    for i in range(0, len(data), 1460):
+                        try:
+                            self._sock.sendto(data[i:i + 1460], (self.client[0], self.video_port))
+                        except OSError:
+                            pass
+                n += 1
+            time.sleep(max(0.0, 1.0 / fps - (time.monotonic() - t0)))
+
+    #INTÉRPRETE DEL SDK (se llama con el lock tomado)
+    def _handle(self, cmd: str, addr) -> Optional[str]:
+        k = self.kin
+        parts = cmd.split()
+        if not parts:
+            return "error"
+        verb, args = parts[0].lower(), parts[1:]
+
+        try:
+            nums = [int(float(a)) for a in args]
+        except ValueError:
+            nums = None
+
+        # Lecturas
+        reads = {
+            "battery?": lambda: str(int(k.battery)),
+            "speed?": lambda: f"{k.speed:.1f}",
+            "time?": lambda: f"{int(k.flight_time)}s",
+            "height?": lambda: f"{int(k.z / 10)}dm",
+            "temp?": lambda: "60~63C",
+            "attitude?": lambda: f"pitch:0;roll:0;yaw:{int(k.yaw)};",
+            "baro?": lambda: f"{k.z / 100.0:.2f}",
+            "tof?": lambda: f"{int(k.z) + 10}mm",
+            "wifi?": lambda: "90",
+            "sdk?": lambda: "20",
+            "sn?": lambda: "0TQSIMULATOR",
+        }
+        if verb in reads:
+            return reads[verb]()
+
+        if verb in ("command", "streamon", "streamoff", "mon", "moff", "mdirection", "keepalive", "emergency"):
+            if verb == "streamon":
+                self._stream_on = True
+            elif verb == "streamoff":
+                self._stream_on = False
+            elif verb in ("mon", "moff"):
+                k.mon = verb == "mon"
+            elif verb == "emergency":
+                k.flying, k.targets, k.z, k.rc = False, [], 0.0, (0.0, 0.0, 0.0, 0.0)
+            return "ok"
+
+        if verb == "rc":
+            if nums is not None and len(nums) == 4:
+                k.rc = tuple(float(max(-100, min(100, v))) for v in nums)
+            return None  # rc no tiene respuesta
+
+        if verb == "speed":
+            if nums and _MIN_SPEED <= nums[0] <= _MAX_SPEED:
+                k.speed = float(nums[0])
+                return "ok"
+            return "error"
+
+        if self._motion_reply is not None:
+            return "error Not joystick"  # El Tello real rechaza maniobras solapadas
+
+        if verb == "takeoff":
+            if k.flying:
+                return "error"
+            k.flying = True
+            k.rc = (0.0, 0.0, 0.0, 0.0)
+            k.targets = [(k.x, k.y, _TAKEOFF_H_CM, k.yaw)]
+            self._motion_reply = (addr, cmd)
+            return None
+
+        if verb == "land":
+            if not k.flying:
+                return "error"
+            k.rc = (0.0, 0.0, 0.0, 0.0)
+            k.targets = [(k.x, k.y, 0.0, k.yaw)]
+            k.flying = False
+            self._motion_reply = (addr, cmd)
+            return None
+
+        if not k.flying or nums is None:
+            return "error"
+
+        if verb in ("forward", "back", "left", "right", "up", "down"):
+            if len(nums) != 1 or not (_MIN_STEP <= nums[0] <= _MAX_STEP):
+                return "error"
+            d = float(nums[0])
+            f, r, u = {"forward": (d, 0, 0), "back": (-d, 0, 0), "right": (0, d, 0),
+                       "left": (0, -d, 0), "up": (0, 0, d), "down": (0, 0, -d)}[verb]
+            wx, wy = k.body_to_world(f, r)
+            k.targets = [(k.x + wx, k.y + wy, max(0.0, k.z + u), k.yaw)]
+            self._motion_reply = (addr, cmd)
+            return None
+
+        if verb in ("cw", "ccw"):
+            if len(nums) != 1 or not (1 <= nums[0] <= 360):
+                return "error"
+            d = float(nums[0]) if verb == "cw" else -float(nums[0])
+            k.targets = [(k.x, k.y, k.z, _wrap180(k.yaw + d))]
+            self._motion_reply = (addr, cmd)
+            return None
+
+        # go x y z speed  /  curve x1 y1 z1 x2 y2 z2 speed  (ejes del SDK: x adelante, y izquierda, z arriba)
+        if verb == "go" and len(nums) == 4:
+            x, y, z, sp = nums
+            if not _sdk_point_ok(x, y, z) or not (_MIN_SPEED <= sp <= _MAX_SPEED):
+                return "error"
+            wx, wy = k.body_to_world(x, -y)
+            k.speed = float(sp)
+            k.targets = [(k.x + wx, k.y + wy, max(0.0, k.z + z), k.yaw)]
+            self._motion_reply = (addr, cmd)
+            return None
+
+        if verb == "curve" and len(nums) == 7:
+            x1, y1, z1, x2, y2, z2, sp = nums
+            if not (_sdk_point_ok(x1, y1, z1) and _sdk_point_ok(x2, y2, z2)) or not (10 <= sp <= 60):
+                return "error"
+            # Aproximamos el arco por los dos tramos rectos que pasan por el punto intermedio
+            w1 = k.body_to_world(x1, -y1)
+            w2 = k.body_to_world(x2, -y2)
+            k.speed = float(sp)
+            k.targets = [(k.x + w1[0], k.y + w1[1], max(0.0, k.z + z1), k.yaw),
+                         (k.x + w2[0], k.y + w2[1], max(0.0, k.z + z2), k.yaw)]
+            self._motion_reply = (addr, cmd)
+            return None
+
+        return "error"
+
+
+def _sdk_point_ok(x: int, y: int, z: int) -> bool:
+    if max(abs(x), abs(y), abs(z)) > _MAX_STEP:
+        return False
+    return not (abs(x) < _MIN_STEP and abs(y) < _MIN_STEP and abs(z) < _MIN_STEP)
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Simulador UDP del Tello para TelloLink")
+    ap.add_argument("--host", default=SIM_HOST)
+    ap.add_argument("--port", type=int, default=SIM_PORT)
+    ap.add_argument("--state-port", type=int, default=STATE_PORT)
+    ap.add_argument("--video-port", type=int, default=VIDEO_PORT)
+    ap.add_argument("--latency", type=float, default=0.0, help="latencia de respuesta (s)")
+    ap.add_argument("--jitter", type=float, default=0.0, help="jitter máximo añadido a la latencia (s)")
+    ap.add_argument("--loss", type=float, default=0.0, help="probabilidad de perder un comando")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="probabilidad de responder 'error'")
+    ap.add_argument("--video", action="store_true", help="emitir un stream H.264 sintético")
+    a = ap.parse_args()
+
+    sim = TelloSimulator(a.host, a.port, a.state_port, a.video_port,
+                         latency_s=a.latency, jitter_s=a.jitter, loss=a.loss,
+                         error_rate=a.error_rate, video=a.video).start()
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+from __future__ import annotations
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+STATE_PORT = 8890          #Puerto UDP al que el Tello empuja su estado (~10 Hz)
+
+
+#Registro tipado con un paquete de estado completo. Es inmutable: quien lo lee ve siempre un paquete entero
+@dataclass(frozen=True)
+class TelloState:
+    ts: float                 #time.monotonic() en la llegada del paquete
+    wall_ts: float            #time.time() en la llegada del paquete
+    pitch_deg: int = 0
+    roll_deg: int = 0
+    yaw_deg: int = 0
+    vgx: int = 0              #Velocidades tal y como las manda el Tello (cm/s)
+    vgy: int = 0
+    vgz: int = 0
+    temp_low_c: int = 0
+    temp_high_c: int = 0
+    tof_cm: int = 0
+    height_cm: int = 0
+    battery_pct: int = 0
+    baro_cm: float = 0.0
+    flight_time_s: int = 0
+    agx: float = 0.0
+    agy: float = 0.0
+    agz: float = 0.0
+    # Solo Tello EDU con mission pads activados (mid=-1 si no hay pad)
+    mid: int = -1
+    mp_x_cm: int = 0
+    mp_y_cm: int = 0
+    mp_z_cm: int = 0
+    mpry: Tuple[int, int, int] = (0, 0, 0)
+
+    @property
+    def temp_c(self) -> float:
+        # Igual que djitellopy: media entre la temperatura mínima y máxima
+        return (self.temp_low_c + self.temp_high_c) / 2.0
+
+    # Velocidades con el signo que usa TelloDron (vx/vy invertidas respecto al Tello)
+    @property
+    def vx_cm_s(self) -> int:
+        return -self.vgx
+
+    @property
+    def vy_cm_s(self) -> int:
+        return -self.vgy
+
+    @property
+    def vz_cm_s(self) -> int:
+        return self.vgz
+
+
+# Clave del paquete -> (campo de TelloState, conversor)
+_FIELDS = {
+    "pitch": ("pitch_deg", int), "roll": ("roll_deg", int), "yaw": ("yaw_deg", int),
+    "vgx": ("vgx", int), "vgy": ("vgy", int), "vgz": ("vgz", int),
+    "templ": ("temp_low_c", int), "temph": ("temp_high_c", int),
+    "tof": ("tof_cm", int), "h": ("height_cm", int), "bat": ("battery_pct", int),
+    "baro": ("baro_cm", lambda v: float(v) * 100.0), "time": ("flight_time_s", int),
+    "agx": ("agx", float), "agy": ("agy", float), "agz": ("agz", float),
+    "mid": ("mid", int), "x": ("mp_x_cm", int), "y": ("mp_y_cm", int), "z": ("mp_z_cm", int),
+}
+
+
+#Parsea una línea de estado ("pitch:0;roll:0;...;\r\n") en un único TelloState.
+#Devuelve None si el paquete no es un estado (p.ej. un "ok" perdido)
+def parse_state(raw, ts: Optional[float] = None, wall_ts: Optional[float] = None) -> Optional[TelloState]:
+    if isinstance(raw, (bytes, bytearray)):
+        try:
+            raw = raw.decode("ascii")
+        except UnicodeDecodeError:
+            return None
+    raw = raw.strip()
+    if not raw or ":" not in raw:
+        return None
+
+    values = {}
+    for field in raw.split(";"):
+        key, sep, val = field.partition(":")
+        if not sep:
+            continue
+        if key == "mpry":
+            try:
+                values["mpry"] = tuple(int(p) for p in val.split(","))[:3]
+            except ValueError:
+                pass
+            continue
+        spec = _FIELDS.get(key)
+        if spec is None:
+            continue
+        name, conv = spec
+        try:
+            values[name] = conv(val)
+        except ValueError:
+            continue  # Campo corrupto: lo ignoramos y nos quedamos con el resto
+
+    if not values:
+        return None
+    return TelloState(ts=time.monotonic() if ts is None else ts,
+                      wall_ts=time.time() if wall_ts is None else wall_ts,
+                      **values)
+
+
+#Endpoint del puerto de estado sobre el bucle asyncio compartido (ver tello_channel.get_loop).
+#Hay uno por puerto y proceso: reparte cada paquete, ya parseado, a los oyentes registrados
+#para la IP de origen. Así N drones comparten un socket y ningún hilo propio
+class StateHub:
+
+    _hubs: Dict[int, "StateHub"] = {}
+    _hubs_lock = threading.Lock()
+
+    def __init__(self, port: int = STATE_PORT, bind_ip: str = ""):
+        from TelloLink.modules.tello_channel import get_loop
+        self.port = int(port)
+        self.loop = get_loop()
+        self.last: Dict[str, TelloState] = {}
+        self.packets = 0
+        self._listeners: Dict[str, List[Callable[[TelloState], None]]] = {}
+        self._transport = None
+        asyncio.run_coroutine_threadsafe(self._open(bind_ip), self.loop).result(timeout=5.0)
+
+    #Suscribe cb a los paquetes de 'host' en el hub del puerto, creándolo (y haciendo el bind) si hace falta
+    @classmethod
+    def attach(cls, port: int, host: str, cb: Callable[[TelloState], None]) -> "StateHub":
+        with cls._hubs_lock:
+            hub = cls._hubs.get(int(port))
+            if hub is None:
+                hub = cls(port)  #Si el puerto está ocupado, el OSError sube al llamador
+                cls._hubs[int(port)] = hub
+            hub._listeners.setdefault(host, []).append(cb)
+            return hub
+
+    async def _open(self, bind_ip: str) -> None:
+        hub = self
+
+        class _Proto(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                hub._on_datagram(data, addr[0])
+
+        self._transport, _ = await self.loop.create_datagram_endpoint(
+            _Proto, local_addr=(bind_ip or "0.0.0.0", self.port))
+
+    def _on_datagram(self, data: bytes, host: str) -> None:
+        listeners = self._listeners.get(host)
+        if not listeners:
+            return  # Nadie escucha a ese dron: ni siquiera lo parseamos
+        st = parse_state(data)
+        if st is None:
+            return
+        self.last[host] = st
+        self.packets += 1
+        for cb in list(listeners):
+            try:
+                cb(st)
+            except Exception as e:
+                print(f"[state] Error en callback de estado ({host}): {e}")
+
+    def detach(self, host: str, cb: Callable[[TelloState], None]) -> None:
+        with StateHub._hubs_lock:
+            lst = self._listeners.get(host, [])
+            if cb in lst:
+                lst.remove(cb)
+            if not lst:
+                self._listeners.pop(host, None)
+                self.last.pop(host, None)
+            if self._listeners:
+                return
+            # Sin oyentes liberamos el puerto
+            if StateHub._hubs.get(self.port) is self:
+                del StateHub._hubs[self.port]
+            transport, self._transport = self._transport, None
+        if transport is not None:
+            self.loop.call_soon_threadsafe(transport.close)
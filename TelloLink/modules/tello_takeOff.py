@@ -1,5 +1,6 @@
 
 import time
+from TelloLink.modules.tello_events import HeightEvent, _wait_event
 
 _MIN_BAT_PCT = 10
 
@@ -53,7 +54,7 @@ def _takeOff(self, altura_objetivo_m=0.5, blocking=True):
             if h >= 20:
                 ok_alt = True
                 break
-            time.sleep(0.2)
+            _wait_event(self, HeightEvent, 0.2)  # Despierta con la próxima altura (sin telemetría, cada 0.2 s)
 
         # Empujón extra de subida si no llegó, por si las condiciones del suelo son malas para el despegue
         if not ok_alt:
@@ -79,9 +80,7 @@ def _takeOff(self, altura_objetivo_m=0.5, blocking=True):
         try:
             pose = getattr(self, "pose", None)
             if pose is not None:
-                pose.reset()
-                pose.z_cm = float(h)  # Establecemos Z a la altura barométrica actual
-                pose.yaw_deg = 0.0    # el rumbo actual pasa a ser 0° relativo
+                pose.reset(z_cm=float(h))  # Z a la altura barométrica actual; el rumbo actual pasa a ser 0° relativo
         except Exception:
             pass
 
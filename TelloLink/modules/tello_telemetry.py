@@ -1,5 +1,8 @@
+import math
 import threading
 import time
+from TelloLink.modules.tello_missionpad import _on_pad
+from TelloLink.modules.tello_events import TelemetryEvent, HeightEvent, BatteryEvent, PoseEvent
 
 # Intentamos importar la PoseVirtual
 try:
@@ -8,144 +11,173 @@ except Exception:
     PoseVirtual = None
 
 
-def _telemetry_loop(self, period_s: float):
-    if not hasattr(self, "_pose_takeoff_synced"):
-        self._pose_takeoff_synced = False
-
-    while not getattr(self, "_telemetry_stop", True):
-
-        # Si no hay conexión, esperamos y reintentamos
-        if getattr(self, "_tello", None) is None or getattr(self, "state", "disconnected") == "disconnected":
-            time.sleep(period_s)
-            continue
-
-        # Valores locales para sincronización de la pose
-        height_val = None
-        yaw_val = None
-
-        # Altura (cm)
-        try:
-            h = self._tello.get_height()
-            if h is not None:
-                self.height_cm = max(0, int(h))
-                height_val = self.height_cm
-        except Exception:
-            pass
-
-        # Yaw (grados)
+#Función que se llama por cada paquete de estado recibido (ya parseado en un TelloState).
+#Todos los campos se publican juntos bajo el mismo lock, así nadie ve una mezcla de dos paquetes
+def _on_state(self, st):
+    if getattr(self, "_telemetry_stop", True):
+        return
+    if getattr(self, "state", "disconnected") == "disconnected":
+        return
+
+    rec = getattr(self, "_recorder", None)
+    if rec is not None:
+        rec.state(st, self.state)
+
+    with self._telemetry_lock:
+        prev_h, prev_bat = getattr(self, "height_cm", None), getattr(self, "battery_pct", None)
+        self.telemetry = st
+        self.height_cm = max(0, int(st.height_cm))
+        self.yaw_deg = float(st.yaw_deg)
+        self.battery_pct = max(0, int(st.battery_pct))
+        self.temp_c = float(st.temp_c)
+        self.flight_time_s = max(0, int(st.flight_time_s))
+        self.vx_cm_s = int(st.vx_cm_s)
+        self.vy_cm_s = int(st.vy_cm_s)
+        self.vz_cm_s = int(st.vz_cm_s)
+        self.telemetry_ts = st.wall_ts
+
+    _sync_pose(self, float(self.height_cm), float(st.yaw_deg))
+
+    # Velocidades medidas: se descartan las imposibles y el resto se integra con la marca de tiempo del paquete.
+    # Con el EKF activo, velocidades y altura se fusionan en el filtro (el yaw ya está sincronizado)
+    vel_ok = _velocity_plausible(self, st)
+    ekf = getattr(getattr(self, "pose", None), "ekf", None)
+    if ekf is not None:
         try:
-            # Primero intentamos get_yaw()
-            gy = getattr(self._tello, "get_yaw", None)
-            if callable(gy):
-                y = gy()
-            else:
-                # Alternativa: leer del estado  si existe
-                y = None
-                gc = getattr(self._tello, "get_current_state", None)
-                if callable(gc):
-                    try:
-                        st = gc()
-
-                        if isinstance(st, dict):
-                            y = st.get("yaw", None)
-                    except Exception:
-                        y = None
-
-            if y is not None:
-                self.yaw_deg = float(y)
-                yaw_val = self.yaw_deg
-        except Exception:
-            pass
-
-        # Batería (%)
+            ekf.update_state(st, use_velocity=vel_ok)
+        except Exception as e:
+            print(f"[telemetry] Error en el EKF: {e}")
+    elif vel_ok:
+        _integrate_velocity(self, st)
+
+    # Mission pad a la vista: posición absoluta
+    if st.mid > 0 and getattr(self, "_pad_map", None):
         try:
-            b = self._tello.get_battery()
-            if b is not None:
-                self.battery_pct = max(0, int(b))
-        except Exception:
-            pass
-
-        # Temperatura (°C)
-        try:
-            t = self._tello.get_temperature()
-            if t is not None:
-                self.temp_c = float(t)
-        except Exception:
-            pass
+            _on_pad(self, st)
+        except Exception as e:
+            print(f"[telemetry] Error con el mission pad {st.mid}: {e}")
+
+    # Historial: el paquete junto con la pose ya actualizada
+    hist = getattr(self, "history", None)
+    if hist is not None:
+        hist.append(st, getattr(self, "pose", None))
+    if rec is not None and getattr(self, "pose", None) is not None:
+        rec.pose(self.pose)
+
+    _publish_state(self, st, prev_h, prev_bat)
+
+
+#Publica el paquete en el bus: siempre el paquete y la pose, y altura/batería solo cuando cambian
+def _publish_state(self, st, prev_h, prev_bat) -> None:
+    bus = getattr(self, "events", None)
+    if bus is None:
+        return
+    bus.publish(TelemetryEvent(state=st, ts=st.ts))
+    if self.height_cm != prev_h:
+        bus.publish(HeightEvent(height_cm=self.height_cm, prev_cm=prev_h, ts=st.ts))
+    if self.battery_pct != prev_bat:
+        bus.publish(BatteryEvent(battery_pct=self.battery_pct, prev_pct=prev_bat, ts=st.ts))
+    pose = getattr(self, "pose", None)
+    if pose is not None:
+        bus.publish(PoseEvent(x_cm=pose.x_cm, y_cm=pose.y_cm, z_cm=pose.z_cm, yaw_deg=pose.yaw_deg, ts=st.ts))
+
+
+#Filtro de valores atípicos de velocidad. Un paquete se descarta si alguna velocidad supera lo que puede
+#volar un Tello o si el salto respecto a la última aceptada implica una aceleración imposible.
+#Tras varios descartes seguidos se acepta igualmente (el dron ha cambiado de verdad de velocidad)
+_VEL_MAX_CM_S = 400.0      #Velocidad máxima creíble en cualquier eje
+_ACC_MAX_CM_S2 = 1000.0    #Aceleración máxima creíble (~1 g)
+_ACC_SLACK_CM_S = 15.0     #Margen por la cuantización de las velocidades (enteros en cm/s)
+_MAX_REJECTS = 3           #Descartes seguidos antes de aceptar el nuevo valor
+_MAX_GAP_S = 0.5           #Con huecos mayores entre paquetes no se integra (se reinicia la integración)
+
+
+def _velocity_plausible(self, st) -> bool:
+    v = (float(st.vx_cm_s), float(st.vy_cm_s), float(st.vz_cm_s))
+    if any(abs(c) > _VEL_MAX_CM_S for c in v):
+        return False
+    last = getattr(self, "_vel_accepted", None)
+    if last is not None:
+        dt = st.ts - last[0]
+        if 0 < dt <= _MAX_GAP_S:
+            salto = max(abs(a - b) for a, b in zip(v, last[1]))
+            if salto > _ACC_MAX_CM_S2 * dt + _ACC_SLACK_CM_S:
+                self._vel_rejects = getattr(self, "_vel_rejects", 0) + 1
+                if self._vel_rejects <= _MAX_REJECTS:
+                    return False
+    self._vel_rejects = 0
+    self._vel_accepted = (st.ts, v)
+    return True
 
-        # WiFi (0..100 aprox)
-        try:
-            w = self._tello.get_wifi()
-            if w is not None:
-                self.wifi = int(w)
-        except Exception:
-            pass
 
-        #  Tiempo de vuelo (s)
-        try:
-            ft = self._tello.get_flight_time()
-            if ft is not None:
-                self.flight_time_s = max(0, int(ft))
-        except Exception:
-            pass
+#Integra en la pose la velocidad medida (ejes del dron -> mapa con el yaw actual) entre este paquete
+#y el anterior aceptado, por trapecios y con el dt real de llegada. Solo en vuelo y solo x/y:
+#la altura ya llega medida
+def _integrate_velocity(self, st) -> None:
+    pose = getattr(self, "pose", None)
+    prev = getattr(self, "_vel_world", None)
+    if pose is None or getattr(self, "state", "") != "flying":
+        self._vel_world = None
+        return
+    yaw = math.radians(pose.yaw_deg)
+    vf, vr = float(st.vx_cm_s), float(st.vy_cm_s)
+    vx = vf * math.cos(yaw) - vr * math.sin(yaw)
+    vy = vf * math.sin(yaw) + vr * math.cos(yaw)
+    self._vel_world = (st.ts, vx, vy)
+    if prev is None:
+        return
+    dt = st.ts - prev[0]
+    if dt <= 0 or dt > _MAX_GAP_S:
+        return
+    pose.integrate_velocity(0.5 * (vx + prev[1]) * dt, 0.5 * (vy + prev[2]) * dt)
+
+
+#Hay telemetría reciente (la pose x/y la está integrando el hilo de telemetría)
+def telemetry_fresh(self, max_age_s: float = _MAX_GAP_S) -> bool:
+    st = getattr(self, "telemetry", None)
+    if st is None or getattr(self, "_telemetry_stop", True):
+        return False
+    return (time.monotonic() - st.ts) <= max_age_s
 
-        # Velocidades (cm/s)
 
-        try:
-            vx = self._tello.get_speed_x()
-            vy = self._tello.get_speed_y()
-            vz = self._tello.get_speed_z()
-            if vx is not None:
-                self.vx_cm_s = int(-vx)
-            if vy is not None:
-                self.vy_cm_s = int(-vy)
-            if vz is not None:
-                self.vz_cm_s = int(vz)
-        except Exception:
-            pass
+#Sincroniza la pose virtual con la altura y el yaw del paquete
+def _sync_pose(self, height_val, yaw_val):
+    try:
+        # Si aún no existe pose, la creamos
+        if not hasattr(self, "pose") or self.pose is None:
+            if PoseVirtual is not None:
+                self.pose = PoseVirtual(bus=getattr(self, "events", None))
 
+        if hasattr(self, "pose") and self.pose is not None:
+            # Altura (z)
+            self.pose.set_from_telemetry(height_cm=height_val)
 
-        try:
-            # Si aún no existe pose, la creamos
-            if not hasattr(self, "pose") or self.pose is None:
-                if PoseVirtual is not None:
-                    self.pose = PoseVirtual()
-
-            if hasattr(self, "pose") and self.pose is not None:
-                # Altura (z)
-                self.pose.set_from_telemetry(height_cm=height_val)
-
-                # Yaw absoluto -> relativo
-                if yaw_val is not None:
-                    try:
-                        self.pose.set_heading_from_absolute_yaw(yaw_val)
-                    except Exception:
-                        pass
-
-                # Al pasar a estado 'flying' por primera vez, fijamos referencia de yaw del vuelo
+            # Yaw absoluto -> relativo
+            if yaw_val is not None:
                 try:
-                    if getattr(self, "state", "") == "flying":
-                        if yaw_val is not None and not getattr(self, "_pose_takeoff_synced", False):
-                            self.pose.set_takeoff_reference(yaw_val)
-                            self._pose_takeoff_synced = True
-                    else:
-                        # cuando no estamos volando, reseteamos la marca para el siguiente vuelo
-                        self._pose_takeoff_synced = False
+                    self.pose.set_heading_from_absolute_yaw(yaw_val)
                 except Exception:
                     pass
-        except Exception:
-            pass
-
-        self.telemetry_ts = time.time()
-
-        time.sleep(period_s)
-
-
-def startTelemetry(self, freq_hz: int = 5):
-    if freq_hz <= 0:
-        freq_hz = 5
 
-    if getattr(self, "_telemetry_thread", None) and self._telemetry_thread.is_alive():
+            # Al pasar a estado 'flying' por primera vez, fijamos referencia de yaw del vuelo
+            try:
+                if getattr(self, "state", "") == "flying":
+                    if yaw_val is not None and not getattr(self, "_pose_takeoff_synced", False):
+                        self.pose.set_takeoff_reference(yaw_val)
+                        self._pose_takeoff_synced = True
+                else:
+                    # cuando no estamos volando, reseteamos la marca para el siguiente vuelo
+                    self._pose_takeoff_synced = False
+            except Exception:
+                pass
+    except Exception:
+        pass
+
+
+#freq_hz se mantiene por compatibilidad: ahora la telemetría llega al ritmo nativo del Tello (~10 Hz),
+#empujada por el receptor de estado, sin sondeo ni sleeps
+def startTelemetry(self, freq_hz: int = 5, history_len: int = 6000):
+    if not getattr(self, "_telemetry_stop", True):
         return False
 
     # Inicialización de atributos (si no existen)
@@ -157,27 +189,48 @@ def startTelemetry(self, freq_hz: int = 5):
     self.vx_cm_s = getattr(self, "vx_cm_s", 0)
     self.vy_cm_s = getattr(self, "vy_cm_s", 0)
     self.vz_cm_s = getattr(self, "vz_cm_s", 0)
-    self._last_pose_update_ts = time.time()
+    self.telemetry = getattr(self, "telemetry", None)
     self.telemetry_ts = time.time()
+    if not hasattr(self, "_pose_takeoff_synced"):
+        self._pose_takeoff_synced = False
+    if getattr(self, "_telemetry_lock", None) is None:
+        self._telemetry_lock = threading.Lock()
 
     # Creamos aquí la pose
     if not hasattr(self, "pose") or self.pose is None:
         if PoseVirtual is not None:
-            self.pose = PoseVirtual()
+            self.pose = PoseVirtual(bus=getattr(self, "events", None))
+
+    # Historial de telemetría (necesita NumPy; sin él se sigue sin historial)
+    if getattr(self, "history", None) is None and history_len > 0:
+        try:
+            from TelloLink.modules.tello_history import TelemetryHistory
+            self.history = TelemetryHistory(history_len)
+        except RuntimeError as e:
+            print(f"[telemetry] Sin historial: {e}")
+            self.history = None
+
+    backend = getattr(self, "_tello", None)
+    if backend is None or not hasattr(backend, "add_state_listener"):
+        print("[telemetry] No hay backend con receptor de estado. ¿Llamaste connect()?")
+        return False
 
     self._telemetry_stop = False
-    period_s = 1.0 / float(freq_hz)
+    self._telemetry_cb = lambda st: _on_state(self, st)
+    backend.add_state_listener(self._telemetry_cb)
 
-    th = threading.Thread(target=_telemetry_loop, args=(self, period_s), daemon=True)
-    self._telemetry_thread = th
-    th.start()
+    # Publicamos ya el último paquete recibido, si lo hay
+    last = getattr(backend, "state", None)
+    if last is not None:
+        _on_state(self, last)
     return True
 
 
 def stopTelemetry(self):
     self._telemetry_stop = True
-    th = getattr(self, "_telemetry_thread", None)
-    if th and th.is_alive():
-        th.join(timeout=2.0)
-    self._telemetry_thread = None
-    return True
\ No newline at end of file
+    cb = getattr(self, "_telemetry_cb", None)
+    backend = getattr(self, "_tello", None)
+    if cb is not None and backend is not None and hasattr(backend, "remove_state_listener"):
+        backend.remove_state_listener(cb)
+    self._telemetry_cb = None
+    return True
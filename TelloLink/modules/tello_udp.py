@@ -0,0 +1,167 @@
+from __future__ import annotations
+import threading
+from typing import Callable, List, Optional
+
+from TelloLink.modules.tello_state import StateHub, TelloState, STATE_PORT
+from TelloLink.modules.tello_channel import CommandChannel
+
+TELLO_IP = "192.168.10.1"
+CONTROL_PORT = 8889
+VIDEO_PORT = 11111
+_FIRST_STATE_WAIT_S = 1.0  #Tiempo máximo esperando el primer paquete de estado tras "command"
+
+
+#Backend UDP propio. Expone el subconjunto de la API de djitellopy que usa TelloLink
+#(send_read_command, get_height, send_rc_control, streamon...) pero es dueño de su puerto
+#de estado, de modo que cada paquete se parsea una sola vez en un TelloState
+class TelloUDP:
+
+    VS_UDP_IP = "0.0.0.0"
+
+    #local_port=0 deja que el SO elija el puerto de origen: el Tello responde a quien le escribe,
+    #y así el cliente puede convivir en la misma máquina con el simulador (que escucha en 8889)
+    def __init__(self, host: str = TELLO_IP,
+                 port: int = CONTROL_PORT,
+                 state_port: int = STATE_PORT,
+                 vs_udp: int = VIDEO_PORT,
+                 local_port: int = 0):
+        self.address = (host, int(port))
+        self.vs_udp_port = vs_udp
+        self.stream_on = False
+        self.background_frame_read = None
+
+        self.channel = CommandChannel(self.address, local_port=local_port)
+
+        self._state_listeners: List[Callable[[TelloState], None]] = []
+        self._state_event = threading.Event()
+        self.state: Optional[TelloState] = None
+        try:
+            self._hub = StateHub.attach(state_port, host, self._dispatch_state)
+        except OSError:
+            self.channel.close()
+            raise
+
+    #ESTADO
+    def _dispatch_state(self, st: TelloState) -> None:
+        self.state = st  # Sustitución atómica de la referencia
+        self._state_event.set()
+        for cb in list(self._state_listeners):
+            cb(st)
+
+    def add_state_listener(self, cb: Callable[[TelloState], None]) -> None:
+        if cb not in self._state_listeners:
+            self._state_listeners.append(cb)
+
+    def remove_state_listener(self, cb: Callable[[TelloState], None]) -> None:
+        try:
+            self._state_listeners.remove(cb)
+        except ValueError:
+            pass
+
+    def get_current_state(self) -> dict:
+        st = self.state
+        if st is None:
+            return {}
+        return {"pitch": st.pitch_deg, "roll": st.roll_deg, "yaw": st.yaw_deg,
+                "vgx": st.vgx, "vgy": st.vgy, "vgz": st.vgz, "h": st.height_cm,
+                "bat": st.battery_pct, "time": st.flight_time_s, "tof": st.tof_cm,
+                "templ": st.temp_low_c, "temph": st.temp_high_c, "mid": st.mid}
+
+    def _require_state(self) -> TelloState:
+        st = self.state
+        if st is None:
+            raise RuntimeError("Aún no se ha recibido ningún paquete de estado del Tello.")
+        return st
+
+    def get_height(self) -> int:
+        return self._require_state().height_cm
+
+    def get_yaw(self) -> int:
+        return self._require_state().yaw_deg
+
+    def get_battery(self) -> int:
+        return self._require_state().battery_pct
+
+    def get_temperature(self) -> float:
+        return self._require_state().temp_c
+
+    def get_flight_time(self) -> int:
+        return self._require_state().flight_time_s
+
+    def get_speed_x(self) -> int:
+        return self._require_state().vgx
+
+    def get_speed_y(self) -> int:
+        return self._require_state().vgy
+
+    def get_speed_z(self) -> int:
+        return self._require_state().vgz
+
+    #COMANDOS (todo pasa por el CommandChannel asíncrono; estos métodos son la fachada síncrona)
+    #RESPONSE_TIMEOUT es el timeout por defecto del canal (takeoff, land y lecturas tienen el suyo propio)
+    @property
+    def RESPONSE_TIMEOUT(self) -> float:
+        return self.channel.default_timeout
+
+    @RESPONSE_TIMEOUT.setter
+    def RESPONSE_TIMEOUT(self, value: float) -> None:
+        self.channel.default_timeout = float(value)
+
+    def send_command_with_return(self, command: str, timeout: Optional[float] = None) -> str:
+        return self.channel.call(command, timeout)
+
+    def send_command_async(self, command: str, timeout: Optional[float] = None):
+        return self.channel.submit(command, timeout)
+
+    def send_command_without_return(self, command: str) -> None:
+        self.channel.send_nowait(command)
+
+    def send_read_command(self, command: str) -> str:
+        return str(self.send_command_with_return(command))
+
+    def send_control_command(self, command: str, timeout: Optional[float] = None) -> bool:
+        resp = self.send_command_with_return(command, timeout=timeout)
+        return "ok" in resp.lower()
+
+    def send_rc_control(self, left_right: int, forward_backward: int, up_down: int, yaw: int) -> None:
+        def clamp100(v: int) -> int:
+            return max(-100, min(100, int(v)))
+        self.send_command_without_return(
+            f"rc {clamp100(left_right)} {clamp100(forward_backward)} {clamp100(up_down)} {clamp100(yaw)}")
+
+    def connect(self, wait_for_state: bool = True) -> None:
+        if not self.send_control_command("command"):
+            raise RuntimeError("El Tello no respondió 'ok' al comando 'command'.")
+        if wait_for_state and not self._state_event.wait(_FIRST_STATE_WAIT_S):
+            raise RuntimeError("No se recibió ningún paquete de estado del Tello.")
+
+    #VÍDEO
+    def streamon(self) -> None:
+        self.send_control_command("streamon")
+        self.stream_on = True
+
+    def streamoff(self) -> None:
+        self.send_control_command("streamoff")
+        self.stream_on = False
+        if self.background_frame_read is not None:
+            self.background_frame_read.stop()
+            self.background_frame_read = None
+
+    def get_udp_video_address(self) -> str:
+        return f"udp://@{self.VS_UDP_IP}:{self.vs_udp_port}"
+
+    #Lector propio (PyAV) que decodifica en su hilo hacia un anillo de frames (tello_frames)
+    def get_frame_read(self, slots: int = 4):
+        if self.background_frame_read is None:
+            from TelloLink.modules.tello_frames import FrameReader
+            self.background_frame_read = FrameReader(self.get_udp_video_address(), slots).start()
+        return self.background_frame_read
+
+    def end(self) -> None:
+        try:
+            if self.stream_on:
+                self.streamoff()
+        except Exception:
+            pass
+        self._hub.detach(self.address[0], self._dispatch_state)
+        self.channel.close()
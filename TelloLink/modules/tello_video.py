@@ -1,6 +1,10 @@
-import threading, time
+import threading, time, os
+from datetime import datetime
+from collections import deque
+import json
+from TelloLink.modules.tello_history import pose_at
 
-_LOOP_SLEEP = 0.001  # baja carga CPU
+_FRAME_WAIT_S = 0.1  # Espera máxima de un frame nuevo antes de volver a mirar si hay que parar
 
 def _need_cv2(): #Función para hacer el import de OpenCV, librería necesaria para trabajar con vídeo e imagen en Pyhton
     try:
@@ -25,67 +29,357 @@ def _ensure_stream(self):   #Función para preparar el stream si no está ya act
     self._tello.streamoff(); time.sleep(0.2) #Se reinicia el stream de vídeo, y crea el stream reader.
     self._tello.streamon();  time.sleep(0.3)
     self._frame_reader = self._tello.get_frame_read()
+    self.frames = self._frame_reader.ring
 
-def _video_loop(self, window_name, resize):  #Esta función consiste en el bucle que mantiene la ventana de vídeo en la pantalla
-    import cv2
-    while getattr(self, "_video_run", False): #Mientras el vídeo este corriendo
-        fr = getattr(self, "_frame_reader", None) #Busca si hay un frame reader
-        frame = None if fr is None else fr.frame #Si existe toma el último frame de su buffer, si no existe o no hay frame aún, = None
-        if frame is None: #Si áun no hay frame (aún no ha llegado vídeo)
-            time.sleep(_LOOP_SLEEP) #Hace una pausa muy corta y vuelve al bucle
-            continue
-
-        bgr = _convert_for_cv2(self, frame) #Convierte el frame RGB a BGR, para que no se vea azul
-        if resize: #Si se ha pedido un tamaño concreto de ventana, se redimensiona, si por algún motivo falla, se ignora y sigue
-            w, h = resize
+#Pipeline de vídeo. El lector (FrameReader) decodifica en su propio hilo y deja siempre el último frame en el
+#anillo; un hilo repartidor espera cada frame nuevo y lo ofrece a cada etapa (mostrar, grabar, analizar...).
+#Cada etapa tiene su hilo, su cola acotada y su política de descarte: una etapa lenta solo se pierde frames
+#ella misma, y ni el decodificador ni las demás etapas acumulan retraso
+_DROP_OLDEST = "oldest"   #Cola llena: se tira el más viejo (siempre se procesa lo más reciente, vídeo en vivo)
+_DROP_NEWEST = "newest"   #Cola llena: se tira el que llega (lo ya encolado no se pierde)
+
+
+class VideoStage:
+
+    #maxsize: frames que puede tener en cola. copy: la etapa recibe una copia del frame en vez de la vista del
+    #anillo (necesario si guarda frames más tiempo del que tarda el anillo en dar la vuelta)
+    def __init__(self, name, fn, maxsize=1, drop=_DROP_OLDEST, copy=False, on_stop=None):
+        if drop not in (_DROP_OLDEST, _DROP_NEWEST):
+            raise ValueError(f"drop={drop!r}: debe ser 'oldest' o 'newest'")
+        self.name = name
+        self.fn = fn
+        self.maxsize = max(1, int(maxsize))
+        self.drop = drop
+        self.copy = bool(copy)
+        self.on_stop = on_stop
+        self.processed = 0
+        self.dropped = 0
+        self.latency_s = 0.0      # Media móvil de captura -> fin de la etapa
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._run = False
+        self._drain = False
+        self._thread = None
+
+    def start(self):
+        self._run = True
+        self._thread = threading.Thread(target=self._loop, daemon=True, name=f"video-{self.name}")
+        self._thread.start()
+        return self
+
+    #drain: antes de parar se procesa lo que quede en la cola (p.ej. para no perder el final de una grabación)
+    def stop(self, timeout=2.0, drain=False):
+        with self._cond:
+            self._run = False
+            self._drain = drain
+            self._cond.notify_all()
+        t = self._thread
+        if t is not None and t is not threading.current_thread():
+            t.join(timeout=timeout)
+        self._thread = None
+
+    #Lo llama el repartidor: nunca bloquea
+    def offer(self, frame):
+        with self._cond:
+            if len(self._queue) >= self.maxsize:
+                self.dropped += 1
+                if self.drop == _DROP_NEWEST:
+                    return
+                self._queue.popleft()
+            self._queue.append(frame)
+            self._cond.notify()
+
+    def _loop(self):
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._queue or not self._run)
+                    if not self._run and not (self._drain and self._queue):
+                        break
+                    f = self._queue.popleft()
+                try:
+                    self.fn(f)
+                except Exception as e:
+                    print(f"[video] Error en la etapa '{self.name}': {e}")
+                self.processed += 1
+                self.latency_s += 0.1 * ((time.monotonic() - f.ts) - self.latency_s)
+        finally:
+            if self.on_stop is not None:
+                try:
+                    self.on_stop()
+                except Exception:
+                    pass
+
+
+class VideoPipeline:
+
+    #tagger(ts): si se da, cada frame se reparte con su pose en el instante de captura (Frame.pose)
+    def __init__(self, ring, tagger=None):
+        self.ring = ring
+        self.tagger = tagger
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._run = False
+        self._thread = None
+
+    def start(self):
+        if self._run:
+            return self
+        self._run = True
+        self._thread = threading.Thread(target=self._dispatch, daemon=True, name="video-dispatch")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._run = False
+        t = self._thread
+        if t is not None:
+            t.join(timeout=2.0)
+        self._thread = None
+        for name in list(self.stages):
+            self.remove_stage(name)
+
+    def add_stage(self, name, fn, maxsize=1, drop=_DROP_OLDEST, copy=False, on_stop=None) -> VideoStage:
+        stage = VideoStage(name, fn, maxsize, drop, copy, on_stop)
+        with self._lock:
+            old = self.stages.get(name)
+            self.stages = {**self.stages, name: stage}   # Copia al escribir: el repartidor la recorre sin lock
+        if old is not None:
+            old.stop()
+        return stage.start()
+
+    def remove_stage(self, name, drain=False):
+        with self._lock:
+            stages = dict(self.stages)
+            stage = stages.pop(name, None)
+            self.stages = stages
+        if stage is not None:
+            stage.stop(timeout=None if drain else 2.0, drain=drain)   # Vaciando, se espera a que termine
+
+    #Contadores por etapa: procesados, descartados y latencia media (ms) desde la captura
+    def stats(self):
+        return {n: {"processed": s.processed, "dropped": s.dropped, "latency_ms": round(1000 * s.latency_s, 1)}
+                for n, s in self.stages.items()}
+
+    def _dispatch(self):
+        seq = self.ring.last_seq
+        while self._run:
+            f = self.ring.wait_next(seq, _FRAME_WAIT_S)
+            if f is None:
+                continue
+            seq = f.seq
+            if self.tagger is not None:
+                try:
+                    f = f._replace(pose=self.tagger(f.ts))
+                except Exception as e:
+                    print(f"[video] No se pudo etiquetar el frame {f.seq}: {e}")
+            copia = None
+            for stage in self.stages.values():
+                if stage.copy:
+                    if copia is None:
+                        copia = f._replace(image=f.image.copy())
+                    stage.offer(copia)
+                else:
+                    stage.offer(f)
+
+
+#Arranca (o devuelve) el pipeline de vídeo del dron, encendiendo el stream si hace falta
+def start_video_pipeline(self):
+    self._require_connected()
+    _ensure_stream(self)
+    pipe = getattr(self, "video_pipeline", None)
+    if pipe is None or pipe.ring is not self.frames:
+        if pipe is not None:
+            pipe.stop()
+        pipe = VideoPipeline(self.frames, tagger=lambda ts: pose_at(self, ts))
+        self.video_pipeline = pipe
+    return pipe.start()
+
+
+def stop_video_pipeline(self):
+    stop_recording(self)
+    pipe = getattr(self, "video_pipeline", None)
+    if pipe is not None:
+        pipe.stop()
+    self.video_pipeline = None
+    return True
+
+
+#Grabación de vídeo en segundo plano. Es una etapa del pipeline: su hilo es el del codificador y su cola acotada
+#(descarta el frame que llega si el disco o el códec se atascan) separa la grabación de la vista en directo.
+#El fichero es de frecuencia constante: cada frame va a la posición que le toca por su marca de captura, así que
+#si llega antes de tiempo se descarta y si hay un hueco se repite el anterior, y el vídeo dura lo que duró el vuelo
+#Con poses=True se escribe al lado '<vídeo>.jsonl': una línea por frame del fichero con la pose en su captura
+_REC_QUEUE_FRAMES = 64
+
+
+class VideoRecorder:
+
+    def __init__(self, path, fps=30, codec="mp4v", size=None, poses=True):
+        self.path = path
+        self.poses_path = os.path.splitext(path)[0] + ".jsonl" if poses else None
+        self.fps = float(fps)
+        self.codec = codec
+        self.size = size            # (ancho, alto) de salida; None = el de la cámara
+        self.written = 0
+        self.duplicated = 0
+        self.late = 0               # Frames descartados por llegar antes de su hueco
+        self.stage = None           # VideoStage que lo alimenta (sus descartes son los de la cola)
+        self.error = None           # Error al abrir el fichero (se deja de intentar)
+        self._writer = None
+        self._poses = None
+        self._t0 = None
+        self._next = 0
+        self._last = None
+
+    @property
+    def dropped(self):
+        return self.late + (self.stage.dropped if self.stage is not None else 0)
+
+    def stats(self):
+        return {"written": self.written, "dropped": self.dropped, "duplicated": self.duplicated}
+
+    def _open(self, shape):
+        import cv2
+        if self.size is None:
+            self.size = (shape[1], shape[0])
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.codec), self.fps, self.size)
+        if not self._writer.isOpened():
+            self._writer = None
+            raise RuntimeError(f"No se pudo abrir el vídeo {self.path} (códec {self.codec})")
+        if self.poses_path is not None:
+            self._poses = open(self.poses_path, "w", encoding="utf-8")
+
+    #Una línea del sidecar por cada frame escrito (los repetidos llevan la pose del frame original)
+    def _log_pose(self, n, f):
+        if self._poses is not None:
+            self._poses.write(json.dumps({"frame": n, "seq": f.seq, **(f.pose or {"ts": f.ts})}) + "\n")
+
+    #Lo llama el hilo de la etapa con cada frame (seq, ts, image RGB)
+    def write(self, f):
+        import cv2
+        if self.error is not None:
+            return
+        if self._t0 is None:
             try:
-                bgr = cv2.resize(bgr, (w, h))
-            except:
-                pass
+                self._open(f.image.shape)
+            except Exception as e:
+                self.error = e
+                raise
+            self._t0 = f.ts
+        n = int(round((f.ts - self._t0) * self.fps))   # Hueco que le toca a este frame
+        if n < self._next:
+            self.late += 1
+            return
+        bgr = cv2.cvtColor(f.image, cv2.COLOR_RGB2BGR)
+        if (bgr.shape[1], bgr.shape[0]) != tuple(self.size):
+            bgr = cv2.resize(bgr, tuple(self.size))
+        while self._next < n and self._last is not None:  # Hueco sin frames: se repite el último
+            self._writer.write(self._last[0])
+            self._log_pose(self._next, self._last[1])
+            self.duplicated += 1
+            self._next += 1
+        self._writer.write(bgr)
+        self._log_pose(n, f)
+        self.written += 1
+        self._next = n + 1
+        self._last = (bgr, f)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+        if self._poses is not None:
+            self._poses.close()
+            self._poses = None
+
+
+def start_recording(self, path=None, fps=30, codec="mp4v", size=None, queue_frames=_REC_QUEUE_FRAMES,
+                          poses=True):
+    _need_cv2()
+    stop_recording(self)
+    if path is None:
+        out_dir = os.path.join(".", "videos")
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, f"tello_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4")
+    pipe = start_video_pipeline(self)
+    rec = VideoRecorder(path, fps, codec, size, poses)
+    # copy=True: la cola puede guardar más frames de los que caben en el anillo
+    rec.stage = pipe.add_stage("record", rec.write, maxsize=queue_frames, drop=_DROP_NEWEST,
+                               copy=True, on_stop=rec.close)
+    self._video_recorder = rec
+    print(f"[video] Grabando vídeo en {path} ({rec.fps:g} fps, {codec})")
+    return rec
+
+
+#Para la grabación terminando de escribir los frames que queden en cola. Devuelve la ruta del vídeo
+def stop_recording(self):
+    rec = getattr(self, "_video_recorder", None)
+    if rec is None:
+        return None
+    self._video_recorder = None
+    pipe = getattr(self, "video_pipeline", None)
+    if pipe is not None:
+        pipe.remove_stage("record", drain=True)   # El hilo de la etapa cierra el fichero al terminar (on_stop)
+    print(f"[video] {rec.written} frames escritos en {rec.path} "
+          f"({rec.dropped} descartados, {rec.duplicated} duplicados)")
+    return rec.path
+
 
+#Etapa de visualización de start_video: muestra cada frame en una ventana de OpenCV (desde el hilo de la etapa)
+def _show_frame(self, f, window_name, resize):
+    import cv2
+    if not getattr(self, "_video_run", False):
+        return
+    bgr = _convert_for_cv2(self, f.image) #Convierte el frame RGB a BGR, para que no se vea azul
+    if resize: #Si se ha pedido un tamaño concreto de ventana, se redimensiona, si por algún motivo falla, se ignora y sigue
+        w, h = resize
         try:
-            cv2.imshow(window_name, bgr) #Se muestra el vídeo en una ventana
-            if cv2.waitKey(1) & 0xFF == ord('q'): #Si después de 1 ms, se pulsa q, se desactiva _video_run y sale del bucle (se cierra la ventana)
-                self._video_run = False
-                break
-        except: #Si algo falla previamente en el imshow, se ignora el error
+            bgr = cv2.resize(bgr, (w, h))
+        except Exception:
             pass
-        time.sleep(_LOOP_SLEEP)
 
-    #Al salir del bucle de vídeo, se intentan cerrar primero esa ventana, y si falla, se cierran todas
+    cv2.imshow(window_name, bgr) #Se muestra el vídeo en una ventana
+    if cv2.waitKey(1) & 0xFF == ord('q'): #Si después de 1 ms, se pulsa q, se desactiva _video_run y se quita la etapa
+        self._video_run = False
+        pipe = getattr(self, "video_pipeline", None)
+        if pipe is not None:
+            pipe.remove_stage("display")
+
+
+#Al quitar la etapa, se intentan cerrar primero esa ventana, y si falla, se cierran todas
+def _close_window(window_name):
     try:
         import cv2
         cv2.destroyWindow(window_name)
-    except:
+    except Exception:
         try:
             import cv2
             cv2.destroyAllWindows()
-        except:
+        except Exception:
             pass
 
+
 def start_video(self, resize=None, window_name="Tello FPV"):
     _need_cv2()
     self._require_connected()
     if getattr(self, "_video_run", False): #Si ya hay un vídeo corriendo, no arranca otro
         return True
-    _ensure_stream(self) #Se asegura de que el stream de camara esté preparado
+    pipe = start_video_pipeline(self) #Se asegura de que el stream de camara y el pipeline estén preparados
     self._video_run = True
-    self._video_thread = threading.Thread(
-        target=_video_loop, args=(self, window_name, resize), daemon=True
-    )
-    self._video_thread.start()
+    pipe.add_stage("display", lambda f: _show_frame(self, f, window_name, resize),
+                   maxsize=1, drop=_DROP_OLDEST, on_stop=lambda: _close_window(window_name))
     return True
 
 def stop_video(self):
 
     self._video_run = False
-    th = getattr(self, "_video_thread", None)
-    if th and th.is_alive():
-        try:
-            th.join(timeout=2.0)
-        except:
-            pass
-    self._video_thread = None
+    pipe = getattr(self, "video_pipeline", None)
+    if pipe is not None:
+        pipe.remove_stage("display")
     return True
 
 
@@ -107,15 +401,18 @@ def show_video_blocking(self, resize=None, window_name="Tello FPV"):
         pass
 
     try:
+        seq = 0
         while True:
-            fr = getattr(self, "_frame_reader", None)
-            frame = None if fr is None else fr.frame
-            if frame is None:
+            # Se espera poco al frame nuevo: waitKey tiene que seguir llamándose para que la ventana responda
+            ring = getattr(self, "frames", None)
+            f = None if ring is None else ring.wait_next(seq, 0.03)
+            if f is None:
                 if cv2.waitKey(1) & 0xFF == ord('q'):
                     break
                 continue
+            seq = f.seq
 
-            bgr = _convert_for_cv2(self, frame)
+            bgr = _convert_for_cv2(self, f.image)
             if resize:
                 w, h = resize
                 try:
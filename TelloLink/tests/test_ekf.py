@@ -0,0 +1,38 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_sim import TelloSimulator
+import time
+
+
+def main():
+    print("Test del EKF de pose contra el simulador local")
+
+    sim = TelloSimulator(latency_s=0.02, jitter_s=0.01).start()
+    dron = TelloDron()
+    try:
+        if not dron.connect(host="127.0.0.1"):
+            print("[ERROR] No se pudo conectar al simulador")
+            return
+        dron.startTelemetry()
+        time.sleep(0.5)
+        ekf = dron.enable_ekf()
+
+        dron.takeOff(0.5, blocking=True)
+        time.sleep(0.5)
+
+        # Un goto en rc (solo velocidades medidas) y otro por pasos (movimientos confirmados)
+        for desc, dx, dy, dz, mode in [("rc ida", 150, 120, 20, "rc"), ("step vuelta", -150, -120, -20, "step")]:
+            print(f"\n--> {desc}")
+            dron.goto_rel(dx_cm=dx, dy_cm=dy, dz_cm=dz, blocking=True, mode=mode)
+            print(f"Pose EKF: {dron.pose}  sigma_xy={ekf.sigma_xy_cm:.1f} cm, sigma_z={ekf.sigma_z_cm:.1f} cm")
+            print(f"Pose simulada: x={sim.kin.x:.1f}, y={sim.kin.y:.1f}, z={sim.kin.z:.1f}")
+
+        dron.Land(blocking=True)
+    finally:
+        dron.stopTelemetry()
+        dron.disconnect()
+        sim.stop()
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_sim import TelloSimulator
+from TelloLink.modules.tello_events import StateEvent, HeightEvent, BatteryEvent, PoseEvent, TelemetryEvent
+import asyncio
+import threading
+import time
+
+
+def main():
+    print("Test del bus de eventos contra el simulador local")
+
+    sim = TelloSimulator(latency_s=0.02, jitter_s=0.01).start()
+    dron = TelloDron()
+    cuenta = {}
+    estados = []
+    poses = []
+
+    def contar(ev):
+        cuenta[type(ev).__name__] = cuenta.get(type(ev).__name__, 0) + 1
+
+    dron.events.subscribe(TelemetryEvent, contar)
+    dron.events.subscribe(HeightEvent, contar)
+    dron.events.subscribe(BatteryEvent, contar)
+    dron.events.subscribe(StateEvent, lambda ev: estados.append(f"{ev.prev} -> {ev.state}"))
+    dron.events.subscribe(PoseEvent, lambda ev: ev.source != "telemetry" and poses.append(ev))
+
+    # Un suscriptor que usa la API bloqueante (como un Land() al bajar la batería): corre en el hilo del bus,
+    # no en el bucle de telemetría, así que el comando puede esperar su respuesta
+    respuestas = []
+
+    def al_volar(ev):
+        if ev.state == "flying" and not respuestas:
+            respuestas.append(dron._send("battery?"))
+    dron.events.subscribe(StateEvent, al_volar)
+
+    # Iterador asíncrono en otro hilo: recoge las primeras poses publicadas por movimientos
+    async def consumidor(out):
+        async for ev in dron.events.stream(PoseEvent):
+            if ev.source == "move":
+                out.append(ev)
+                if len(out) >= 2:
+                    break
+    recibidas = []
+    hilo = threading.Thread(target=lambda: asyncio.run(consumidor(recibidas)), daemon=True)
+    hilo.start()
+
+    try:
+        if not dron.connect(host="127.0.0.1"):
+            print("[ERROR] No se pudo conectar al simulador")
+            return
+        dron.startTelemetry()
+
+        t0 = time.monotonic()
+        dron.takeOff(0.5, blocking=True)
+        print(f"Despegue en {time.monotonic() - t0:.2f} s")
+        dron.forward(50)
+        dron.right(50)
+
+        alto = dron.events.wait_for(HeightEvent, lambda ev: ev.height_cm >= 90, timeout=0.5)
+        print(f"wait_for(altura >= 90): {'llegó' if alto else 'timeout (esperado)'}")
+
+        t0 = time.monotonic()
+        dron.Land(blocking=True)
+        print(f"Aterrizaje en {time.monotonic() - t0:.2f} s")
+        hilo.join(2.0)
+
+        print(f"Eventos: {cuenta}")
+        print(f"Estados: {estados}")
+        print(f"Poses por movimientos: {[(p.source, round(p.x_cm), round(p.y_cm)) for p in poses]}")
+        print(f"Poses por el iterador asíncrono: {[(round(p.x_cm), round(p.y_cm)) for p in recibidas]}")
+        print(f"Comando enviado desde un suscriptor: battery? -> {respuestas}")
+    finally:
+        dron.stopTelemetry()
+        dron.disconnect()
+        sim.stop()
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
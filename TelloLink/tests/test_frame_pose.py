@@ -0,0 +1,76 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_sim import TelloSimulator
+import json
+import os
+import tempfile
+import time
+
+
+def main():
+    print("Test del etiquetado de frames con la pose (simulador local, necesita PyAV y OpenCV)")
+
+    sim = TelloSimulator(latency_s=0.02, video=True).start()
+    dron = TelloDron()
+    out = os.path.join(tempfile.gettempdir(), "tello_test_pose")
+    os.makedirs(out, exist_ok=True)
+    for nombre in os.listdir(out):
+        os.remove(os.path.join(out, nombre))
+    try:
+        if not dron.connect(host="127.0.0.1"):
+            print("[ERROR] No se pudo conectar al simulador")
+            return
+        dron.startTelemetry()
+        pipe = dron.start_video_pipeline()
+        if dron.wait_frame(0, timeout=10.0) is None:
+            print("[ERROR] No llegó ningún frame")
+            return
+        dron.takeOff(0.5, blocking=True)
+        time.sleep(0.5)
+
+        # Cada frame del pipeline llega con su pose
+        etiquetados = []
+        pipe.add_stage("poses", lambda f: etiquetados.append(f.pose))
+
+        rec = dron.start_recording(os.path.join(out, "vuelo.mp4"), fps=30)
+        dron.snapshot(os.path.join(out, "inicio.jpg"))
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < 2.0:   # Adelante a ~100 cm/s girando
+            dron.rc(0, 50, 0, 30)
+            time.sleep(0.05)
+        dron.rc(0, 0, 0, 0)
+        rafaga = dron.snapshot_burst(4, os.path.join(out, "rafaga.jpg")).result(timeout=5)
+        dron.stop_recording()
+        pipe.remove_stage("poses")
+
+        con_pose = [p for p in etiquetados if p is not None and p["dt_ms"] is not None]
+        print(f"Frames del pipeline con pose del historial: {len(con_pose)} de {len(etiquetados)}, "
+              f"distancia máxima a un paquete {max(p['dt_ms'] for p in con_pose):.0f} ms")
+
+        with open(os.path.join(out, "poses.jsonl"), encoding="utf-8") as f:
+            fotos = [json.loads(line) for line in f]
+        print(f"poses.jsonl: {len(fotos)} fotos ({len(rafaga)} de la ráfaga)")
+        for p in fotos[:2]:
+            print(f"  {p['file']}: x={p['x_cm']} y={p['y_cm']} z={p['z_cm']} yaw={p['yaw_deg']} "
+                  f"altura={p['height_cm']} (a {p['dt_ms']} ms del paquete)")
+
+        with open(rec.poses_path, encoding="utf-8") as f:
+            lineas = [json.loads(line) for line in f]
+        seguidos = all(b["frame"] == a["frame"] + 1 for a, b in zip(lineas, lineas[1:]))
+        print(f"{os.path.basename(rec.poses_path)}: {len(lineas)} líneas para {rec.written + rec.duplicated} frames "
+              f"del vídeo, numeradas sin huecos: {seguidos}")
+        print(f"  primer frame x={lineas[0]['x_cm']} yaw={lineas[0]['yaw_deg']}  ->  "
+              f"último x={lineas[-1]['x_cm']} yaw={lineas[-1]['yaw_deg']}")
+        print(f"Pose al terminar: {dron.pose}")
+
+        dron.Land(blocking=True)
+        dron.stop_video_pipeline()
+        dron.stream_off()
+    finally:
+        dron.stopTelemetry()
+        dron.disconnect()
+        sim.stop()
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
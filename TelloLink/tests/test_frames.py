@@ -0,0 +1,55 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_sim import TelloSimulator
+from TelloLink.modules.tello_frames import FrameRing
+import numpy as np
+import time
+
+
+def main():
+    print("Test del anillo de frames de vídeo contra el simulador local (necesita PyAV)")
+
+    sim = TelloSimulator(latency_s=0.02, video=True).start()
+    dron = TelloDron()
+    try:
+        if not dron.connect(host="127.0.0.1"):
+            print("[ERROR] No se pudo conectar al simulador")
+            return
+        dron.stream_on()
+
+        primero = dron.wait_frame(0, timeout=10.0)
+        if primero is None:
+            print("[ERROR] No llegó ningún frame")
+            return
+        print(f"Primer frame: seq={primero.seq}, {primero.image.shape}, solo lectura={not primero.image.flags.writeable}")
+
+        # Consumidor que se bloquea hasta cada frame nuevo: ni repite frames ni gasta CPU esperando
+        seq, recibidos, saltados = primero.seq, 0, 0
+        t0, cpu0 = time.monotonic(), time.process_time()
+        while time.monotonic() - t0 < 3.0:
+            f = dron.wait_frame(seq, timeout=1.0)
+            if f is None:
+                continue
+            saltados += f.seq - seq - 1
+            seq = f.seq
+            recibidos += 1
+        dt, cpu = time.monotonic() - t0, time.process_time() - cpu0
+        print(f"Frames: {recibidos / dt:.1f} fps, saltados {saltados}, "
+              f"CPU del proceso (incluida la decodificación) {100 * cpu / dt:.0f}%")
+        print(f"Frame {primero.seq} aún válido tras {seq - primero.seq} más: {dron.frames.valid(primero.seq)}")
+
+        dron.stream_off()
+
+        # Cambio de resolución: los frames anteriores dejan de ser válidos (sus huecos se han reservado de nuevo)
+        ring = FrameRing(4)
+        viejo = ring.publish(np.zeros((2, 2, 3), np.uint8))
+        nuevo = ring.publish(np.ones((4, 4, 3), np.uint8))
+        print(f"Tras cambiar de resolución: frame viejo válido={ring.valid(viejo)}, get={ring.get(viejo)}, "
+              f"nuevo {ring.get(nuevo).image.shape}")
+    finally:
+        dron.disconnect()
+        sim.stop()
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
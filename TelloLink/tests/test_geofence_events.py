@@ -0,0 +1,52 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_sim import TelloSimulator
+from TelloLink.modules.tello_events import PoseEvent
+import time
+
+
+def main():
+    print("Test del geofence por eventos de pose contra el simulador local")
+
+    sim = TelloSimulator(latency_s=0.02, jitter_s=0.01).start()
+    dron = TelloDron()
+    try:
+        if not dron.connect(host="127.0.0.1"):
+            print("[ERROR] No se pudo conectar al simulador")
+            return
+        dron.startTelemetry()
+        dron.takeOff(0.5, blocking=True)
+
+        # Caja de 100 cm (±50 en x): volando hacia delante con rc hay que cortar nada más pasar x = 50
+        dron.set_geofence(max_x_cm=100, max_y_cm=200, max_z_cm=200, confirm_s=0.08)
+        cruce = []
+        unsub = dron.events.subscribe_sync(PoseEvent, lambda ev: not cruce and ev.x_cm > 50 and cruce.append(ev.ts))
+        # Un suscriptor lento en la cola del bus no debe retrasar el monitor, que va en el hilo que publica
+        lento = dron.events.subscribe(PoseEvent, lambda ev: time.sleep(1.0))
+
+        dron._goto_abort = False
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < 5.0 and not dron._goto_abort:
+            dron.rc(0, 40, 0, 0)
+            time.sleep(0.05)
+        t_abort = time.monotonic()
+        dron.rc(0, 0, 0, 0)
+        unsub()
+        lento()
+
+        if cruce and dron._goto_abort:
+            print(f"Violación detectada {1000 * (t_abort - cruce[0]):.0f} ms después de cruzar x=50 "
+                  f"(pose x={dron.pose.x_cm:.0f} cm, sim x={sim.kin.x:.0f} cm)")
+        else:
+            print("[ERROR] No se detectó la salida de la caja")
+
+        dron.disable_geofence()
+        dron.Land(blocking=True)
+    finally:
+        dron.stopTelemetry()
+        dron.disconnect()
+        sim.stop()
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
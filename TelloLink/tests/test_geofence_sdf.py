@@ -0,0 +1,66 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_geofence import _inside_inclusion, _inside_any_exclusion, _gf_violated, tiempo_hasta_impacto
+import math
+import random
+import time
+
+
+def main():
+    print("Test del campo de distancias del geofence (sin dron): SDF frente a las consultas exactas")
+
+    dron = TelloDron(id="sdf")
+    dron.set_geofence(max_x_cm=600, max_y_cm=600, max_z_cm=200, sdf_cell_cm=2)
+    dron.add_exclusion_circle(100, 50, 40)
+    dron.add_exclusion_circle(-100, -50, 30, z_min_cm=50, z_max_cm=150)
+    dron.add_exclusion_poly([(0, 0), (100, -200), (200, -200), (200, -100), (120, -150), (50, 20)])
+    field = dron._gf_sdf
+
+    random.seed(1)
+    distintos = 0
+    for _ in range(20000):
+        x, y, z = random.uniform(-320, 320), random.uniform(-320, 320), random.uniform(-10, 220)
+        exacto = (not _inside_inclusion(dron, x, y, z)) or _inside_any_exclusion(dron, x, y, z)
+        d = field.distance(x, y, z)
+        if d is not None and (d < 0) != exacto and abs(d) > field.cell:
+            distintos += 1
+    print(f"Puntos mal clasificados a más de una celda del borde: {distintos}")
+
+    optimista = 0
+    for _ in range(2000):
+        x, y, z = random.uniform(-280, 280), random.uniform(-280, 280), random.uniform(20, 180)
+        if _inside_any_exclusion(dron, x, y, z):
+            continue
+        a = random.uniform(0, 2 * math.pi)
+        v = (100 * math.cos(a), 100 * math.sin(a), random.uniform(-30, 30))
+        t_exacto = tiempo_hasta_impacto(x, y, z, *v, dron._gf_limits, dron._gf_center,
+                                        dron._gf_excl_circles, dron._gf_excl_polys)
+        t_sdf = field.time_to_impact(x, y, z, *v)
+        # El sphere tracing puede ser conservador (rozando un borde), nunca optimista
+        if t_sdf is not None and t_sdf > t_exacto + 0.05:
+            optimista += 1
+    print(f"Rayos en los que el SDF promete más tiempo que el cálculo exacto: {optimista}")
+
+    t0 = time.perf_counter()
+    for _ in range(5000):
+        dron.aplicar_geofence_rc(0, 80, 0, 0)
+    print(f"aplicar_geofence_rc con SDF: {(time.perf_counter() - t0) / 5000 * 1e6:.0f} µs por llamada")
+
+    t0 = time.perf_counter()
+    dron.add_exclusion_circle(-200, 200, 20)
+    print(f"Añadir un círculo (incremental, sobre una copia): {(time.perf_counter() - t0) * 1000:.1f} ms")
+    print(f"  El campo anterior no ha cambiado: {field.distance(-200, 200, 100) > 0}, "
+          f"el nuevo ve el círculo: {dron._gf_sdf.distance(-200, 200, 100) < 0}")
+
+    # La reconstrucción se hace al recentrar (en este hilo); las consultas posteriores solo leen la rejilla
+    dron.pose.x_cm = 50.0
+    t0 = time.perf_counter()
+    dron.recenter_geofence()
+    t_rec = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    _gf_violated(dron, 0, 0, 100)
+    print(f"recenter_geofence: {t_rec:.0f} ms; primera consulta después: {(time.perf_counter() - t0) * 1e6:.0f} µs")
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_sim import TelloSimulator
+import time
+
+
+#Vuela con rc hacia delante pasando por aplicar_geofence_rc y devuelve (x máxima, rapidez media)
+def _volar_rc(dron, sim, fb, lr=0, segundos=4.0):
+    t0 = time.monotonic()
+    x_max = sim.kin.x
+    x0 = sim.kin.x
+    while time.monotonic() - t0 < segundos:
+        lr_gf, fb_gf, ud_gf, yaw_gf = dron.aplicar_geofence_rc(lr, fb, 0, 0)
+        dron.rc(int(lr_gf), int(fb_gf), int(ud_gf), int(yaw_gf))
+        x_max = max(x_max, sim.kin.x)
+        time.sleep(0.05)
+    dron.rc(0, 0, 0, 0)
+    return x_max, (x_max - x0) / segundos
+
+
+def main():
+    print("Test del geofence predictivo (tiempo hasta impacto) contra el simulador local")
+
+    sim = TelloSimulator(latency_s=0.02, jitter_s=0.01).start()
+    dron = TelloDron()
+    try:
+        if not dron.connect(host="127.0.0.1"):
+            print("[ERROR] No se pudo conectar al simulador")
+            return
+        dron.startTelemetry()
+        dron.takeOff(0.5, blocking=True)
+
+        # Caja de 600 cm: límite en x = 300. A rc 100 hay que frenar a tiempo y quedarse antes del borde
+        dron.set_geofence(max_x_cm=600, max_y_cm=600, max_z_cm=200)
+        x_max, _ = _volar_rc(dron, sim, 100)
+        print(f"Límite x=300: x máxima {x_max:.0f} cm ({'ok' if x_max < 300 else 'SE HA SALIDO'})")
+
+        # Círculo desplazado del eje de vuelo: no debe frenar al pasar a su lado
+        dron.goto_rel(-250, 0, 0)
+        dron.add_exclusion_circle(dron.pose.x_cm + 80, 60, 30)
+        x_max, rapidez = _volar_rc(dron, sim, 60, segundos=1.5)
+        print(f"Pasando junto a un círculo: avance medio {rapidez:.0f} cm/s (rc 60 ≈ 126 cm/s)")
+
+        dron.disable_geofence()
+        dron.Land(blocking=True)
+    finally:
+        dron.stopTelemetry()
+        dron.disconnect()
+        sim.stop()
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_sim import TelloSimulator
+import time
+
+
+def main():
+    print("Test goto_rel en modo rc contra el simulador local")
+
+    sim = TelloSimulator(latency_s=0.02, jitter_s=0.01).start()
+    dron = TelloDron()
+    try:
+        if not dron.connect(host="127.0.0.1"):
+            print("[ERROR] No se pudo conectar al simulador")
+            return
+        dron.startTelemetry()
+        time.sleep(0.5)
+
+        dron.takeOff(0.5, blocking=True)
+        time.sleep(0.5)
+
+        # Diagonal de ~2 m con subida, ida y vuelta
+        sequence = [
+            ("Diagonal ida",    150,  120,  20),
+            ("Diagonal vuelta", -150, -120, -20),
+        ]
+        for desc, dx, dy, dz in sequence:
+            print(f"\n--> {desc}")
+            t0 = time.time()
+            dron.goto_rel(dx_cm=dx, dy_cm=dy, dz_cm=dz, blocking=True, mode="rc")
+            print(f"[OK] {desc} en {time.time() - t0:.2f}s")
+            print(f"Pose virtual: {dron.pose}")
+            print(f"Pose simulada: x={sim.kin.x:.1f}, y={sim.kin.y:.1f}, z={sim.kin.z:.1f}")
+
+        dron.Land(blocking=True)
+    finally:
+        dron.stopTelemetry()
+        dron.disconnect()
+        sim.stop()
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_sim import TelloSimulator
+import time
+
+
+def main():
+    print("Test del historial de telemetría contra el simulador local")
+
+    sim = TelloSimulator(latency_s=0.02, jitter_s=0.01).start()
+    dron = TelloDron()
+    try:
+        if not dron.connect(host="127.0.0.1"):
+            print("[ERROR] No se pudo conectar al simulador")
+            return
+        dron.startTelemetry(history_len=600)
+        time.sleep(0.5)
+
+        dron.takeOff(0.5, blocking=True)
+        dron.forward(100)
+        dron.up(40)
+        time.sleep(1.0)
+
+        hist = dron.history
+        print(f"Registros: {len(hist)} (capacidad {hist.capacity})")
+        ultimos = hist.last_seconds(5.0)
+        print(f"Últimos 5 s: {len(ultimos)} registros, velocidad media {hist.mean_speed(ultimos):.1f} cm/s")
+        print(f"Altura máxima: {hist.max_height():.0f} cm")
+        print(f"Distancia XY: {hist.distance_xy():.0f} cm")
+        print(f"Pendiente de batería: {hist.battery_slope():.4f} %/s")
+
+        dron.Land(blocking=True)
+    finally:
+        dron.stopTelemetry()
+        dron.disconnect()
+        sim.stop()
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
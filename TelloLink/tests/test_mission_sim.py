@@ -0,0 +1,49 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_sim import TelloSimulator
+import time
+
+
+def main():
+    print("Test de misión con go/curve contra el simulador local")
+
+    sim = TelloSimulator(latency_s=0.02, jitter_s=0.01).start()
+    dron = TelloDron()
+    try:
+        if not dron.connect(host="127.0.0.1"):
+            print("[ERROR] No se pudo conectar al simulador")
+            return
+        dron.startTelemetry()
+        time.sleep(0.5)
+
+        dron.takeOff(0.5, blocking=True)
+        time.sleep(0.5)
+
+        # WP1 y WP2 se vuelan con un solo "curve"; WP3 (con espera) y WP4 con "go"
+        waypoints = [
+            {"x": 200, "y": 0,   "z": 100},
+            {"x": 300, "y": 100, "z": 100},
+            {"x": 100, "y": 200, "z": 120, "delay": 0.5},
+            {"x": 0,   "y": 0,   "z": 100},
+        ]
+        for curves in (True, False):
+            print(f"\n--> Misión con curves={curves}")
+            t0 = time.time()
+            # on_wp se llama al salir hacia cada waypoint: la pose en ese momento es la de partida del tramo
+            avisos = []
+            dron.run_mission(waypoints, do_land=False, blocking=True, curves=curves,
+                             on_wp=lambda i, wp: avisos.append((i, round(dron.pose.x_cm), round(dron.pose.y_cm))))
+            print(f"on_wp (waypoint, x, y al avisar): {avisos}")
+            print(f"[OK] Misión en {time.time() - t0:.2f}s")
+            print(f"Pose virtual: {dron.pose}")
+            print(f"Pose simulada: x={sim.kin.x:.1f}, y={sim.kin.y:.1f}, z={sim.kin.z:.1f}")
+
+        dron.Land(blocking=True)
+    finally:
+        dron.stopTelemetry()
+        dron.disconnect()
+        sim.stop()
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_sim import TelloSimulator
+import time
+
+
+def main():
+    print("Test de localización con mission pads contra el simulador local")
+
+    # Pad 1 en el punto de despegue y pad 2 a (200, 100) girado 90°
+    pads = {1: (0, 0, 0), 2: (200, 100, 90)}
+    sim = TelloSimulator(latency_s=0.02, jitter_s=0.01, pads=pads).start()
+    dron = TelloDron()
+    try:
+        if not dron.connect(host="127.0.0.1"):
+            print("[ERROR] No se pudo conectar al simulador")
+            return
+        dron.startTelemetry()
+        time.sleep(0.5)
+        dron.set_pad_map(pads)
+        dron.enable_mission_pads(0)
+
+        dron.takeOff(0.5, blocking=True)
+        time.sleep(0.5)
+
+        # Deriva artificial: la pose se corrige en cuanto se sobrevuela un pad
+        dron.pose.x_cm += 40
+        dron.pose.y_cm -= 30
+        print(f"Pose con deriva: {dron.pose}")
+
+        dron.run_mission([{"x": 200, "y": 100, "z": 80}, {"x": 0, "y": 0, "z": 80}], do_land=False, blocking=True)
+        time.sleep(0.5)
+        print(f"Pose virtual: {dron.pose}  (último pad: {dron.last_pad[0]})")
+        print(f"Pose simulada: x={sim.kin.x:.1f}, y={sim.kin.y:.1f}, z={sim.kin.z:.1f}")
+
+        dron.Land(blocking=True)
+        dron.disable_mission_pads()
+    finally:
+        dron.stopTelemetry()
+        dron.disconnect()
+        sim.stop()
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
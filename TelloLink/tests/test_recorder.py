@@ -0,0 +1,46 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_sim import TelloSimulator
+from TelloLink.modules.tello_recorder import replay_flight
+import os
+import tempfile
+import time
+
+
+def main():
+    print("Test de grabación y reproducción de un vuelo contra el simulador local")
+
+    path = os.path.join(tempfile.gettempdir(), "tellolink_test.tlrec")
+    sim = TelloSimulator(latency_s=0.02, jitter_s=0.01).start()
+    dron = TelloDron()
+    try:
+        if not dron.connect(host="127.0.0.1"):
+            print("[ERROR] No se pudo conectar al simulador")
+            return
+        dron.startTelemetry()
+        time.sleep(0.5)
+
+        dron.start_flight_recording(path)
+        dron.set_geofence(max_x_cm=800, max_y_cm=800, max_z_cm=250)
+        dron.add_exclusion_circle(150, 0, 40)
+        dron.takeOff(0.5, blocking=True)
+        dron.run_mission([{"x": 300, "y": 0, "z": 100}, {"x": 0, "y": 0, "z": 100}],
+                         do_land=False, blocking=True, curves=False)
+        dron.goto_rel(dx_cm=100, dy_cm=100, dz_cm=0, blocking=True, mode="rc")
+        dron.Land(blocking=True)
+        dron.stop_flight_recording()
+        print(f"Pose al aterrizar: {dron.pose}")
+    finally:
+        dron.stopTelemetry()
+        dron.disconnect()
+        sim.stop()
+
+    res = replay_flight(path)
+    print(f"Reproducidos {res.records} registros ({res.duration_s:.1f} s de vuelo) en {res.replay_s * 1000:.0f} ms")
+    print(f"Pose final reproducida: {res.trajectory[-1][1:]}")
+    print(f"Diferencia máxima con la pose grabada: {res.pose_max_err_cm:.3f} cm")
+    print(f"Violaciones del geofence: {len(res.violations)}, misiones: {[m[1] for m in res.missions]}")
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_sim import TelloSimulator
+import time
+
+
+def main():
+    print("Test contra el simulador local (sin dron físico)")
+
+    # Simulador con algo de latencia y pérdidas, como un enlace WiFi real
+    sim = TelloSimulator(latency_s=0.02, jitter_s=0.01, loss=0.0).start()
+    dron = TelloDron()
+    try:
+        t0 = time.time()
+        if not dron.connect(host="127.0.0.1"):
+            print("[ERROR] No se pudo conectar al simulador")
+            return
+        print(f"Conectado en {time.time() - t0:.2f}s")
+
+        dron.startTelemetry()
+        time.sleep(0.5)
+        print(f"Batería={dron.battery_pct}% | Altura={dron.height_cm} cm")
+
+        t0 = time.time()
+        dron.takeOff(0.5, blocking=True)
+        print(f"Despegue en {time.time() - t0:.2f}s, altura={dron.height_cm} cm")
+
+        t0 = time.time()
+        dron.forward(50)
+        dron.up(20)
+        dron.cw(90)
+        print(f"3 comandos en {time.time() - t0:.2f}s")
+        print(f"Pose virtual: {dron.pose}")
+        print(f"Pose simulada: x={sim.kin.x:.1f}, y={sim.kin.y:.1f}, z={sim.kin.z:.1f}, yaw={sim.kin.yaw:.1f}")
+
+        dron.Land(blocking=True)
+        print(f"Estado final: {dron.state}")
+    finally:
+        dron.stopTelemetry()
+        dron.disconnect()
+        sim.stop()
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
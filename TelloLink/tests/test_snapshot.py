@@ -0,0 +1,53 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_sim import TelloSimulator
+import os
+import tempfile
+import time
+
+
+def main():
+    print("Test de fotos en segundo plano y ráfagas contra el simulador local (necesita PyAV y OpenCV)")
+
+    sim = TelloSimulator(latency_s=0.02, video=True).start()
+    dron = TelloDron()
+    out = os.path.join(tempfile.gettempdir(), "tello_test_snap")
+    try:
+        if not dron.connect(host="127.0.0.1"):
+            print("[ERROR] No se pudo conectar al simulador")
+            return
+        dron.stream_on()
+
+        # Sin esperar a que llegue el primer frame: es el pool quien espera
+        t0 = time.perf_counter()
+        fut = dron.snapshot_async(os.path.join(out, "primera.jpg"), timeout=10.0)
+        print(f"snapshot_async sin frame aún: devuelve en {(time.perf_counter() - t0) * 1000:.1f} ms")
+        print(f"  -> {fut.result(timeout=15)}")
+
+        # Como en una misión: fotos en varios 'waypoints' seguidos, sin pararse a esperar al disco
+        t0 = time.perf_counter()
+        futs = [dron.snapshot_async(os.path.join(out, f"wp_{i}.png")) for i in range(5)]
+        print(f"5 fotos pedidas en {(time.perf_counter() - t0) * 1000:.1f} ms")
+        print(f"  -> {[os.path.basename(f.result()) for f in futs]}")
+
+        for q in (95, 30):
+            p = dron.snapshot(os.path.join(out, f"q{q}.jpg"), quality=q)
+            print(f"JPEG calidad {q}: {os.path.getsize(p) // 1024} KB")
+
+        t0 = time.perf_counter()
+        rafaga = dron.snapshot_burst(8, os.path.join(out, "rafaga.jpg"))
+        pedido = (time.perf_counter() - t0) * 1000
+        rutas = rafaga.result(timeout=5)
+        print(f"Ráfaga de {len(rutas)} frames: pedida en {pedido:.1f} ms, "
+              f"terminada en {(time.perf_counter() - t0) * 1000:.0f} ms")
+        distintos = len({open(r, "rb").read() for r in rutas})
+        print(f"  Frames distintos en la ráfaga: {distintos} de {len(rutas)}")
+
+        dron.stream_off()
+    finally:
+        dron.disconnect()
+        sim.stop()
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
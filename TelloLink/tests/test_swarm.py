@@ -0,0 +1,48 @@
+from TelloLink import TelloSwarm
+from TelloLink.modules.tello_sim import TelloSimulator
+import threading
+import time
+
+N_DRONES = 10
+
+
+def main():
+    print(f"Test de enjambre con {N_DRONES} drones simulados")
+
+    # Cada simulador escucha en su propia IP de loopback, como drones en modo estación
+    ips = [f"127.0.0.{i + 2}" for i in range(N_DRONES)]
+    sims = [TelloSimulator(host=ip, latency_s=0.02).start() for ip in ips]
+    th_before = threading.active_count()
+
+    swarm = TelloSwarm(ips)
+    try:
+        t0 = time.time()
+        res = swarm.connect()
+        print(f"Conectados {sum(res.values())}/{len(res)} en {time.time() - t0:.2f}s")
+        time.sleep(0.5)
+        print(f"Hilos nuevos en el proceso: {threading.active_count() - th_before}")
+
+        t0 = time.time()
+        print(f"Despegue sincronizado: {swarm.takeoff_all()} ({time.time() - t0:.2f}s)")
+
+        # Comandos dirigidos: cada dron a una altura distinta
+        cmds = {ip: f"up {20 + 10 * i}" for i, ip in enumerate(ips)}
+        t0 = time.time()
+        resps = swarm.command(cmds)
+        print(f"Comandos dirigidos: {list(resps.values())} ({time.time() - t0:.2f}s)")
+
+        print(f"Barrera 'forward 30': {swarm.barrier('forward 30')}")
+        time.sleep(0.3)
+        for ip, st in swarm.states().items():
+            print(f"  {ip}: {st['state']} bat={st['battery_pct']}% h={st['height_cm']} pose={st['pose']}")
+
+        print(f"Aterrizaje sincronizado: {swarm.land_all()}")
+    finally:
+        swarm.disconnect()
+        for s in sims:
+            s.stop()
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_sim import TelloSimulator
+import time
+
+
+def main():
+    print("Test del pipeline de vídeo contra el simulador local (necesita PyAV)")
+
+    sim = TelloSimulator(latency_s=0.02, video=True).start()
+    dron = TelloDron()
+    try:
+        if not dron.connect(host="127.0.0.1"):
+            print("[ERROR] No se pudo conectar al simulador")
+            return
+        pipe = dron.start_video_pipeline()
+        if dron.wait_frame(0, timeout=10.0) is None:
+            print("[ERROR] No llegó ningún frame")
+            return
+
+        # Una etapa rápida (como la vista en directo), una lenta que descarta el más viejo (análisis que se salta
+        # frames) y otra lenta que descarta el que llega pero guarda copias (grabación con cola de 8 frames)
+        pipe.add_stage("rapida", lambda f: None)
+        pipe.add_stage("analisis", lambda f: time.sleep(0.2))
+        pipe.add_stage("grabacion", lambda f: time.sleep(0.05), maxsize=8, drop="newest", copy=True)
+
+        for _ in range(3):
+            time.sleep(1.0)
+            for nombre, s in pipe.stats().items():
+                print(f"  {nombre:10s} procesados {s['processed']:4d}  descartados {s['dropped']:4d}  "
+                      f"latencia {s['latency_ms']:6.1f} ms")
+            print()
+
+        # Quitar la etapa lenta no afecta a las demás
+        pipe.remove_stage("analisis")
+        antes = pipe.stats()["rapida"]["processed"]
+        time.sleep(1.0)
+        print(f"Etapa rápida tras quitar 'analisis': {pipe.stats()['rapida']['processed'] - antes} frames en 1 s")
+
+        dron.stop_video_pipeline()
+        dron.stream_off()
+    finally:
+        dron.disconnect()
+        sim.stop()
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_sim import TelloSimulator
+import os
+import tempfile
+import time
+
+
+def main():
+    print("Test de la grabación de vídeo en segundo plano contra el simulador local (necesita PyAV y OpenCV)")
+    import cv2
+
+    sim = TelloSimulator(latency_s=0.02, video=True).start()
+    dron = TelloDron()
+    path = os.path.join(tempfile.gettempdir(), "tello_test_rec.mp4")
+    try:
+        if not dron.connect(host="127.0.0.1"):
+            print("[ERROR] No se pudo conectar al simulador")
+            return
+        pipe = dron.start_video_pipeline()
+        if dron.wait_frame(0, timeout=10.0) is None:
+            print("[ERROR] No llegó ningún frame")
+            return
+
+        # Vista en directo junto a la grabación: un atasco del disco no debe frenarla
+        pipe.add_stage("vista", lambda f: None)
+        rec = dron.start_recording(path, fps=30)
+        t0 = time.monotonic()
+        time.sleep(1.5)
+
+        # Se simula un atasco del codificador de 0.5 s: la cola lo absorbe y luego se rellena el hueco
+        escribir = rec.write
+        atasco = {"hecho": False}
+
+        def lento(f):
+            if not atasco["hecho"]:
+                atasco["hecho"] = True
+                time.sleep(0.5)
+            escribir(f)
+        rec.stage.fn = lento
+        vista0 = pipe.stats()["vista"]["processed"]
+        time.sleep(1.5)
+        print(f"Vista en directo durante el atasco: {pipe.stats()['vista']['processed'] - vista0} frames en 1.5 s, "
+              f"latencia {pipe.stats()['vista']['latency_ms']} ms")
+
+        dron.stop_recording()
+        duracion = time.monotonic() - t0
+        print(f"Contadores: {rec.stats()}")
+
+        cap = cv2.VideoCapture(path)
+        n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        print(f"Fichero: {n} frames a {fps:.0f} fps = {n / fps:.2f} s (grabación de {duracion:.2f} s)")
+
+        dron.stop_video_pipeline()
+        dron.stream_off()
+    finally:
+        dron.disconnect()
+        sim.stop()
+    print("=== Test completado ===")
+
+
+if __name__ == "__main__":
+    main()
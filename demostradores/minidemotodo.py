@@ -37,6 +37,7 @@ except ImportError:
     Polygon = None
 
 from TelloLink.Tello import TelloDron
+from TelloLink.modules.tello_events import Event
 from TelloLink import JoystickController
 
 BAT_MIN_SAFE = 20
@@ -79,6 +80,8 @@ class MiniRemoteApp:
         self.wifi_var = tk.StringVar(value="—")
 
         self._telemetry_running = False
+        self._telemetry_unsub = None
+        self._telemetry_pending = False
         self._ui_landing = False
 
         # POSE
@@ -121,15 +124,10 @@ class MiniRemoteApp:
         # FPV
         self.fpv_label = None
         self._fpv_running = False
-        self._fpv_thread = None
-        self._frame_lock = threading.Lock()
-        self._last_bgr = None
         self._want_stream_on = False
         self._rec_running = False
-        self._rec_writer = None
         self._rec_path = None
         self._rec_fps = 30
-        self._rec_size = (640, 480)
         self._shots_dir = os.path.abspath("captures")
         self._recs_dir = os.path.abspath("videos")
         os.makedirs(self._shots_dir, exist_ok=True)
@@ -137,7 +135,6 @@ class MiniRemoteApp:
         self._rec_badge_var = tk.StringVar(value="")
         self._hud_msg = None
         self._hud_until = 0.0
-        self._cv_cap = None
 
         # Joystick
         self._joy_thread = None
@@ -348,7 +345,8 @@ class MiniRemoteApp:
             self._ensure_pose_origin()
             self.dron.startTelemetry(freq_hz=20)
             self._telemetry_running = True
-            self._schedule_telemetry_pull()
+            self._telemetry_unsub = self.dron.events.subscribe(Event, self._on_drone_event)
+            self._pull_telemetry()
             self._start_keepalive()
         except Exception as e:
             messagebox.showerror("Conectar", f"No se pudo conectar: {e}")
@@ -359,6 +357,9 @@ class MiniRemoteApp:
         self._stop_recording()
         try:
             self._telemetry_running = False
+            if self._telemetry_unsub is not None:
+                self._telemetry_unsub()
+                self._telemetry_unsub = None
             try:
                 self.dron.stopTelemetry()
             except Exception:
@@ -534,11 +535,21 @@ class MiniRemoteApp:
         self._keepalive_paused = False
 
     #TELEMETRÍA
-    def _schedule_telemetry_pull(self):
-        if not self._telemetry_running:
+    #Llega desde el hilo que publica (telemetría, pose, estado): se pasa a Tk y se agrupan
+    #todos los eventos que lleguen antes del siguiente refresco en uno solo
+    def _on_drone_event(self, ev):
+        if self._telemetry_pending:
             return
-        self._pull_telemetry()
-        self.root.after(100, self._schedule_telemetry_pull)
+        self._telemetry_pending = True
+        try:
+            self.root.after(0, self._refresh_telemetry)
+        except Exception:
+            self._telemetry_pending = False
+
+    def _refresh_telemetry(self):
+        self._telemetry_pending = False
+        if self._telemetry_running:
+            self._pull_telemetry()
 
     def _pull_telemetry(self):
         try:
@@ -552,9 +563,6 @@ class MiniRemoteApp:
             self.wifi_var.set(f"{snr}" if isinstance(snr, int) else "—")
 
             pose = getattr(self.dron, "pose", None)
-            if pose is not None and h is not None and isinstance(h, (int, float)):
-                pose.z_cm = float(h)
-
             if pose:
                 x = getattr(pose, "x_cm", None)
                 y = getattr(pose, "y_cm", None)
@@ -668,123 +676,77 @@ class MiniRemoteApp:
     def start_fpv(self):
         if self._fpv_running:
             return
+        self._want_stream_on = True
         try:
-            self._want_stream_on = True
-            if hasattr(self.dron, "startVideo"):
-                self.dron.startVideo()
-            else:
-                try:
-                    self.dron._send("streamon")
-                except Exception:
-                    pass
-        except Exception:
-            pass
-        try:
-            if self._cv_cap is None or not self._cv_cap.isOpened():
-                self._cv_cap = cv2.VideoCapture("udp://0.0.0.0:11111", cv2.CAP_FFMPEG)
-        except Exception:
-            pass
+            # El vídeo lo decodifica la librería; la vista FPV es una etapa más del pipeline, con cola de 1
+            # frame que descarta el más viejo: si la interfaz va lenta, se salta frames en vez de acumular retraso
+            pipe = self.dron.start_video_pipeline()
+        except Exception as e:
+            self._hud_show(f"FPV no disponible: {e}", 2.0)
+            return
         self._fpv_running = True
-        self._fpv_thread = threading.Thread(target=self._fpv_loop, daemon=True)
-        self._fpv_thread.start()
+        self._fpv_badge_toggle = 0.0
+        self._fpv_rec_on = False
+        self._set_fpv_text("(esperando…)")
+        pipe.add_stage("fpv", self._fpv_frame, maxsize=1, on_stop=lambda: self._rec_badge_var.set(""))
         self._hud_show("FPV iniciado", 1.0)
 
     def stop_fpv(self):
         self._fpv_running = False
         self._want_stream_on = False
-        time.sleep(0.05)
-        try:
-            if hasattr(self.dron, "stopVideo"):
-                self.dron.stopVideo()
-            else:
-                try:
-                    self.dron._send("streamoff")
-                except Exception:
-                    pass
-        except Exception:
-            pass
+        # Parar el pipeline para también la grabación de la librería: se cierra antes para que la interfaz lo sepa
+        self._stop_recording()
         try:
-            if self._cv_cap is not None:
-                self._cv_cap.release()
+            self.dron.stop_video_pipeline()
+            self.dron.stream_off()
         except Exception:
             pass
-        finally:
-            self._cv_cap = None
         self._hud_show("FPV detenido", 1.0)
 
-    def _read_frame_generic(self):
-        try:
-            if self._cv_cap is not None and self._cv_cap.isOpened():
-                ok, frame = self._cv_cap.read()
-                if ok and isinstance(frame, np.ndarray) and frame.size > 0:
-                    return frame
-        except Exception:
-            pass
-        return None
-
-    def _fpv_loop(self):
-        last_badge_toggle = 0.0
-        rec_on = False
-        try:
-            while self._fpv_running:
-                frame_bgr = self._read_frame_generic()
-                if frame_bgr is None:
-                    self._set_fpv_text("(esperando…)")
-                    time.sleep(0.04)
-                    continue
-                with self._frame_lock:
-                    self._last_bgr = frame_bgr
-                h, w = frame_bgr.shape[:2]
-                target_w, target_h = self._fpv_w, self._fpv_h
-                scale = min(target_w / max(1, w), target_h / max(1, h))
-                new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
-                bgr_resized = cv2.resize(frame_bgr, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-                off_x = (target_w - new_w) // 2
-                off_y = (target_h - new_h) // 2
-                canvas_base = np.zeros((target_h, target_w, 3), dtype=np.uint8)
-                canvas_base[off_y:off_y + new_h, off_x:off_x + new_w] = bgr_resized
-                canvas_preview = canvas_base.copy()
-                self._draw_overlays(canvas_preview)
-                rgb = cv2.cvtColor(canvas_preview, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(rgb)
-                imgtk = ImageTk.PhotoImage(image=img)
-                self.fpv_label.configure(image=imgtk, text="")
-                self.fpv_label.image = imgtk
-                if self._rec_running:
-                    if self._rec_writer is None:
-                        self._start_writer((target_w, target_h))
-                    try:
-                        self._rec_writer.write(canvas_base)
-                    except Exception:
-                        pass
-                    now = time.time()
-                    if now - last_badge_toggle > 0.5:
-                        rec_on = not rec_on
-                        self._rec_badge_var.set("[REC]" if rec_on else "REC")
-                        last_badge_toggle = now
-                else:
-                    self._rec_badge_var.set("")
-                time.sleep(0.01)
+    def _fpv_frame(self, f):
+        if not self._fpv_running:
+            return
+        frame_bgr = cv2.cvtColor(f.image, cv2.COLOR_RGB2BGR)
+        h, w = frame_bgr.shape[:2]
+        target_w, target_h = self._fpv_w, self._fpv_h
+        scale = min(target_w / max(1, w), target_h / max(1, h))
+        new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
+        bgr_resized = cv2.resize(frame_bgr, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        off_x = (target_w - new_w) // 2
+        off_y = (target_h - new_h) // 2
+        canvas_preview = np.zeros((target_h, target_w, 3), dtype=np.uint8)
+        canvas_preview[off_y:off_y + new_h, off_x:off_x + new_w] = bgr_resized
+        self._draw_overlays(canvas_preview)
+        rgb = cv2.cvtColor(canvas_preview, cv2.COLOR_BGR2RGB)
+        img = Image.fromarray(rgb)
+        imgtk = ImageTk.PhotoImage(image=img)
+        self.fpv_label.configure(image=imgtk, text="")
+        self.fpv_label.image = imgtk
+        if self._rec_running:
+            now = time.time()
+            if now - self._fpv_badge_toggle > 0.5:
+                self._fpv_rec_on = not self._fpv_rec_on
+                self._rec_badge_var.set("[REC]" if self._fpv_rec_on else "REC")
+                self._fpv_badge_toggle = now
+        else:
             self._rec_badge_var.set("")
-        except Exception:
-            pass
 
     def _set_fpv_text(self, text):
         self.fpv_label.configure(text=text, image="")
         self.fpv_label.image = None
 
     def take_snapshot(self):
-        with self._frame_lock:
-            frame = None if self._last_bgr is None else self._last_bgr.copy()
-        if frame is None:
-            self._hud_show(" Sin frame", 1.5)
-            return
+        # La foto se codifica y se escribe en el pool de la librería: ni la interfaz ni el joystick esperan al disco
         path = os.path.join(self._shots_dir, f"shot_{_ts()}.png")
         try:
-            cv2.imwrite(path, frame)
-            self._hud_show(f"Guardada", 1.8)
+            fut = self.dron.snapshot_async(path)
         except Exception:
-            self._hud_show("Error", 1.5)
+            self._hud_show(" Sin frame", 1.5)
+            return
+
+        def _done(f):
+            self._hud_show("Guardada" if f.exception() is None else "Error", 1.8)
+        fut.add_done_callback(_done)
 
     def toggle_recording(self):
         if self._rec_running:
@@ -792,26 +754,24 @@ class MiniRemoteApp:
         else:
             self._start_recording()
 
-    def _start_writer(self, size_wh):
-        self._rec_size = size_wh
-        fourcc = cv2. VideoWriter_fourcc(*"mp4v")
-        self._rec_writer = cv2.VideoWriter(self._rec_path, fourcc, self._rec_fps, self._rec_size)
-
     def _start_recording(self):
+        # La grabación la hace la librería en su propio hilo (con cola), fuera del bucle de la vista FPV
         self._rec_path = os.path.join(self._recs_dir, f"rec_{_ts()}.mp4")
+        try:
+            self.dron.start_recording(self._rec_path, fps=self._rec_fps)
+        except Exception as e:
+            self._hud_show(f"No se pudo grabar: {e}", 2.0)
+            return
         self._rec_running = True
-        self._rec_writer = None
         self._hud_show("Grabando", 1.5)
 
     def _stop_recording(self):
         if self._rec_running:
             self._rec_running = False
             try:
-                if self._rec_writer is not None:
-                    self._rec_writer.release()
+                self.dron.stop_recording()
             except Exception:
                 pass
-            self._rec_writer = None
             self._hud_show("Guardado", 1.5)
 
     # JOYSTICK
@@ -871,8 +831,13 @@ class MiniRemoteApp:
                             except Exception:
                                 self.dron.rc(int(_vx), int(_vy), int(_vz), int(_yaw))
 
-                            if hasattr(self.dron, "pose") and self.dron.pose:
-                                self.dron.pose.update_from_rc(vy_gf, vx_gf, vz_gf, yaw_gf, dt_sec=0.05)
+                            # Con telemetría, la pose la integra el hilo de telemetría con las velocidades medidas.
+                            # Si no llega, se estima con la consigna y el intervalo real entre envíos
+                            ahora = time.monotonic()
+                            dt_real = min(0.2, ahora - getattr(self, "_last_rc_pose_t", ahora))
+                            self._last_rc_pose_t = ahora
+                            if hasattr(self.dron, "pose") and self.dron.pose and not self.dron.telemetry_fresh():
+                                self.dron.pose.update_from_rc(vy_gf, vx_gf, vz_gf, yaw_gf, dt_sec=dt_real)
 
                     self.root.after(0, _send)
 